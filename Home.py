@@ -2,6 +2,11 @@ import streamlit as st
 from datetime import datetime
 from PIL import Image
 import pytz
+from config import SHOW_ADMIN_PANELS
+from utils import export_cache, query_log
+from utils.arrears import BUCKET_LABELS, BUCKETS, aging_totals, get_aging, rank_defaulters
+from utils.classroom import get_classes
+from utils.db import pool_stats
 
 
 
@@ -168,8 +173,47 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# === ARREARS ===
+st.markdown('<div class="section-header">⏳ Fee Arrears</div>', unsafe_allow_html=True)
+arrears_class = st.selectbox("Class", ["All"] + get_classes()["class_name"].tolist(), key="arrears_class")
+aging = get_aging(class_level=None if arrears_class == "All" else arrears_class)
+totals = aging_totals(aging)
+bucket_cols = st.columns(len(BUCKETS) + 1)
+for col, bucket in zip(bucket_cols, BUCKETS):
+    col.metric(BUCKET_LABELS[bucket], f"KES {totals[bucket]:,.0f}")
+bucket_cols[-1].metric("Total Outstanding", f"KES {totals['total']:,.0f}", f"{len(aging)} students",
+                       delta_color="off")
+if aging.empty:
+    st.success("No outstanding fee balances.")
+else:
+    defaulters = rank_defaulters(aging, limit=10)
+    st.markdown("**Top defaulters**")
+    st.dataframe(
+        defaulters.drop(columns=["student_id"]).rename(columns=BUCKET_LABELS),
+        use_container_width=True, hide_index=True
+    )
+
 # --- Status Info ---
 st.markdown("### ℹ️ Status")
 st.info("✅ You are connected to the `school.db` database.")
 
+# --- Query Timing & Export Cache (shown with SCHOOL_ADMIN_PANELS=1) ---
+if SHOW_ADMIN_PANELS:
+    with st.expander("⏱️ Query Timing"):
+        st.caption(f"Statements slower than {query_log.SLOW_QUERY_MS} ms are written to `logs/slow_queries.log`.")
+        st.json(pool_stats())
+        st.markdown("**Per query**")
+        st.dataframe(query_log.timing_summary("fingerprint"), use_container_width=True)
+        st.markdown("**Per page**")
+        st.dataframe(query_log.timing_summary("page"), use_container_width=True)
+        if st.button("🧹 Reset Timings"):
+            query_log.clear()
+            st.rerun()
+
+    with st.expander("🗄️ Export Cache"):
+        st.json(export_cache.cache_stats())
+        if st.button("🧹 Clear Export Cache"):
+            export_cache.clear()
+            st.rerun()
+
 st.markdown("</div>", unsafe_allow_html=True)
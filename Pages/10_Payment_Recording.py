@@ -0,0 +1,96 @@
+import streamlit as st
+import pandas as pd
+import datetime
+from utils.student import find_students
+from utils.payment_queue import DuplicateReceiptError, submit, status, queue_stats
+
+st.set_page_config(page_title="🧾 Payment Recording", layout="wide")
+st.title("🧾 Payment Recording (Cashier Mode)")
+st.caption(
+    "Type an admission number (or the start of a name), the amount and the receipt number, "
+    "then press Enter. Payments are saved in the background while you keep typing."
+)
+
+if "cashier_entries" not in st.session_state:
+    st.session_state.cashier_entries = []
+
+# === Session Defaults (kept between entries) ===
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    payment_date = st.date_input("Payment Date", datetime.date.today())
+with col2:
+    method = st.selectbox("Payment Method", ["Cash", "Bank Transfer", "MPesa", "Cheque"])
+with col3:
+    term = st.selectbox("Term", ["Term 1", "Term 2", "Term 3"])
+with col4:
+    year = st.number_input("Year", min_value=2020, step=1, value=datetime.date.today().year)
+
+# === Entry Form (Enter submits, fields clear for the next payment) ===
+with st.form("cashier_form", clear_on_submit=True):
+    col1, col2, col3 = st.columns([2, 1, 2])
+    with col1:
+        student_text = st.text_input("Admission No. / Name")
+    with col2:
+        amount = st.number_input("Amount (KES)", min_value=0, step=100)
+    with col3:
+        reference = st.text_input("Receipt / Transaction Ref")
+    submitted = st.form_submit_button("Record Payment ⏎")
+
+if submitted:
+    matches = find_students(student_text, limit=5)
+    if matches.empty:
+        st.error(f"❌ No student matches '{student_text}'.")
+    elif len(matches) > 1:
+        st.warning(f"⚠️ {len(matches)} students match '{student_text}'. Use the admission number:")
+        st.dataframe(matches[["admission_number", "full_name", "class"]], use_container_width=True)
+    elif amount <= 0:
+        st.error("❌ Enter an amount greater than zero.")
+    else:
+        student = matches.iloc[0]
+        try:
+            ticket = submit(student["id"], amount, payment_date.isoformat(), method, term, year,
+                            reference)
+            st.session_state.cashier_entries.append({
+                "ticket": ticket,
+                "student": student["label"],
+                "amount": amount,
+                "reference": reference.strip(),
+            })
+            st.success(f"✅ KES {amount:,.0f} for {student['label']} queued.")
+        except DuplicateReceiptError as e:
+            st.error(f"❌ {e}")
+
+# === Student Lookup ===
+with st.expander("🔎 Find a Student"):
+    lookup = st.text_input("Admission number or first/last name starts with")
+    if lookup:
+        found = find_students(lookup, limit=20)
+        if found.empty:
+            st.info("No matching students.")
+        else:
+            st.dataframe(found[["admission_number", "full_name", "class"]], use_container_width=True)
+
+# === Entries This Session ===
+st.divider()
+st.subheader("📋 Recorded This Session")
+
+stats = queue_stats()
+entries = st.session_state.cashier_entries
+col1, col2, col3 = st.columns(3)
+col1.metric("Waiting to Save", stats["pending"])
+col2.metric("Payments This Session", len(entries))
+col3.metric("Total This Session", f"KES {sum(e['amount'] for e in entries):,.0f}")
+
+if entries:
+    outcomes = status([e["ticket"] for e in entries])
+    entries_df = pd.DataFrame(entries[::-1])
+    entries_df["status"] = entries_df["ticket"].map(lambda t: outcomes.get(t, {}).get("status", "unknown"))
+    entries_df["error"] = entries_df["ticket"].map(lambda t: outcomes.get(t, {}).get("error") or "")
+    failed = entries_df[entries_df["status"] == "failed"]
+    if not failed.empty:
+        st.error(f"❌ {len(failed)} payment(s) could not be saved. Please re-enter them.")
+    st.dataframe(entries_df, use_container_width=True)
+    if st.button("🔄 Refresh Status"):
+        st.rerun()
+else:
+    st.info("No payments recorded yet.")
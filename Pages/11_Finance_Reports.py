@@ -0,0 +1,122 @@
+import streamlit as st
+import plotly.express as px
+from utils.finance_cube import aggregate, compare_periods, dimension_values, pivot
+
+st.set_page_config(page_title="📈 Finance Reports", layout="wide")
+st.title("📈 Finance Reports")
+
+DIMENSION_LABELS = {
+    "class": "Class",
+    "year": "Year",
+    "term": "Term",
+    "method": "Method",
+    "category": "Category",
+    "month": "Month",
+    "source": "Source",
+}
+DRILL_PATH = ["year", "term", "class", "category", "method", "month"]
+SOURCE_OPTIONS = {"All": None, "School Fees": "fees", "Other Payments": "other"}
+
+# === Filters ===
+col1, col2, col3 = st.columns(3)
+with col1:
+    source = SOURCE_OPTIONS[st.selectbox("Payments", list(SOURCE_OPTIONS))]
+with col2:
+    years = st.multiselect("Year", dimension_values("year"))
+with col3:
+    terms = st.multiselect("Term", dimension_values("term"))
+filters = {"source": source, "year": years, "term": terms}
+
+totals = aggregate([], filters)
+col1, col2 = st.columns(2)
+col1.metric("Total Collected", f"KES {(totals['amount'].iloc[0] or 0):,.0f}")
+col2.metric("Payments", f"{int(totals['payments'].iloc[0] or 0):,}")
+
+pivot_tab, drill_tab, compare_tab = st.tabs(["🧮 Pivot", "🔍 Drill-down", "⚖️ Compare Periods"])
+
+# === Pivot ===
+with pivot_tab:
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        rows = st.selectbox("Rows", list(DIMENSION_LABELS), format_func=DIMENSION_LABELS.get)
+    with col2:
+        columns = st.selectbox("Columns", [d for d in DIMENSION_LABELS if d != rows], index=1,
+                               format_func=DIMENSION_LABELS.get)
+    with col3:
+        measure = st.radio("Value", ["amount", "payments"], horizontal=True,
+                           format_func=lambda m: "Amount (KES)" if m == "amount" else "No. of payments")
+    table = pivot(rows, columns, filters, value=measure)
+    if table.empty:
+        st.info("No payments match the filters.")
+    else:
+        st.dataframe(table, use_container_width=True)
+
+# === Drill-down ===
+with drill_tab:
+    if "finance_drill" not in st.session_state:
+        st.session_state.finance_drill = {}
+    drill = st.session_state.finance_drill
+    level = DRILL_PATH[min(len(drill), len(DRILL_PATH) - 1)]
+
+    if drill:
+        st.markdown(" › ".join(f"**{DIMENSION_LABELS[d]}:** {v}" for d, v in drill.items()))
+        col1, col2 = st.columns(2)
+        if col1.button("⬆️ Up One Level"):
+            drill.pop(list(drill)[-1])
+            st.rerun()
+        if col2.button("🏠 Back to Top"):
+            drill.clear()
+            st.rerun()
+
+    level_df = aggregate(level, {**filters, **drill})
+    if level_df.empty:
+        st.info("No payments at this level.")
+    else:
+        members = level_df[level].tolist()
+        level_df[level] = level_df[level].astype(str)
+        fig = px.bar(level_df, x=level, y="amount", title=f"Collections by {DIMENSION_LABELS[level]}",
+                     labels={level: DIMENSION_LABELS[level], "amount": "Amount (KES)"})
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(level_df, use_container_width=True)
+        if len(drill) < len(DRILL_PATH) - 1:
+            choice = st.selectbox(f"Drill into {DIMENSION_LABELS[level]}", members)
+            if st.button("🔽 Drill Down"):
+                drill[level] = choice
+                st.rerun()
+
+# === Compare Periods ===
+with compare_tab:
+    all_years = dimension_values("year", {"source": source})
+    term_options = ["All terms"] + dimension_values("term", {"source": source})
+
+    def period_picker(label, default_year_index):
+        col1, col2 = st.columns(2)
+        with col1:
+            year = st.selectbox(f"{label} Year", all_years, index=default_year_index, key=f"{label}_year")
+        with col2:
+            term = st.selectbox(f"{label} Term", term_options, key=f"{label}_term")
+        period = {"year": year}
+        if term != "All terms":
+            period["term"] = term
+        name = f"{term} {year}" if term != "All terms" else str(year)
+        return period, name
+
+    if not all_years:
+        st.info("No payments recorded yet.")
+    else:
+        period_a, name_a = period_picker("Period A", max(len(all_years) - 2, 0))
+        period_b, name_b = period_picker("Period B", len(all_years) - 1)
+        by = st.selectbox("Compare by", [d for d in DIMENSION_LABELS if d not in ("year", "term")],
+                          format_func=DIMENSION_LABELS.get)
+        if name_a == name_b:
+            st.warning("Pick two different periods to compare.")
+            st.stop()
+        comparison = compare_periods(period_a, period_b, by, {"source": source})
+        comparison = comparison.rename(columns={"period_a": name_a, "period_b": name_b})
+        chart_df = comparison.melt(id_vars=by, value_vars=[name_a, name_b],
+                                   var_name="period", value_name="amount")
+        fig = px.bar(chart_df, x=by, y="amount", color="period", barmode="group",
+                     title=f"{name_a} vs {name_b} by {DIMENSION_LABELS[by]}",
+                     labels={by: DIMENSION_LABELS[by], "amount": "Amount (KES)"})
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(comparison, use_container_width=True)
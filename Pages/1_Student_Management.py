@@ -1,7 +1,19 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils.student import get_all_students, add_student, update_student, delete_student
+from utils.student import (
+    list_students,
+    find_students,
+    get_student_by_id,
+    count_students,
+    get_student_stats,
+    add_student,
+    update_student,
+    delete_student,
+    normalize_phone
+)
+from utils.keyset import page_cursor, page_cursors
+from utils.student_import import import_students, import_template
 from utils.class_data import get_all_classes
 import plotly.express as px
 
@@ -11,61 +23,75 @@ st.title("👨‍🎓 Student Management")
 # ------------------------------
 # 📦 Load Data
 # ------------------------------
-students_df = pd.DataFrame(get_all_students())
 classes = get_all_classes()
 class_name_to_id = {c['name']: c['id'] for c in classes}
 class_id_to_name = {v: k for k, v in class_name_to_id.items()}
-
-# Preprocess data
-if not students_df.empty:
-    students_df["Gender"] = students_df["gender"].fillna("Unknown")
-    students_df["Class"] = students_df["class"].fillna("Unassigned")
-    students_df["dob"] = pd.to_datetime(students_df["dob"], errors='coerce')
-    students_df["Year"] = students_df["dob"].dt.year
+PAGE_SIZE = 50
+SORT_OPTIONS = {"Newest first": ("id", True), "Admission No.": ("admission_number", False),
+                "Name": ("name", False), "Class": ("class", False)}
 
 # ------------------------------
 # 🔍 Filter Section
 # ------------------------------
 with st.expander("🔍 Filter Students"):
-    name_filter = st.text_input("Search by Name").lower()
+    name_filter = st.text_input("Search by Name or Admission No.")
     gender_filter = st.selectbox("Filter by Gender", ["All", "Male", "Female"])
     class_filter = st.selectbox("Filter by Class", ["All"] + list(class_name_to_id.keys()))
+    sort_label = st.selectbox("Sort by", list(SORT_OPTIONS.keys()))
+
+filters = {
+    "class_id": None if class_filter == "All" else class_name_to_id[class_filter],
+    "gender": None if gender_filter == "All" else gender_filter,
+    "name": name_filter or None,
+}
+sort_column, descending = SORT_OPTIONS[sort_label]
 
-    filtered_df = students_df.copy()
-    if name_filter:
-        filtered_df = filtered_df[filtered_df["full_name"].str.lower().str.contains(name_filter)]
-    if gender_filter != "All":
-        filtered_df = filtered_df[filtered_df["Gender"] == gender_filter]
-    if class_filter != "All":
-        filtered_df = filtered_df[filtered_df["Class"] == class_filter]
+cursors = page_cursors(st.session_state, "student", (tuple(filters.values()), sort_label))
+filtered_df = list_students(
+    **filters, sort=sort_column, descending=descending, after=cursors[-1], limit=PAGE_SIZE
+)
+total_students = count_students(**filters)
 
 # ------------------------------
 # 📋 Display Table
 # ------------------------------
 st.subheader("📋 Student Records")
 if not filtered_df.empty:
-    st.dataframe(filtered_df[["admission_number", "full_name", "Gender", "Class", "Age"]])
+    display_df = filtered_df.assign(
+        Gender=filtered_df["gender"].fillna("Unknown"),
+        Class=filtered_df["class"].fillna("Unassigned"),
+    )
+    st.dataframe(display_df[["admission_number", "full_name", "Gender", "Class", "Age"]])
 else:
     st.info("No students match the filter criteria.")
-st.markdown(f"**Total Students:** {len(filtered_df)}")
+
+page_number = len(cursors)
+st.markdown(f"**Total Students:** {total_students} &nbsp;·&nbsp; Page {page_number}")
+prev_col, next_col = st.columns(2)
+with prev_col:
+    if page_number > 1 and st.button("⬅️ Previous"):
+        cursors.pop()
+        st.rerun()
+with next_col:
+    if len(filtered_df) == PAGE_SIZE and st.button("Next ➡️"):
+        cursors.append(page_cursor(filtered_df))
+        st.rerun()
 st.markdown("---")
 
 # ------------------------------
 # 📊 Charts and Insights
 # ------------------------------
 st.subheader("📊 Student Insights")
-if not students_df.empty:
+stats = get_student_stats()
+if not stats["gender"].empty:
     c1, c2 = st.columns(2)
     with c1:
-        gender_counts = students_df["Gender"].value_counts().reset_index()
-        gender_counts.columns = ["Gender", "Count"]
-        fig1 = px.pie(gender_counts, names='Gender', values='Count',
+        fig1 = px.pie(stats["gender"], names='Gender', values='Count',
                       title='Gender Distribution', hole=0.4)
         st.plotly_chart(fig1, use_container_width=True)
 
     with c2:
-        class_counts = students_df["Class"].value_counts().reset_index()
-        class_counts.columns = ["Class", "Count"]
+        class_counts = stats["class"]
         fig2 = px.pie(class_counts, names='Class', values='Count',
                       title='Class Distribution', hole=0.4)
         st.plotly_chart(fig2, use_container_width=True)
@@ -81,10 +107,8 @@ if not students_df.empty:
         st.plotly_chart(bar, use_container_width=True)
 
     with trend_col2:
-        if "Year" in students_df.columns and not students_df["Year"].isna().all():
-            year_counts = students_df["Year"].value_counts().sort_index().reset_index()
-            year_counts.columns = ["Year", "Count"]
-            line = px.line(year_counts, x="Year", y="Count", markers=True,
+        if not stats["year"].empty:
+            line = px.line(stats["year"], x="Year", y="Count", markers=True,
                            title="Students Added by Year")
             st.plotly_chart(line, use_container_width=True)
         else:
@@ -97,10 +121,11 @@ st.markdown("---")
 # ------------------------------
 st.subheader("✏️ Add / Edit / Delete Student")
 
-# Build dropdown: "➕ New Student" + full name + adm no
-student_options = ["➕ New Student"] + [
-    f"{row['admission_number']} - {row['full_name']}" for _, row in students_df.iterrows()
-]
+# Build dropdown: "➕ New Student" + students matching the search (any page),
+# or the students on the current page when nothing is typed
+student_search = st.text_input("Find Student", placeholder="Admission number, first or last name")
+student_matches = find_students(student_search, limit=20) if student_search.strip() else filtered_df
+student_options = ["➕ New Student"] + student_matches["label"].tolist()
 selected_label = st.selectbox("Select Student", student_options)
 
 # Determine whether editing or adding
@@ -108,10 +133,8 @@ editing = selected_label != "➕ New Student"
 student_data = {}
 
 if editing:
-    adm_no = selected_label.split(" - ")[0]
-    selected_student = students_df[students_df["admission_number"] == adm_no].iloc[0]
-    student_data = selected_student.to_dict()
-    student_id = student_data.get("id")
+    student_id = int(student_matches.loc[student_matches["label"] == selected_label, "id"].iloc[0])
+    student_data = get_student_by_id(student_id) or {}
 else:
     student_id = None
 
@@ -122,6 +145,7 @@ last_name = st.text_input("Last Name", student_data.get("last_name", ""))
 dob = st.date_input("Date of Birth", pd.to_datetime(student_data.get("dob", datetime.today())))
 gender = st.selectbox("Gender", ["Male", "Female"], index=["Male", "Female"].index(student_data.get("gender", "Male")))
 selected_class = st.selectbox("Class", list(class_name_to_id.keys()), index=list(class_name_to_id.keys()).index(student_data.get("class", list(class_name_to_id.keys())[0])))
+guardian_phone = st.text_input("Guardian Phone", student_data.get("guardian_phone") or "")
 
 # ------------------------------
 # 🔘 Action Buttons
@@ -132,14 +156,18 @@ with col1:
     if st.button("💾 Save"):
         if not first_name or not last_name:
             st.warning("⚠️ First and last name are required.")
+        elif guardian_phone.strip() and normalize_phone(guardian_phone) is None:
+            st.warning("⚠️ Guardian phone must be a Kenyan number, e.g. 0712 345 678.")
         else:
             class_id = class_name_to_id[selected_class]
             if editing:
-                update_student(student_id, first_name, middle_name, last_name, dob, gender, class_id)
+                update_student(student_id, first_name, middle_name, last_name, dob, gender, class_id,
+                               guardian_phone)
                 st.success("✅ Student updated.")
             else:
-                add_student(first_name, middle_name, last_name, dob, gender, class_id)
-                st.success("✅ Student added.")
+                admission_number = add_student(first_name, middle_name, last_name, dob, gender, class_id,
+                                               guardian_phone)
+                st.success(f"✅ Student added as {admission_number}.")
             st.rerun()
 
 with col2:
@@ -151,3 +179,44 @@ with col2:
 with col3:
     if st.button("🔄 Refresh"):
         st.rerun()
+
+st.markdown("---")
+
+# ------------------------------
+# 📥 Bulk Import
+# ------------------------------
+with st.expander("📥 Bulk Import Students"):
+    st.caption("Columns: first_name, middle_name, last_name, dob (YYYY-MM-DD), gender, class, "
+               "guardian_phone (optional).")
+    st.download_button(
+        "📄 Download Template",
+        import_template().to_csv(index=False),
+        file_name="student_import_template.csv",
+        mime="text/csv"
+    )
+    import_file = st.file_uploader("Upload CSV or Excel", type=["csv", "xlsx", "xls"])
+    if import_file and st.button("🚀 Import Students"):
+        progress = st.progress(0, text="Importing...")
+        total_size = max(import_file.size, 1)
+
+        def report_progress(rows_done):
+            # Row totals are unknown while streaming; file position is a good proxy.
+            done = min(import_file.tell() / total_size, 1.0) if hasattr(import_file, "tell") else 0
+            progress.progress(done, text=f"Processed {rows_done} rows")
+
+        try:
+            imported, errors = import_students(import_file, import_file.name, progress=report_progress)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            progress.progress(1.0, text="Done")
+            st.success(f"✅ Imported {imported} students.")
+            if not errors.empty:
+                st.warning(f"⚠️ {len(errors)} rows were rejected.")
+                st.dataframe(errors, use_container_width=True)
+                st.download_button(
+                    "📥 Download Error Report",
+                    errors.to_csv(index=False),
+                    file_name="student_import_errors.csv",
+                    mime="text/csv"
+                )
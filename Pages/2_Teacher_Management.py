@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import teacher, subject, class_
+from utils import teacher, subject, class_, image_ingest
 
 st.set_page_config(page_title="Teacher Management", layout="wide")
 st.title("👨‍🏫 Teacher Management")
@@ -36,7 +36,7 @@ else:
     female_count = len(teacher_df[teacher_df["gender"] == "Female"])
 
     st.markdown(f"**👥 Total Teachers: {total_teachers}** | 👨 Male: {male_count} | 👩 Female: {female_count}")
-    st.dataframe(teacher_df.drop(columns=["photo"]), use_container_width=True)
+    st.dataframe(teacher_df.drop(columns=["has_photo"]), use_container_width=True)
 
 # --- ACTION BUTTONS ---
 colA1, colA2 = st.columns([1, 1])
@@ -48,6 +48,8 @@ with colA2:
     if selected_id:
         selected_teacher = teacher.get_teacher_by_id(selected_id)
         if selected_teacher:
+            if selected_teacher["has_photo"]:
+                st.image(teacher.get_teacher_thumbnail(int(selected_id)))
             if st.button("✏️ Edit Teacher"):
                 st.session_state.edit_teacher_id = int(selected_id)
             if st.button("🗑️ Delete Teacher"):
@@ -82,15 +84,17 @@ if "edit_teacher_id" in st.session_state:
         class_name = col8.selectbox("Class*", class_names, index=class_names.index(data.get("class", class_names[0])) if data.get("class") else 0)
 
         photo = st.file_uploader("Upload Teacher Photo*", type=["png", "jpg", "jpeg"])
-        photo_data = photo.read() if photo else data.get("photo", None)
+        # No upload keeps the stored photo when editing.
+        photo_data = photo.read() if photo else None
 
         submit = st.form_submit_button("✅ Submit")
 
         if submit:
-            if not all([first_name, middle_name, last_name, phone, photo_data]):
+            if not all([first_name, middle_name, last_name, phone, photo_data or data.get("has_photo")]):
                 st.warning("All fields are required.")
             else:
                 if edit_mode:
+                    teacher_id = st.session_state.edit_teacher_id
                     teacher.update_teacher(
                         st.session_state.edit_teacher_id,
                         first_name, middle_name, last_name,
@@ -100,14 +104,32 @@ if "edit_teacher_id" in st.session_state:
                     st.success("Teacher updated successfully.")
                     del st.session_state.edit_teacher_id
                 else:
-                    teacher.add_teacher(
+                    teacher_id = teacher.add_teacher(
                         first_name, middle_name, last_name,
                         hire_date.strftime("%Y-%m-%d"), phone, photo_data,
                         gender, subject_name, class_name
                     )
                     st.success("Teacher added successfully.")
+                # The upload is saved as is; a background worker shrinks it.
+                if photo is not None:
+                    st.session_state.setdefault("photo_ingest_tickets", []).append(
+                        (f"{first_name} {last_name}", image_ingest.submit_teacher_photo(teacher_id, photo_data))
+                    )
                 st.rerun()
 
+# --- PHOTO PROCESSING ---
+if st.session_state.get("photo_ingest_tickets"):
+    with st.expander("🖼️ Photo Processing"):
+        tickets = st.session_state.photo_ingest_tickets
+        outcomes = image_ingest.status([t for _, t in tickets])
+        ingest_df = pd.DataFrame([
+            {"teacher": name, **outcomes.get(t, {"status": "unknown"})} for name, t in tickets[::-1]
+        ])
+        st.dataframe(ingest_df, use_container_width=True)
+        st.caption(f"Saved {ingest_df.get('bytes_saved', pd.Series(dtype=float)).fillna(0).sum() / 1024:,.0f} KB so far.")
+        if st.button("🔄 Refresh Photo Status"):
+            st.rerun()
+
 # --- PIE CHARTS ---
 st.markdown("---")
 st.subheader("📊 Teacher Distribution")
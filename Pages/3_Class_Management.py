@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import io
 from utils.classroom import get_classes, assign_class_teacher
 from utils.teacher import get_all_teachers
+from utils import export_cache
 
 st.set_page_config(page_title="📚 Class Management", layout="wide")
 st.title("📚 Class Management")
@@ -61,11 +62,14 @@ st.pyplot(fig)
 
 # === Export to Excel ===
 def export_excel(df):
-    output = io.BytesIO()
     export_df = df[["class_name", "class_teacher", "class_teacher_phone", "student_count"]]
-    export_df.to_excel(output, index=False, sheet_name="Classes")
-    output.seek(0)
-    return output
+
+    def build():
+        output = io.BytesIO()
+        export_df.to_excel(output, index=False, sheet_name="Classes")
+        return output
+
+    return export_cache.get_or_build("classes_export", 1, [export_df], build)
 
 st.download_button(
     "📥 Export to Excel",
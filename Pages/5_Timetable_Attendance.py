@@ -1,16 +1,20 @@
 import streamlit as st
 import pandas as pd
 from utils.timetable import (
-    get_timetable,
+    query_timetable,
     add_timetable_entry,
     update_timetable_entry,
     delete_timetable_entry,
-    get_timetable_entry_by_id
+    get_timetable_entry_by_id,
+    get_timetable_clashes
 )
+from utils.timetable_clash import TimetableClashError
+from utils.timetable_generator import DAYS, DEFAULT_PERIODS_PER_WEEK, PERIODS, generate_timetable, save_generated
 from utils.classroom import get_all_classes
 from utils.teacher import get_all_teachers
 from utils.subject import get_all_subjects
 import io
+from utils import export_cache
 
 st.title("📅 Timetable & Attendance Management")
 
@@ -55,25 +59,36 @@ if st.button("🔄 Clear All Filters"):
     st.session_state["clear_filters"] = True
     st.rerun()
 
-# === Load and Filter Timetable ===
-timetable_df = get_timetable()
-
-if class_filter != "All":
-    timetable_df = timetable_df[timetable_df["class"] == class_filter]
-if day_filter != "All":
-    timetable_df = timetable_df[timetable_df["day"] == day_filter]
-if teacher_filter != "All":
-    timetable_df = timetable_df[timetable_df["teacher"] == teacher_filter]
-if start_time_filter:
-    timetable_df = timetable_df[timetable_df["start_time"] >= str(start_time_filter)]
-if end_time_filter:
-    timetable_df = timetable_df[timetable_df["end_time"] <= str(end_time_filter)]
+# === Load the Filtered Slice (filters run in SQL) ===
+timetable_df = query_timetable(
+    class_id=None if class_filter == "All" else class_map[class_filter],
+    day=None if day_filter == "All" else day_filter,
+    teacher_id=None if teacher_filter == "All" else teacher_map[teacher_filter],
+    start_from=start_time_filter,
+    end_by=end_time_filter,
+)
 
 st.subheader("📋 Timetable Entries")
 st.dataframe(timetable_df, use_container_width=True)
 
+# === Clashes ===
+clashes_df = get_timetable_clashes()
+if not clashes_df.empty:
+    with st.expander(f"⚠️ {len(clashes_df)} Timetable Clash(es)", expanded=True):
+        st.caption("Lessons that double-book a teacher or a class. Edit or delete one of each pair.")
+        st.dataframe(
+            clashes_df[["resource", "name", "day", "entry_id", "start_time", "end_time",
+                        "other_entry_id", "other_start_time", "other_end_time"]],
+            use_container_width=True
+        )
+
 # === Excel Export ===
 def generate_timetable_excel(dataframe):
+    return export_cache.get_or_build(
+        "timetable_export", 1, [dataframe], lambda: _build_timetable_excel(dataframe)
+    )
+
+def _build_timetable_excel(dataframe):
     output = io.BytesIO()
     writer = pd.ExcelWriter(output, engine='xlsxwriter')
     dataframe.to_excel(writer, index=False, sheet_name='Timetable')
@@ -132,6 +147,9 @@ with st.form("timetable_form"):
                     end_time=str(end_time)
                 )
                 st.success("✅ Timetable entry updated.")
+            except TimetableClashError as e:
+                st.error("❌ Not saved: the teacher or class already has a lesson then.")
+                st.dataframe(pd.DataFrame(e.clashes), use_container_width=True)
             except Exception as e:
                 st.error(f"❌ Failed to update entry: {e}")
         else:
@@ -145,6 +163,9 @@ with st.form("timetable_form"):
                     end_time=str(end_time)
                 )
                 st.success("✅ Timetable entry added.")
+            except TimetableClashError as e:
+                st.error("❌ Not saved: the teacher or class already has a lesson then.")
+                st.dataframe(pd.DataFrame(e.clashes), use_container_width=True)
             except Exception as e:
                 st.error(f"❌ Failed to add entry: {e}")
 
@@ -160,3 +181,60 @@ if st.button("🗑️ Delete Entry"):
             st.error(f"❌ Failed to delete entry: {e}")
     else:
         st.warning("⚠️ Please enter a valid entry ID.")
+
+# === Timetable Generator ===
+st.subheader("🤖 Generate Timetable")
+with st.expander("Build the week from teacher–subject assignments"):
+    st.caption(
+        "Every class in the Teacher–Subject assignments gets a clash-free week. "
+        "Saving replaces the current timetable of those classes."
+    )
+    gen_days = st.multiselect("School Days", ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"],
+                              default=DAYS)
+    periods_df = st.data_editor(
+        pd.DataFrame(PERIODS, columns=["start", "end"]), num_rows="dynamic", key="gen_periods"
+    )
+    periods_per_week_df = st.data_editor(
+        pd.DataFrame({"subject": subject_df["name"], "lessons_per_week": DEFAULT_PERIODS_PER_WEEK}),
+        disabled=["subject"], key="gen_periods_per_week"
+    )
+    away_df = st.data_editor(
+        pd.DataFrame({"teacher": list(teacher_map.keys()), "days_off": ""}),
+        disabled=["teacher"], key="gen_days_off",
+        column_config={"days_off": st.column_config.TextColumn("Days off (e.g. Friday, Monday)")}
+    )
+
+    if st.button("⚙️ Generate"):
+        unavailable = {
+            teacher_map[row.teacher]: [d.strip().capitalize() for d in row.days_off.split(",") if d.strip()]
+            for row in away_df.itertuples() if row.days_off
+        }
+        lessons, unplaced = generate_timetable(
+            dict(zip(periods_per_week_df["subject"], periods_per_week_df["lessons_per_week"].fillna(0).astype(int))),
+            days=gen_days,
+            periods=list(periods_df.dropna().itertuples(index=False, name=None)),
+            unavailable=unavailable,
+        )
+        st.session_state.generated_timetable = (lessons, unplaced)
+
+    if "generated_timetable" in st.session_state:
+        lessons, unplaced = st.session_state.generated_timetable
+        names = {v: k for k, v in class_map.items()}
+        st.success(f"✅ Placed {len(lessons)} lessons for {lessons['class_id'].nunique()} classes.")
+        if not unplaced.empty:
+            st.warning(f"⚠️ {int(unplaced['missing'].sum())} lessons did not fit. "
+                       "Add periods, lighten these teachers, or share the subject with another teacher:")
+            st.dataframe(unplaced, use_container_width=True)
+        st.dataframe(lessons.assign(**{
+            "class": lessons["class_id"].map(names),
+            "subject": lessons["subject_id"].map({v: k for k, v in subject_map.items()}),
+            "teacher": lessons["teacher_id"].map({v: k for k, v in teacher_map.items()}),
+        })[["class", "day", "start_time", "end_time", "subject", "teacher"]], use_container_width=True)
+        if st.button("💾 Save Generated Timetable"):
+            try:
+                saved = save_generated(lessons)
+                del st.session_state.generated_timetable
+                st.success(f"✅ Saved {saved} lessons.")
+            except TimetableClashError as e:
+                st.error("❌ Not saved: the generated lessons clash with the timetable of other classes.")
+                st.dataframe(pd.DataFrame(e.clashes), use_container_width=True)
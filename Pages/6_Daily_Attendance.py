@@ -3,7 +3,7 @@ import pandas as pd
 import datetime
 from utils.student import get_students_by_class
 from utils.classroom import get_classes
-from utils.attendance import get_attendance_by_date_and_class, mark_attendance
+from utils.attendance import get_attendance_by_date_and_class, save_class_attendance
 
 st.set_page_config(page_title="📅 Daily Attendance", layout="wide")
 st.title("📅 Daily Class Attendance")
@@ -35,7 +35,7 @@ st.subheader("🧍 Mark Attendance")
 
 bulk_status = st.selectbox("📌 Mark all students as:", ["Present", "Absent", "Late", "Excused"])
 
-attendance_data = []
+attendance_data = {}
 
 st.markdown("### ✏️ Individual Status")
 
@@ -54,14 +54,11 @@ for _, row in students_df.iterrows():
         key=f"attendance_{student_id}"
     )
     
-    attendance_data.append({
-        "student_id": student_id,
-        "class_id": selected_class_id,
-        "date": selected_date,
-        "status": status
-    })
+    attendance_data[student_id] = status
 
 if st.button("✅ Save Attendance"):
-    for record in attendance_data:
-        mark_attendance(**record)
-    st.success("Attendance saved successfully!")
+    result = save_class_attendance(selected_class_id, selected_date, attendance_data)
+    st.success(
+        f"Attendance saved successfully! {result['inserted']} new, "
+        f"{result['changed']} changed, {result['unchanged']} unchanged."
+    )
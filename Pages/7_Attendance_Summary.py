@@ -1,23 +1,16 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.attendance import get_attendance_summary
+from utils.attendance import get_attendance_summary, get_attendance_aggregates
+from utils.attendance_rollups import get_student_attendance_rates
+from config import TERMS
 from utils.classroom import get_classes
 import io
+from utils import export_cache
 
 st.set_page_config(page_title="📊 Attendance Summary", layout="wide")
 st.title("📊 Attendance Summary Dashboard")
 
-# === Load Attendance Summary Data ===
-df = get_attendance_summary()
-
-if df.empty:
-    st.warning("⚠️ No attendance data available.")
-    st.stop()
-
-# Ensure date column is in datetime format
-df["date"] = pd.to_datetime(df["date"])
-
 # === Fetch Classes ===
 class_df = get_classes()
 class_name_map = dict(zip(class_df["class_name"], class_df["id"]))
@@ -30,20 +23,22 @@ with col1:
 with col2:
     date_range = st.date_input("📅 Filter by Date Range", [])
 
-# === Apply Filters ===
-filtered_df = df.copy()
-if selected_class != "All":
-    filtered_df = filtered_df[filtered_df["class"] == selected_class]
-if len(date_range) == 2:
-    start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
-    filtered_df = filtered_df[(filtered_df["date"] >= start_date) & (filtered_df["date"] <= end_date)]
+filters = {
+    "class_id": None if selected_class == "All" else int(class_name_map[selected_class]),
+    "start_date": date_range[0] if len(date_range) == 2 else None,
+    "end_date": date_range[1] if len(date_range) == 2 else None,
+}
 
-if filtered_df.empty:
+# === Load Pre-grouped Attendance Counts ===
+aggregates = get_attendance_aggregates(**filters)
+
+if aggregates["overall"].empty:
     st.warning("No records found for the selected filters.")
     st.stop()
 
 # === Chart 1: Daily Attendance Trend ===
-daily_summary = filtered_df.groupby(["date", "status"]).size().reset_index(name="count")
+daily_summary = aggregates["daily"]
+daily_summary["date"] = pd.to_datetime(daily_summary["date"])
 fig1 = px.bar(
     daily_summary,
     x="date",
@@ -55,13 +50,12 @@ fig1 = px.bar(
 st.plotly_chart(fig1, use_container_width=True)
 
 # === Chart 2: Overall Status Breakdown ===
-status_count = filtered_df["status"].value_counts().reset_index()
-status_count.columns = ["status", "count"]
+status_count = aggregates["overall"]
 fig2 = px.pie(status_count, values="count", names="status", title="🧾 Overall Attendance Breakdown")
 st.plotly_chart(fig2, use_container_width=True)
 
 # === Chart 3: Class-wise Status Summary ===
-class_summary = filtered_df.groupby(["class", "status"]).size().reset_index(name="count")
+class_summary = aggregates["by_class"]
 fig3 = px.bar(
     class_summary,
     x="class",
@@ -72,8 +66,26 @@ fig3 = px.bar(
 )
 st.plotly_chart(fig3, use_container_width=True)
 
+# === Student Attendance Rates (per term) ===
+st.subheader("🧑‍🎓 Student Attendance Rates")
+rate_col1, rate_col2 = st.columns(2)
+with rate_col1:
+    rate_year = st.number_input("Year", min_value=2020, step=1, value=pd.Timestamp.today().year)
+with rate_col2:
+    rate_term = st.selectbox("Term", list(TERMS.keys()))
+rates_df = get_student_attendance_rates(rate_year, rate_term, class_id=filters["class_id"])
+if rates_df.empty:
+    st.info("No attendance recorded for this term.")
+else:
+    st.dataframe(rates_df.drop(columns=["student_id"]), use_container_width=True)
+
 # === Excel Export Function ===
 def generate_excel(dataframe):
+    return export_cache.get_or_build(
+        "attendance_summary", 1, [dataframe], lambda: _build_excel(dataframe)
+    )
+
+def _build_excel(dataframe):
     output = io.BytesIO()
     writer = pd.ExcelWriter(output, engine='xlsxwriter')
     dataframe.to_excel(writer, index=False, sheet_name='Attendance Summary')
@@ -91,10 +103,12 @@ def generate_excel(dataframe):
     return output
 
 # === Download Button ===
-excel_data = generate_excel(filtered_df)
-st.download_button(
-    label="📥 Download Excel Summary",
-    data=excel_data,
-    file_name="attendance_summary.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
+# Raw rows are only fetched when an export is requested.
+if st.button("📄 Prepare Excel Export"):
+    excel_data = generate_excel(get_attendance_summary(**filters))
+    st.download_button(
+        label="📥 Download Excel Summary",
+        data=excel_data,
+        file_name="attendance_summary.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
@@ -1,9 +1,13 @@
-import sqlite3
 import streamlit as st
 import pandas as pd
 import io
 import plotly.express as px
-from fpdf import FPDF
+from utils.db import get_connection
+from utils.fee_ledger import get_statement, balance_as_of
+from utils import export_cache
+from utils.fee_statements import cached_statement, generate_statements
+from utils.statement_import import reconcile_statement
+from utils.student import full_name_sql
 from utils.fees import (
     get_fee_structures,
     get_fee_payments,
@@ -11,7 +15,7 @@ from utils.fees import (
     delete_fee_structure,
     add_fee_payment,
     delete_fee_payment,
-    get_student_fee_summary,
+    get_student_balances,
     get_fee_summary
 )
 
@@ -106,10 +110,12 @@ if end_date:
 
 if not payments.empty:
     def to_excel(df):
-        output = io.BytesIO()
-        df.to_excel(output, index=False)
-        output.seek(0)
-        return output
+        def build():
+            output = io.BytesIO()
+            df.to_excel(output, index=False)
+            return output
+
+        return export_cache.get_or_build("fee_payments", 1, [df], build)
 
     st.download_button("📥 Export Payments", to_excel(payments), file_name="fee_payments.xlsx")
     st.dataframe(payments, use_container_width=True)
@@ -125,8 +131,8 @@ with st.expander("➕ Record New Payment"):
     with st.form("add_fee_payment_form"):
 
         students_df = pd.read_sql_query(
-            "SELECT id, first_name || ' ' || middle_name || ' ' || last_name AS student_name FROM students",
-            sqlite3.connect("school.db")
+            f"SELECT s.id, {full_name_sql()} AS student_name FROM students s",
+            get_connection()
         )
         student_names = students_df["student_name"].tolist()
         selected_name = st.selectbox("Select Student", student_names)
@@ -148,15 +154,75 @@ with st.expander("➕ Record New Payment"):
             except Exception as e:
                 st.error(f"❌ Failed to record payment: {e}")
 
+# --- Import Statement ---
+with st.expander("🏦 Import MPesa / Bank Statement"):
+    st.caption(
+        "Lines are matched by the admission number in the account or description, "
+        "or by the guardian phone. References already recorded are skipped."
+    )
+    statement_file = st.file_uploader("Statement CSV", type=["csv"], key="statement_file")
+    statement_method = st.selectbox("Record as", ["MPesa", "Bank Transfer"], key="statement_method")
+    dry_run = st.checkbox("Preview only (don't record)", value=True)
+    if statement_file and st.button("🔁 Reconcile Statement"):
+        progress = st.progress(0, text="Reading statement...")
+        total_size = max(statement_file.size, 1)
+
+        def report_progress(lines_done):
+            done = min(statement_file.tell() / total_size, 1.0)
+            progress.progress(done, text=f"Processed {lines_done} lines")
+
+        try:
+            imported, report = reconcile_statement(statement_file, statement_method, dry_run=dry_run,
+                                                   progress=report_progress)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            progress.progress(1.0, text="Done")
+            counts = report["status"].value_counts()
+            cols = st.columns(4)
+            for col, status in zip(cols, ["matched", "unmatched", "duplicate", "invalid"]):
+                col.metric(status.title(), int(counts.get(status, 0)))
+            if dry_run:
+                st.info("Preview only: nothing was recorded.")
+            else:
+                st.success(f"✅ Recorded {imported} payments.")
+            st.dataframe(report, use_container_width=True)
+            st.download_button(
+                "📥 Download Reconciliation Report",
+                report.to_csv(index=False),
+                file_name="statement_reconciliation.csv",
+                mime="text/csv"
+            )
+
 st.divider()
 
 # --- Fee Summary + Statement Section ---
 st.subheader("📊 Fee Balance Summary")
-summary = get_student_fee_summary()
+outstanding_only = st.checkbox("Only students with a balance", value=True)
+summary = get_student_balances(
+    class_level=None if st.session_state.selected_class == "All" else st.session_state.selected_class,
+    term=None if st.session_state.selected_term == "All" else st.session_state.selected_term,
+    year=None if st.session_state.selected_year == "All" else int(st.session_state.selected_year),
+    outstanding_only=outstanding_only
+)
 if not summary.empty:
-    selected_student = st.selectbox("🧑 Select Student for Statement", options=summary["student_name"].unique())
-    student_data = summary[summary["student_name"] == selected_student].iloc[0]
-    student_payments = payments[payments["student_name"] == selected_student]
+    st.dataframe(summary.drop(columns=["student_id"]), use_container_width=True)
+    student_labels = summary.drop_duplicates("student_id").set_index("student_id")["student_name"]
+    selected_student_id = st.selectbox(
+        "🧑 Select Student for Statement",
+        options=student_labels.index.tolist(),
+        format_func=lambda sid: student_labels[sid]
+    )
+    selected_student = student_labels[selected_student_id]
+    student_rows = summary[summary["student_id"] == selected_student_id]
+    student_data = {
+        "student_name": selected_student,
+        "class_level": student_rows["class_level"].iloc[0],
+        "expected_fee": student_rows["expected_fee"].sum(),
+        "amount_paid": student_rows["amount_paid"].sum(),
+        "balance": student_rows["balance"].sum(),
+    }
+    student_payments = payments[payments["student_id"] == selected_student_id]
 
     st.markdown(f"### Statement for **{selected_student}**")
     st.dataframe(student_payments, use_container_width=True)
@@ -167,61 +233,43 @@ if not summary.empty:
 
     st.markdown(f"**Total Expected:** KES {total_expected:,.0f}  \n**Total Paid:** KES {total_paid:,.0f}  \n**Balance:** KES {balance:,.0f}")
 
-    def generate_pdf(student_data, payment_df):
-        pdf = FPDF()
-        pdf.add_page()
-        try:
-            pdf.image("assets/logo.png", x=10, y=8, w=30)
-        except:
-            pass
-
-        pdf.set_font("Arial", "B", 16)
-        pdf.cell(0, 10, "My School Name", ln=True, align="C")
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, f"Fee Statement for {student_data['student_name']}", ln=True, align="C")
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 10, f"Class: {student_data['class_level']}", ln=True)
-
-        pdf.ln(10)
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(40, 10, "Date")
-        pdf.cell(40, 10, "Method")
-        pdf.cell(40, 10, "Term")
-        pdf.cell(40, 10, "Amount", ln=True)
-        pdf.set_font("Arial", "", 12)
-
-        for _, row in payment_df.iterrows():
-            pdf.cell(40, 10, row["payment_date"])
-            pdf.cell(40, 10, row["method"])
-            pdf.cell(40, 10, row["term"])
-            pdf.cell(40, 10, f"KES {row['amount_paid']:,.0f}", ln=True)
-
-        pdf.ln(10)
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, f"Total Expected: KES {student_data['expected_fee']:,.0f}", ln=True)
-        pdf.cell(0, 10, f"Total Paid: KES {student_data['amount_paid']:,.0f}", ln=True)
-        pdf.cell(0, 10, f"Balance: KES {student_data['balance']:,.0f}", ln=True)
-
-        pdf.ln(10)
-        term_summary = payment_df.groupby(["year", "term"])["amount_paid"].sum().reset_index()
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, "Term Breakdown", ln=True)
-        pdf.set_font("Arial", "", 12)
-        for _, row in term_summary.iterrows():
-            pdf.cell(0, 10, f"{row['term']} {row['year']}: KES {row['amount_paid']:,.0f}", ln=True)
-
-        pdf.ln(20)
-        pdf.cell(0, 10, "_________________________", ln=True)
-        pdf.cell(0, 10, "Headteacher Signature", ln=True)
-
-        return pdf.output(dest="S").encode("latin1")
+    with st.expander("📒 Ledger with Running Balance"):
+        as_of = st.date_input("Balance as of", value=pd.Timestamp.today().date(), key="ledger_as_of")
+        st.markdown(f"**Balance as of {as_of}:** KES {balance_as_of(selected_student_id, as_of):,.0f}")
+        st.dataframe(get_statement(selected_student_id, as_of), use_container_width=True)
 
     if st.button("📄 Generate Statement PDF"):
         st.download_button(
             label="⬇️ Download PDF",
-            data=generate_pdf(student_data, student_payments),
+            data=cached_statement(student_data, student_payments),
             file_name=f"{selected_student}_Fee_Statement.pdf",
             mime="application/pdf"
         )
+
+    with st.expander("📦 Batch Statements"):
+        st.caption("One statement per student matching the class, term and year filters above.")
+        batch_format = st.radio("Output", ["ZIP of PDFs", "Single merged PDF"], horizontal=True)
+        if st.button("Generate Batch Statements"):
+            progress_bar = st.progress(0.0)
+
+            def report(done, total):
+                progress_bar.progress(done / total, text=f"{done}/{total} statements")
+
+            merged = batch_format == "Single merged PDF"
+            st.session_state.batch_statements = (merged, generate_statements(
+                class_level=None if st.session_state.selected_class == "All" else st.session_state.selected_class,
+                term=None if st.session_state.selected_term == "All" else st.session_state.selected_term,
+                year=None if st.session_state.selected_year == "All" else int(st.session_state.selected_year),
+                merged=merged,
+                progress=report
+            ))
+        if "batch_statements" in st.session_state:
+            merged, data = st.session_state.batch_statements
+            st.download_button(
+                label="⬇️ Download Statements",
+                data=data,
+                file_name="Fee_Statements.pdf" if merged else "Fee_Statements.zip",
+                mime="application/pdf" if merged else "application/zip"
+            )
 else:
     st.info("No summary data available.")
@@ -1,21 +1,24 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import datetime
 import base64
 from io import BytesIO
 from utils.other_payments import (
-    get_all_other_payments,
+    list_other_payments,
+    summarize_other_payments,
     add_other_payment,
     update_other_payment,
     delete_other_payment,
-    get_student_names_map
+    get_student_names_map,
+    get_receipt_blob_by_id
 )
+from utils.keyset import page_cursor, page_cursors
+from utils import image_ingest
 
 st.set_page_config(page_title="Other Payments", layout="wide")
 st.title("📌 Other Payments Management")
 
-conn = sqlite3.connect("school.db")
+PAGE_SIZE = 50
 
 # --- FILTERS ---
 st.subheader("🔍 Filter Payments")
@@ -26,24 +29,34 @@ method_filter = filters[2].selectbox("Method", ["All", "Cash", "Bank Transfer",
 category_filter = filters[3].selectbox("Category", ["All", "Transport", "Uniform", "Library Fine", "Other"])
 search_name = filters[4].text_input("Search by Student Name")
 
-payments_df = get_all_other_payments()
+# Filters go to SQL; "All" means no filter.
+query_filters = {
+    "year": None if year_filter == "All" else int(year_filter),
+    "term": None if term_filter == "All" else term_filter,
+    "method": None if method_filter == "All" else method_filter,
+    "category": None if category_filter == "All" else category_filter,
+    "name": search_name or None,
+}
 
-# --- APPLY FILTERS ---
-if year_filter != "All":
-    payments_df = payments_df[payments_df["year"] == int(year_filter)]
-if term_filter != "All":
-    payments_df = payments_df[payments_df["term"] == term_filter]
-if method_filter != "All":
-    payments_df = payments_df[payments_df["method"] == method_filter]
-if category_filter != "All":
-    payments_df = payments_df[payments_df["category"] == category_filter]
-if search_name:
-    payments_df = payments_df[payments_df["student_name"].str.contains(search_name, case=False)]
+cursors = page_cursors(st.session_state, "other_payments", tuple(query_filters.values()))
+payments_df = list_other_payments(**query_filters, after=cursors[-1], limit=PAGE_SIZE)
+payment_count, payment_total = summarize_other_payments(**query_filters)
 
 # --- SUMMARY ---
 st.subheader("📊 Summary")
-st.write(f"Total Payments: **KES {payments_df['amount_paid'].sum():,.2f}**")
-st.dataframe(payments_df, use_container_width=True)
+page_number = len(cursors)
+st.write(f"Total Payments: **KES {payment_total:,.2f}** ({payment_count:,} payments) &nbsp;·&nbsp; Page {page_number}")
+st.dataframe(payments_df.drop(columns=["sort_key"]), use_container_width=True)
+
+nav_prev, nav_next = st.columns(2)
+with nav_prev:
+    if page_number > 1 and st.button("⬅️ Previous"):
+        cursors.pop()
+        st.rerun()
+with nav_next:
+    if len(payments_df) == PAGE_SIZE and st.button("Next ➡️"):
+        cursors.append(page_cursor(payments_df))
+        st.rerun()
 
 # --- EXPORT ---
 def download_csv(df):
@@ -52,7 +65,10 @@ def download_csv(df):
     href = f'<a href="data:file/csv;base64,{b64}" download="other_payments.csv">📥 Download CSV</a>'
     return href
 
-st.markdown(download_csv(payments_df), unsafe_allow_html=True)
+# Every filtered row, not just this page; only loaded when asked for.
+if st.button("📤 Export Filtered Payments"):
+    export_df = list_other_payments(**query_filters, limit=None).drop(columns=["sort_key"])
+    st.markdown(download_csv(export_df), unsafe_allow_html=True)
 
 # --- ADD PAYMENT ---
 st.subheader("➕ Add New Payment")
@@ -85,12 +101,33 @@ with st.form("add_payment_form"):
         try:
             add_other_payment(student_id, category, amount, str(payment_date), term, year, method, remarks, receipt_blob, receipt_type)
             st.success("Payment added successfully.")
+            if receipt_type and receipt_type.startswith("image/"):
+                st.session_state.setdefault("receipt_ingest_tickets", []).append(
+                    (uploaded_file.name, image_ingest.submit_receipt(receipt_blob))
+                )
         except Exception as e:
             st.error(f"Failed to add payment: {e}")
 
+# --- RECEIPT PROCESSING ---
+# Image receipts are saved as uploaded, then shrunk by a background worker.
+if st.session_state.get("receipt_ingest_tickets"):
+    with st.expander("🖼️ Receipt Processing"):
+        tickets = st.session_state.receipt_ingest_tickets
+        outcomes = image_ingest.status([t for _, t in tickets])
+        ingest_df = pd.DataFrame([
+            {"file": name, **outcomes.get(t, {"status": "unknown"})} for name, t in tickets[::-1]
+        ])
+        st.dataframe(ingest_df, use_container_width=True)
+        st.caption(f"Saved {ingest_df.get('bytes_saved', pd.Series(dtype=float)).fillna(0).sum() / 1024:,.0f} KB so far.")
+        if st.button("🔄 Refresh Receipt Status"):
+            st.rerun()
+
 # --- DELETE or EDIT ---
 st.subheader("✏️ Edit/Delete Payments")
 edit_df = payments_df.copy()
+if edit_df.empty:
+    st.info("No payments on this page.")
+    st.stop()
 selected_row = st.selectbox("Select Payment to Edit/Delete", edit_df.index)
 row = edit_df.loc[selected_row]
 
@@ -108,13 +145,18 @@ with edit_col1:
         uploaded_file = st.file_uploader("Replace Receipt (optional)", type=["png", "jpg", "jpeg", "pdf"])
 
         if st.form_submit_button("Update Payment"):
-            receipt_blob, receipt_type = row["receipt"], row["receipt_type"]
+            # No upload keeps the stored receipt as it is.
+            receipt_blob, receipt_type = None, row["receipt_type"]
             if uploaded_file:
                 receipt_blob = uploaded_file.read()
                 receipt_type = uploaded_file.type
             try:
                 update_other_payment(row["id"], students_map[student_display], category, amount, str(payment_date), term, year, method, remarks, receipt_blob, receipt_type)
                 st.success("Payment updated successfully.")
+                if receipt_blob is not None and receipt_type.startswith("image/"):
+                    st.session_state.setdefault("receipt_ingest_tickets", []).append(
+                        (uploaded_file.name, image_ingest.submit_receipt(receipt_blob))
+                    )
             except Exception as e:
                 st.error(f"Error updating: {e}")
 
@@ -125,3 +167,19 @@ with edit_col2:
             st.success("Payment deleted successfully.")
         except Exception as e:
             st.error(f"Error deleting: {e}")
+
+    # Receipts are only read from the store when asked for.
+    if row["has_receipt"] and st.button("📎 View Receipt"):
+        receipt = get_receipt_blob_by_id(int(row["id"]))
+        if receipt is None:
+            st.warning("Receipt file not found.")
+        else:
+            receipt_blob, receipt_type = receipt
+            if receipt_type and receipt_type.startswith("image/"):
+                st.image(receipt_blob)
+            st.download_button(
+                "📥 Download Receipt",
+                receipt_blob,
+                file_name=f"receipt_{row['id']}.{(receipt_type or 'application/octet-stream').split('/')[-1]}",
+                mime=receipt_type or "application/octet-stream"
+            )
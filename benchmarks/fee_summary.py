@@ -0,0 +1,93 @@
+"""Benchmark and cross-check utils.fees.get_fee_summary.
+
+    python -m benchmarks.fee_summary [--students 20000] [--payments 200000]
+
+Times the previous fan-out query against the pre-aggregated one on a
+synthetic database, and checks every class total against a plain Python
+computation over the raw rows.
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks import synthetic
+from utils.fees import get_fee_summary
+
+OLD_QUERY = """
+    SELECT
+        c.name AS class_level,
+        COUNT(DISTINCT s.id) AS num_students,
+        COALESCE(SUM(fs.amount), 0) AS total_expected,
+        COALESCE(SUM(fp.amount_paid), 0) AS total_paid
+    FROM students s
+    LEFT JOIN classes c ON s.class_id = c.id
+    LEFT JOIN fee_structures fs ON fs.level = c.name
+    LEFT JOIN fee_payments fp
+        ON s.id = fp.student_id AND fs.term = fp.term AND fs.year = fp.year
+    GROUP BY c.name ORDER BY c.name
+"""
+
+
+def reference_totals(path):
+    """class -> (students, expected, paid), computed row by row in Python."""
+    conn = sqlite3.connect(path)
+    class_names = dict(conn.execute("SELECT id, name FROM classes"))
+    per_level = defaultdict(float)
+    for level, amount in conn.execute("SELECT level, amount FROM fee_structures"):
+        per_level[level] += amount
+    student_class = {sid: class_names.get(cid) for sid, cid in conn.execute("SELECT id, class_id FROM students")}
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for name in student_class.values():
+        totals[name][0] += 1
+        totals[name][1] += per_level.get(name, 0)
+    for sid, amount in conn.execute("SELECT student_id, amount_paid FROM fee_payments"):
+        if sid in student_class:
+            totals[student_class[sid]][2] += amount
+    conn.close()
+    return totals
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark get_fee_summary.")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--payments", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    path = synthetic.build(students=args.students, payments=args.payments)
+    synthetic.use_database(path)
+    print(f"synthetic database: {path}")
+
+    conn = sqlite3.connect(path)
+    old_time, old_rows = timed(lambda: conn.execute(OLD_QUERY).fetchall(), repeat=1)
+    new_time, summary = timed(get_fee_summary)
+    print(f"old fan-out query: {old_time * 1000:9.1f} ms")
+    print(f"pre-aggregated:    {new_time * 1000:9.1f} ms")
+
+    expected = reference_totals(path)
+    mismatches = 0
+    for row in summary.itertuples():
+        students, total_expected, total_paid = expected[row.class_level]
+        if (row.num_students, round(row.total_expected, 2), round(row.total_paid, 2)) != \
+                (students, round(total_expected, 2), round(total_paid, 2)):
+            mismatches += 1
+            print(f"MISMATCH {row.class_level}: {row} vs {expected[row.class_level]}")
+    for label, column, index in (("expected", "total_expected", 1), ("paid", "total_paid", 2)):
+        print(f"total {label}: reference {sum(t[index] for t in expected.values()):,.0f}, "
+              f"new {summary[column].sum():,.0f}, old {sum(r[index + 1] for r in old_rows):,.0f}")
+    print("totals match the reference" if not mismatches else f"{mismatches} classes differ")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Benchmark and check utils.statement_import.
+
+    python -m benchmarks.statement_import [--lines 20000] [--students 5000]
+
+Writes a synthetic statement and reconciles it against a synthetic school.
+Its dates mix ISO timestamps ("2025-01-05 10:00:00") with day-first dates
+("05/01/2025"), every day at most 12, so a day/month swap would still parse.
+The check fails if any line gets a different date or term than was
+written.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks import synthetic
+from config import TERMS
+from utils.statement_import import reconcile_statement
+
+DATE_STYLES = [
+    lambda d: d.strftime("%Y-%m-%d %H:%M:%S"),
+    lambda d: d.strftime("%Y-%m-%d"),
+    lambda d: d.strftime("%d/%m/%Y"),
+    lambda d: d.strftime("%d/%m/%Y %H:%M"),
+]
+
+
+def _term(month):
+    return next((name for name, (first, last) in TERMS.items() if first <= month <= last), None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and check the statement import.")
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    path = synthetic.build(students=args.students, payments=0, seed=args.seed)
+    synthetic.use_database(path)
+    print(f"synthetic database: {path}")
+
+    rng = random.Random(args.seed)
+    written = []
+    for i in range(args.lines):
+        date = pd.Timestamp(2025, rng.randint(1, 12), rng.randint(1, 12), rng.randint(6, 20), rng.randint(0, 59))
+        written.append({
+            "Receipt No.": f"SBX{i:07d}",
+            "Completion Time": DATE_STYLES[i % len(DATE_STYLES)](date),
+            "Paid In": str(rng.choice([500, 1000, 2500])),
+            "A/C No.": f"ADM{rng.randint(1, args.students):05d}",
+            "expected_date": date.strftime("%Y-%m-%d"),
+            "expected_term": _term(date.month),
+        })
+    statement = pd.DataFrame(written)
+    source = os.path.join(os.path.dirname(path), "statement.csv")
+    statement.drop(columns=["expected_date", "expected_term"]).to_csv(source, index=False)
+
+    started = time.perf_counter()
+    imported, report = reconcile_statement(source)
+    elapsed = time.perf_counter() - started
+    print(f"reconcile: {elapsed * 1000:9.1f} ms  ({imported} of {len(statement)} lines imported)")
+
+    checked = report.merge(statement, left_on="reference", right_on="Receipt No.")
+    wrong = checked[(checked["payment_date"] != checked["expected_date"])
+                    | (checked["term"] != checked["expected_term"])]
+    failures = []
+    if imported != len(statement):
+        failures.append(f"{len(statement) - imported} lines not imported")
+    for line in wrong.head(20).itertuples(index=False):
+        failures.append(f"{line.reference} read as {line.payment_date} ({line.term}), "
+                        f"expected {line.expected_date} ({line.expected_term})")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("every date and term read as written" if not failures and wrong.empty
+          else f"{len(wrong)} lines with the wrong date or term")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
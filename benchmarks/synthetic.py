@@ -0,0 +1,85 @@
+"""Synthetic school databases for benchmarks.
+
+Builds a throwaway school.db with the real schema (via the migrations) and
+bulk-generated classes, students, fee structures, payments and teacher
+assignments. Point the helpers at it with ``use_database``.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+
+from utils import db
+from utils.migrations import migrate
+
+CLASSES = [f"Grade {n}" for n in range(1, 9)]
+TERMS = ["Term 1", "Term 2", "Term 3"]
+YEARS = [2024, 2025]
+METHODS = ["Cash", "Bank Transfer", "MPesa", "Cheque"]
+SUBJECTS = ["Mathematics", "English", "Kiswahili", "Science", "Social Studies",
+            "CRE", "Art", "Music", "PE", "Computer"]
+
+
+def build(students=20000, payments=200000, classes=CLASSES, seed=1, path=None, teachers=0):
+    """Create a synthetic database and return its path.
+
+    With ``teachers``, also adds the subjects, that many teachers and a
+    teacher_subjects row for every class and subject.
+    """
+    rng = random.Random(seed)
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="school-bench-"), "school.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    with conn:
+        conn.executemany("INSERT INTO classes (name) VALUES (?)", [(c,) for c in classes])
+        conn.executemany(
+            "INSERT INTO fee_structures (level, amount, year, term) VALUES (?, ?, ?, ?)",
+            [(c, rng.choice([9000, 12000, 15000]), y, t)
+             for c in classes for y in YEARS for t in TERMS],
+        )
+        conn.executemany(
+            "INSERT INTO students (admission_number, first_name, middle_name, last_name, dob, gender, class_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"ADM{i:05d}", f"First{i}", "", f"Last{i}",
+              f"{rng.randint(2010, 2019)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+              rng.choice(["Male", "Female"]), rng.randint(1, len(classes)))
+             for i in range(1, students + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO fee_payments (student_id, amount_paid, payment_date, method, term, year) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(rng.randint(1, students), rng.choice([500, 1000, 2500, 5000]),
+              f"{y}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+              rng.choice(METHODS), rng.choice(TERMS), y)
+             for y in (rng.choice(YEARS) for _ in range(payments))],
+        )
+        if teachers:
+            _add_teachers(conn, rng, len(classes), teachers)
+    conn.close()
+    return path
+
+
+def _add_teachers(conn, rng, class_count, teachers):
+    conn.executemany("INSERT INTO subjects (name) VALUES (?)", [(s,) for s in SUBJECTS])
+    # Teachers are split evenly across subjects; each class gets its subject
+    # teachers round-robin, so loads are even.
+    conn.executemany(
+        "INSERT INTO teachers (first_name, last_name, gender, subject) VALUES (?, ?, ?, ?)",
+        [(f"Teacher{i}", f"Staff{i}", rng.choice(["Male", "Female"]), SUBJECTS[(i - 1) % len(SUBJECTS)])
+         for i in range(1, teachers + 1)],
+    )
+    by_subject = {s: [t for t in range(1, teachers + 1) if (t - 1) % len(SUBJECTS) == i]
+                  for i, s in enumerate(SUBJECTS)}
+    conn.executemany(
+        "INSERT INTO teacher_subjects (teacher_id, subject_id, class_id) VALUES (?, ?, ?)",
+        [(by_subject[subject][(class_id - 1) % len(by_subject[subject])], subject_id, class_id)
+         for subject_id, subject in enumerate(SUBJECTS, start=1) if by_subject[subject]
+         for class_id in range(1, class_count + 1)],
+    )
+
+
+def use_database(path):
+    """Make utils helpers read and write ``path``."""
+    db.close_all()
+    db.DB_NAME = path
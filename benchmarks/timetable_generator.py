@@ -0,0 +1,98 @@
+"""Benchmark and check utils.timetable_generator.
+
+    python -m benchmarks.timetable_generator [--classes 40] [--teachers 80]
+
+Generates the week for a synthetic school and saves it through the bulk
+insert. Then it checks the saved timetable: no clashes, every subject got its
+lessons, and no class has one subject more often in a day than allowed.
+The whole run must finish within ``--budget`` seconds.
+"""
+import argparse
+import math
+import random
+import sys
+import time
+
+from benchmarks import synthetic
+from utils.timetable import get_timetable_clashes
+from utils.timetable_generator import DAYS, generate_timetable, load_assignments, save_generated
+from utils.db import get_connection
+
+# Lessons a week per subject: 37 of the 40 periods in the default grid.
+PERIODS_PER_WEEK = {
+    "Mathematics": 6, "English": 5, "Kiswahili": 5, "Science": 5, "Social Studies": 4,
+    "CRE": 3, "Art": 2, "Music": 2, "PE": 3, "Computer": 2,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the timetable generator.")
+    parser.add_argument("--classes", type=int, default=40)
+    parser.add_argument("--teachers", type=int, default=80)
+    parser.add_argument("--budget", type=float, default=60.0, help="seconds allowed (default: 60)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    classes = [f"Grade {n // 4 + 1}{'ABCD'[n % 4]}" for n in range(args.classes)]
+    path = synthetic.build(students=args.classes * 10, payments=0, classes=classes,
+                           teachers=args.teachers, seed=args.seed)
+    synthetic.use_database(path)
+    print(f"synthetic database: {path}")
+
+    # A tenth of the teachers, chosen among the lighter loads, are away one day a week.
+    assignments = load_assignments().rename(columns={"class": "class_name"})
+    loads = assignments.groupby("teacher_id")["subject"].apply(
+        lambda s: sum(PERIODS_PER_WEEK.get(x, 5) for x in s))
+    rng = random.Random(args.seed)
+    eligible = sorted(loads[loads <= 24].index)  # still fit in the four days left
+    part_time = rng.sample(eligible, k=min(len(loads) // 10, len(eligible)))
+    unavailable = {teacher_id: [rng.choice(DAYS)] for teacher_id in part_time}
+
+    started = time.perf_counter()
+    lessons, unplaced = generate_timetable(PERIODS_PER_WEEK, unavailable=unavailable, seed=args.seed)
+    generated = time.perf_counter()
+    saved = save_generated(lessons)
+    finished = time.perf_counter()
+    print(f"{len(assignments)} assignments, {len(loads)} teachers ({len(unavailable)} part-time)")
+    print(f"generate: {(generated - started) * 1000:9.1f} ms")
+    print(f"save:     {(finished - generated) * 1000:9.1f} ms  ({saved} lessons)")
+
+    failures = []
+    if not unplaced.empty:
+        failures.append(f"{int(unplaced['missing'].sum())} lessons could not be placed")
+    clashes = get_timetable_clashes()
+    if not clashes.empty:
+        failures.append(f"{len(clashes)} clashes in the saved timetable")
+    conn = get_connection()
+    counts = dict(((c, s), n) for c, s, n in conn.execute(
+        "SELECT class_id, subject_id, COUNT(*) FROM timetable GROUP BY class_id, subject_id"))
+    day_max = dict(((c, s), n) for c, s, n in conn.execute("""
+        SELECT class_id, subject_id, MAX(n) FROM (
+            SELECT class_id, subject_id, day, COUNT(*) AS n FROM timetable GROUP BY class_id, subject_id, day
+        ) GROUP BY class_id, subject_id
+    """))
+    off_day = conn.execute(
+        f"SELECT COUNT(*) FROM timetable WHERE {' OR '.join(['(teacher_id = ? AND day = ?)'] * len(unavailable)) or '0'}",
+        [v for teacher_id, days in unavailable.items() for v in (teacher_id, days[0])],
+    ).fetchone()[0]
+    conn.close()
+    for row in assignments.drop_duplicates(["class_id", "subject_id"]).itertuples():
+        wanted = PERIODS_PER_WEEK.get(row.subject, 5)
+        got = counts.get((row.class_id, row.subject_id), 0)
+        if got != wanted:
+            failures.append(f"{row.class_name} {row.subject}: {got} of {wanted} lessons")
+        elif day_max[(row.class_id, row.subject_id)] > math.ceil(wanted / len(DAYS)):
+            failures.append(f"{row.class_name} {row.subject}: {day_max[(row.class_id, row.subject_id)]} in one day")
+    if off_day:
+        failures.append(f"{off_day} lessons on a teacher's day off")
+    if finished - started > args.budget:
+        failures.append(f"took {finished - started:.1f} s, budget {args.budget:.0f} s")
+
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print("timetable is complete and clash-free" if not failures else f"{len(failures)} problems")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,16 @@
 # config.py
+import os
+
 DB_NAME = "school.db"
 ROLES = ["Admin", "Teacher", "Student", "Parent"]
+LOG_DIR = "logs"
+SLOW_QUERY_MS = 200  # statements slower than this go to logs/slow_queries.log
+# School terms by calendar month (inclusive), used to roll attendance up by term.
+TERMS = {"Term 1": (1, 4), "Term 2": (5, 8), "Term 3": (9, 12)}
+EXPORT_CACHE_DIR = "cache/exports"
+EXPORT_CACHE_MAX_MB = 200  # least recently used exports are evicted past this
+RECEIPT_STORE_DIR = "receipts"  # content-addressed receipt files (see utils/receipt_store.py)
+TEACHER_PHOTO_DIR = "teacher_photos"  # thumbnails are cached in its thumbs/ subfolder
+THUMBNAIL_SIZE = 160  # longest side, in pixels
+# Query timing and export cache panels on the home page; set SCHOOL_ADMIN_PANELS=1 to show them.
+SHOW_ADMIN_PANELS = os.environ.get("SCHOOL_ADMIN_PANELS", "") == "1"
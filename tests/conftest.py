@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+from benchmarks import synthetic
+from utils import db
+from utils.migrations import migrate
+
+
+@pytest.fixture
+def school_db(tmp_path):
+    """An empty, fully migrated school.db that the utils helpers use."""
+    path = str(tmp_path / "school.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.close()
+    synthetic.use_database(path)
+    yield path
+    db.close_all()
+
+
+@pytest.fixture
+def conn(school_db):
+    return db.get_connection()
+
+
+def add_class(conn, name):
+    with conn:
+        return conn.execute("INSERT INTO classes (name) VALUES (?)", (name,)).lastrowid
+
+
+def add_student(conn, class_id, first_name="Jane", middle_name="", last_name="Doe"):
+    with conn:
+        return conn.execute(
+            "INSERT INTO students (admission_number, first_name, middle_name, last_name, gender, class_id) "
+            "VALUES ('ADM' || (SELECT COUNT(*) + 1 FROM students), ?, ?, ?, 'Female', ?)",
+            (first_name, middle_name, last_name, class_id),
+        ).lastrowid
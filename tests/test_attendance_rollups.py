@@ -0,0 +1,35 @@
+from conftest import add_class, add_student
+from utils.attendance import (
+    get_attendance_aggregates,
+    get_attendance_summary,
+    mark_attendance,
+    save_class_attendance,
+)
+from utils.attendance_rollups import get_student_attendance_rates
+from utils.student import delete_student
+
+
+def test_rollups_follow_marked_attendance(conn):
+    class_id = add_class(conn, "Grade 1")
+    jane, john = add_student(conn, class_id), add_student(conn, class_id, "John")
+    save_class_attendance(class_id, "2025-02-03", {jane: "Present", john: "Absent"})
+    mark_attendance(john, class_id, "2025-02-03", "Late")
+
+    overall = get_attendance_aggregates()["overall"].set_index("status")["count"].to_dict()
+    assert overall == {"Present": 1, "Late": 1}
+    assert len(get_attendance_summary()) == 2
+
+
+def test_deleted_student_leaves_the_rollups(conn):
+    class_id = add_class(conn, "Grade 1")
+    jane, john = add_student(conn, class_id), add_student(conn, class_id, "John")
+    mark_attendance(jane, class_id, "2025-02-03", "Present")
+    mark_attendance(john, class_id, "2025-02-03", "Absent")
+
+    delete_student(jane)
+
+    overall = get_attendance_aggregates()["overall"].set_index("status")["count"].to_dict()
+    assert overall == {"Absent": 1}
+    assert get_attendance_summary()["status"].tolist() == ["Absent"]
+    rates = get_student_attendance_rates(2025, "Term 1")
+    assert rates["student_id"].tolist() == [john]
@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import add_class, add_student
+from utils import fees
+
+STRUCTURES = [  # (level, amount, year, term)
+    ("Grade 1", 12000, 2025, "Term 1"),
+    ("Grade 1", 9000, 2025, "Term 2"),
+    ("Grade 1", 15000, 2024, "Term 3"),
+    ("Grade 2", 10000, 2025, "Term 1"),
+]
+
+
+@pytest.fixture
+def school(conn):
+    """Grade 1: Jane with several payments and John with none. Grade 2: Amy."""
+    grade1, grade2 = add_class(conn, "Grade 1"), add_class(conn, "Grade 2")
+    students = {
+        "Jane": (add_student(conn, grade1, "Jane"), "Grade 1"),
+        "John": (add_student(conn, grade1, "John"), "Grade 1"),
+        "Amy": (add_student(conn, grade2, "Amy"), "Grade 2"),
+    }
+    jane, amy = students["Jane"][0], students["Amy"][0]
+    payments = [  # (student_id, amount, year, term)
+        (jane, 5000, 2025, "Term 1"),
+        (jane, 4000, 2025, "Term 1"),
+        (jane, 9000, 2025, "Term 2"),
+        (jane, 15000, 2024, "Term 3"),
+        (amy, 2500, 2025, "Term 1"),
+    ]
+    for structure in STRUCTURES:
+        fees.add_fee_structure(*structure)
+    for student_id, amount, year, term in payments:
+        fees.add_fee_payment(student_id, amount, f"{year}-02-01", "Cash", term, year)
+    return students, payments
+
+
+def naive_totals(students, payments, year=None, term=None):
+    """class -> (students, expected, paid), one row at a time."""
+    def in_period(y, t):
+        return (year is None or y == year) and (term is None or t == term)
+
+    totals = {}
+    for student_id, level in students.values():
+        count, expected, paid = totals.get(level, (0, 0, 0))
+        expected += sum(amount for lvl, amount, y, t in STRUCTURES if lvl == level and in_period(y, t))
+        paid += sum(amount for sid, amount, y, t in payments if sid == student_id and in_period(y, t))
+        totals[level] = (count + 1, expected, paid)
+    return totals
+
+
+@pytest.mark.parametrize("year, term", [(None, None), (2025, None), (2025, "Term 1"), (2024, "Term 3")])
+def test_totals_match_a_naive_sum(school, year, term):
+    students, payments = school
+    summary = fees.get_fee_summary(year=year, term=term)
+    got = {
+        row.class_level: (row.num_students, row.total_expected, row.total_paid)
+        for row in summary.itertuples()
+    }
+    assert got == naive_totals(students, payments, year, term)
+    assert (summary["total_balance"] == summary["total_expected"] - summary["total_paid"]).all()
+
+
+def test_several_structures_and_payments_are_not_multiplied(school):
+    summary = fees.get_fee_summary(class_level="Grade 1").set_index("class_level")
+    # Two students x 36,000 of structures; Jane's four payments counted once each.
+    assert summary.loc["Grade 1", "num_students"] == 2
+    assert summary.loc["Grade 1", "total_expected"] == 72000
+    assert summary.loc["Grade 1", "total_paid"] == 33000
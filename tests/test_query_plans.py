@@ -0,0 +1,47 @@
+import pytest
+
+from conftest import add_class, add_student
+from utils import attendance, fee_ledger, fees
+from utils.migrations import check_query_plans, plan_checks, table_scans, traced_statements
+
+
+@pytest.fixture
+def seeded(conn):
+    class_id = add_class(conn, "Grade 1")
+    student_id = add_student(conn, class_id)
+    add_student(conn, class_id, "John")
+    fees.add_fee_structure("Grade 1", 12000, 2025, "Term 1")
+    fees.add_fee_payment(student_id, 5000, "2025-02-01", "MPesa", "Term 1", 2025, "RCT-1")
+    attendance.mark_attendance(student_id, class_id, "2025-02-03", "Present")
+    return conn, class_id, student_id
+
+
+def _write_checks(class_id, student_id):
+    return [
+        ("attendance.mark_attendance",
+         lambda: attendance.mark_attendance(student_id, class_id, "2025-02-04", "Late")),
+        ("attendance.save_class_attendance",
+         lambda: attendance.save_class_attendance(class_id, "2025-02-03", {student_id: "Absent"})),
+        ("fees.add_fee_payment",
+         lambda: fees.add_fee_payment(student_id, 1000, "2025-03-01", "Cash", "Term 1", 2025, "RCT-2")),
+        ("fee_ledger.balance_as_of", lambda: fee_ledger.balance_as_of(student_id, "2025-03-31")),
+        ("fee_ledger.get_statement", lambda: fee_ledger.get_statement(student_id)),
+        ("fees.get_student_balances (one student, all terms)",
+         lambda: fees.get_student_balances(student_id=student_id)),
+    ]
+
+
+def test_lookups_use_an_index(seeded):
+    assert check_query_plans(plan_checks()) == []
+
+
+def test_write_paths_use_an_index(seeded):
+    _, class_id, student_id = seeded
+    assert check_query_plans(_write_checks(class_id, student_id)) == []
+
+
+def test_table_scans_are_reported(seeded):
+    conn = seeded[0]
+    statements = traced_statements(conn, lambda: fees.get_student_balances(year=2025, term="Term 1"))
+    assert any(table_scans(conn, sql) for sql in statements)
+    assert check_query_plans([("nothing", lambda: None)]) == [("nothing", "no query ran")]
@@ -0,0 +1,51 @@
+import io
+
+import pandas as pd
+
+from conftest import add_class, add_student
+from utils import fee_ledger, fees
+from utils.statement_import import reconcile_statement
+
+STATEMENT = """Receipt No.,Completion Time,Paid In,A/C No.
+SBX0000001,2025-01-05 10:00:00,5000,ADM1
+SBX0000002,05/06/2025,3000,ADM1
+SBX0000003,2025-02-01,1000,ADM9
+SBX0000001,2025-01-05 10:00:00,5000,ADM1
+"""
+
+
+def _ledger(conn):
+    return pd.read_sql_query(
+        "SELECT student_id, entry_date, kind, source_id, amount, balance FROM fee_ledger "
+        "ORDER BY student_id, entry_date, kind, source_id", conn)
+
+
+def test_statement_lines_are_dated_and_posted(conn):
+    class_id = add_class(conn, "Grade 1")
+    jane, john = add_student(conn, class_id), add_student(conn, class_id, "John")
+    fees.add_fee_structure("Grade 1", 12000, 2025, "Term 1")
+    fees.add_fee_payment(john, 2000, "2025-01-20", "Cash", "Term 1", 2025)
+
+    imported, report = reconcile_statement(io.StringIO(STATEMENT))
+
+    assert imported == 2
+    assert report["status"].tolist() == ["matched", "matched", "unmatched", "duplicate"]
+    matched = report[report["status"] == "matched"]
+    # ISO timestamps are not read day first; 05/06/2025 is 5 June.
+    assert matched["payment_date"].tolist() == ["2025-01-05", "2025-06-05"]
+    assert matched["term"].tolist() == ["Term 1", "Term 2"]
+    assert fee_ledger.balance_as_of(jane) == 12000 - 8000
+    assert fee_ledger.balance_as_of(john) == 12000 - 2000
+
+    posted = _ledger(conn)
+    with conn:
+        fee_ledger.rebuild(conn)
+    pd.testing.assert_frame_equal(posted, _ledger(conn))
+
+
+def test_dry_run_writes_nothing(conn):
+    add_student(conn, add_class(conn, "Grade 1"))
+    imported, report = reconcile_statement(io.StringIO(STATEMENT), dry_run=True)
+    assert imported == 0
+    assert (report["status"] == "matched").sum() == 2
+    assert conn.execute("SELECT COUNT(*) FROM fee_payments").fetchone()[0] == 0
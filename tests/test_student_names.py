@@ -0,0 +1,21 @@
+from conftest import add_class, add_student
+from utils import fees, other_payments, student
+
+
+def test_names_read_the_same_everywhere(conn):
+    class_id = add_class(conn, "Grade 1")
+    jane = add_student(conn, class_id, "Jane", "Wanjiru")
+    john = add_student(conn, class_id, "John", "")
+    amy = add_student(conn, class_id, "Amy", None)
+    fees.add_fee_structure("Grade 1", 12000, 2025, "Term 1")
+    for student_id in (jane, john, amy):
+        fees.add_fee_payment(student_id, 1000, "2025-02-01", "Cash", "Term 1", 2025)
+    expected = {jane: "Jane Wanjiru Doe", john: "John Doe", amy: "Amy Doe"}
+
+    by_class = student.get_students_by_class(class_id)
+    assert dict(zip(by_class["id"], by_class["full_name"])) == expected
+    payments = fees.get_fee_payments()
+    assert dict(zip(payments["student_id"], payments["student_name"])) == expected
+    names = other_payments.get_all_students()
+    assert dict(zip(names["id"], names["full_name"])) == expected
+    assert other_payments.get_student_names_map() == expected
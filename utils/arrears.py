@@ -0,0 +1,128 @@
+"""Arrears aging and the defaulter list.
+
+Every student is charged each fee structure of their class on the first day
+of its term (``config.TERMS``). Payments are applied to the oldest charges
+first, so whatever is still unpaid on a charge has been owed since its term
+started. Unpaid amounts fall into the buckets current (under 30 days),
+30, 60 and 90+ days.
+
+Three small grouped queries load the students, the charges per class and
+the payment totals. Everything after that is whole-column pandas, not a
+per-student loop.
+"""
+import pandas as pd
+
+from config import TERMS
+from utils.db import get_connection
+from utils.student import full_name_sql
+
+BUCKETS = ["current", "days_30", "days_60", "days_90_plus"]
+BUCKET_LABELS = {
+    "current": "Current",
+    "days_30": "30+ days",
+    "days_60": "60+ days",
+    "days_90_plus": "90+ days",
+}
+_BUCKET_EDGES = [-1, 29, 59, 89, float("inf")]
+
+_COLUMNS = ["student_id", "admission_number", "student_name", "class_level",
+            *BUCKETS, "total", "oldest_due", "days_overdue"]
+
+
+def _load(as_of, class_level):
+    class_filter, params = "", []
+    if class_level:
+        class_filter = " WHERE c.name = ?"
+        params.append(class_level)
+    conn = get_connection()
+    students = pd.read_sql_query(f"""
+        SELECT s.id AS student_id, s.admission_number,
+               {full_name_sql()} AS student_name,
+               c.name AS class_level
+        FROM students s
+        JOIN classes c ON s.class_id = c.id{class_filter}
+    """, conn, params=params)
+    # Charges per class level; expanded to students below rather than in SQL,
+    # which would send one row per student and term through the cursor.
+    level_charges = pd.read_sql_query("""
+        SELECT level AS class_level, year, term, SUM(amount) AS amount
+        FROM fee_structures
+        WHERE amount > 0
+        GROUP BY level, year, term
+    """, conn)
+    paid_filter = (" AND p.student_id IN (SELECT s.id FROM students s"
+                   f" JOIN classes c ON s.class_id = c.id{class_filter})") if class_level else ""
+    paid = pd.read_sql_query(f"""
+        SELECT p.student_id, SUM(p.amount_paid) AS paid
+        FROM fee_payments p
+        WHERE (p.payment_date IS NULL OR p.payment_date <= ?){paid_filter}
+        GROUP BY p.student_id
+    """, conn, params=[as_of.strftime("%Y-%m-%d"), *params])
+    conn.close()
+    charges = students[["student_id", "class_level"]].merge(level_charges, on="class_level")
+    return charges, paid, students
+
+
+def get_aging(as_of=None, class_level=None):
+    """Outstanding balance per student split into aging buckets.
+
+    Returns one row per student who owes something, with ``current``,
+    ``days_30``, ``days_60``, ``days_90_plus``, ``total``, the due date of the
+    oldest unpaid charge and how many days overdue it is.
+    """
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today()).normalize()
+    charges, paid, students = _load(as_of, class_level)
+
+    first_month = {term: first for term, (first, _) in TERMS.items()}
+    charges["due"] = pd.to_datetime(
+        charges["year"].astype(int) * 10000 + charges["term"].map(first_month).fillna(1).astype(int) * 100 + 1,
+        format="%Y%m%d", errors="coerce",
+    )
+    charges = charges[charges["due"] <= as_of]
+    if charges.empty:
+        return pd.DataFrame(columns=_COLUMNS)
+
+    # Oldest charge first: a charge is unpaid by however much the running
+    # total of charges up to and including it exceeds everything paid.
+    charges = charges.sort_values(["student_id", "due"])
+    running = charges.groupby("student_id")["amount"].cumsum()
+    total_paid = charges["student_id"].map(paid.set_index("student_id")["paid"]).fillna(0)
+    charges["outstanding"] = (running - total_paid).clip(lower=0).clip(upper=charges["amount"])
+    charges = charges[charges["outstanding"] > 0]
+    if charges.empty:
+        return pd.DataFrame(columns=_COLUMNS)
+
+    charges["bucket"] = pd.cut((as_of - charges["due"]).dt.days, _BUCKET_EDGES, labels=BUCKETS)
+    aging = charges.pivot_table(index="student_id", columns="bucket", values="outstanding",
+                                aggfunc="sum", fill_value=0, observed=False)
+    aging = aging.reindex(columns=BUCKETS, fill_value=0).rename_axis(columns=None)
+    aging["total"] = aging[BUCKETS].sum(axis=1)
+    aging["oldest_due"] = charges.groupby("student_id")["due"].min()
+    aging["days_overdue"] = (as_of - aging["oldest_due"]).dt.days
+    aging["oldest_due"] = aging["oldest_due"].dt.strftime("%Y-%m-%d")
+
+    return students.merge(aging.reset_index(), on="student_id")[_COLUMNS]
+
+
+def rank_defaulters(aging, min_balance=0, limit=None):
+    """``get_aging`` rows owing more than ``min_balance``, with a ``rank`` column.
+
+    Ranked by the amount 90+ days overdue, then by total owed.
+    """
+    aging = aging[aging["total"] > min_balance]
+    aging = aging.sort_values(["days_90_plus", "total", "days_overdue"], ascending=False)
+    if limit is not None:
+        aging = aging.head(limit)
+    aging = aging.reset_index(drop=True)
+    aging.insert(0, "rank", range(1, len(aging) + 1))
+    return aging
+
+
+def get_defaulters(as_of=None, class_level=None, min_balance=0, limit=None):
+    """Ranked defaulter list, optionally for one class."""
+    return rank_defaulters(get_aging(as_of, class_level), min_balance, limit)
+
+
+def aging_totals(aging):
+    """School-wide (or class-wide) totals per bucket for ``get_aging`` output."""
+    return {bucket: float(aging[bucket].sum()) for bucket in BUCKETS + ["total"]}
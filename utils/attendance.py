@@ -1,49 +1,103 @@
-import sqlite3
 import pandas as pd
-
-DB_PATH = "school.db"
+from utils.db import get_connection
+from utils.attendance_rollups import get_daily_counts
+from utils.student import full_name_sql
 
 def get_attendance_by_date_and_class(class_id, date):
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         query = """
             SELECT * FROM attendance
             WHERE class_id = ? AND date = ?
         """
         return pd.read_sql_query(query, conn, params=(class_id, date))
 
+# Relies on the unique (class_id, date, student_id) index from migration 2.
+_UPSERT_SQL = """
+    INSERT INTO attendance (student_id, class_id, date, status) VALUES (?, ?, ?, ?)
+    ON CONFLICT (class_id, date, student_id) DO UPDATE SET status = excluded.status
+"""
+
+
 def mark_attendance(student_id, class_id, date, status):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        # Check if record exists
-        cursor.execute(
-            "SELECT id FROM attendance WHERE student_id = ? AND class_id = ? AND date = ?",
-            (student_id, class_id, date)
-        )
-        row = cursor.fetchone()
-        if row:
-            cursor.execute(
-                "UPDATE attendance SET status = ? WHERE id = ?",
-                (status, row[0])
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO attendance (student_id, class_id, date, status) VALUES (?, ?, ?, ?)",
-                (student_id, class_id, date, status)
-            )
-        conn.commit()
-def get_attendance_summary():
-    conn = sqlite3.connect(DB_PATH)
-    query = """
+    with get_connection() as conn:
+        conn.execute(_UPSERT_SQL, (student_id, class_id, str(date), status))
+
+
+def save_class_attendance(class_id, date, statuses):
+    """Write a whole roster for one class and day in a single transaction.
+
+    ``statuses`` maps student_id -> status. Rows whose status is unchanged
+    are skipped. Returns ``{"inserted": n, "changed": n, "unchanged": n}``.
+    """
+    date = str(date)
+    conn = get_connection()
+    with conn:
+        existing = dict(conn.execute(
+            "SELECT student_id, status FROM attendance WHERE class_id = ? AND date = ?",
+            (class_id, date)
+        ).fetchall())
+        rows = [
+            (int(student_id), class_id, date, status)
+            for student_id, status in statuses.items()
+            if existing.get(int(student_id)) != status
+        ]
+        if rows:
+            conn.executemany(_UPSERT_SQL, rows)
+    conn.close()
+
+    inserted = sum(1 for row in rows if row[0] not in existing)
+    return {
+        "inserted": inserted,
+        "changed": len(rows) - inserted,
+        "unchanged": len(statuses) - len(rows),
+    }
+def _summary_filters(class_id=None, start_date=None, end_date=None):
+    clauses, params = [], []
+    if class_id is not None:
+        clauses.append("a.class_id = ?")
+        params.append(class_id)
+    if start_date is not None:
+        clauses.append("a.date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("a.date <= ?")
+        params.append(str(end_date))
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, params
+
+
+def get_attendance_summary(class_id=None, start_date=None, end_date=None):
+    """Raw attendance rows (for export), filtered in SQL."""
+    where, params = _summary_filters(class_id, start_date, end_date)
+    conn = get_connection()
+    query = f"""
     SELECT 
         a.date,
-        s.first_name || ' ' || IFNULL(s.middle_name || ' ', '') || s.last_name AS student_name,
+        {full_name_sql()} AS student_name,
         c.name AS class,
         a.status
     FROM attendance a
     JOIN students s ON a.student_id = s.id
     JOIN classes c ON a.class_id = c.id
+    {where}
     ORDER BY a.date DESC;
     """
-    df = pd.read_sql_query(query, conn)
+    df = pd.read_sql_query(query, conn, params=params)
     conn.close()
     return df
+
+
+def get_attendance_aggregates(class_id=None, start_date=None, end_date=None):
+    """Counts for the Attendance Summary charts, read from the daily rollup.
+
+    Returns a dict of DataFrames: ``daily`` (date, status, count),
+    ``by_class`` (class, status, count) and ``overall`` (status, count).
+    """
+    counts = get_daily_counts(class_id, start_date, end_date)
+    daily = counts.groupby(["date", "status"], as_index=False)["count"].sum()
+    by_class = counts.groupby(["class", "status"], as_index=False)["count"].sum()
+    overall = (
+        counts.groupby("status", as_index=False)["count"].sum()
+        .sort_values("count", ascending=False, ignore_index=True)
+    )
+    return {"daily": daily, "by_class": by_class, "overall": overall}
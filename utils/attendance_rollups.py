@@ -0,0 +1,207 @@
+"""Attendance rollup tables kept current by triggers.
+
+``attendance_daily_rollup``   date x class x status -> count
+``attendance_term_rollup``    student x year x term x status -> count
+
+Triggers on ``attendance`` adjust the counts on every insert, update and
+delete, so dashboards read a few hundred rollup rows instead of the full
+history. Deleting a student deletes their attendance rows (and so their
+counts), matching the raw export, which only lists existing students.
+Rebuild from scratch with::
+
+    python -m utils.attendance_rollups --rebuild
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from config import TERMS
+from utils.db import get_connection
+from utils.student import full_name_sql
+
+ATTENDED_STATUSES = ("Present", "Late")
+
+
+def _term_sql(date_expr):
+    month = f"CAST(strftime('%m', {date_expr}) AS INTEGER)"
+    cases = " ".join(
+        f"WHEN {month} BETWEEN {first} AND {last} THEN '{term}'"
+        for term, (first, last) in TERMS.items()
+    )
+    return f"CASE {cases} END"
+
+
+def _year_sql(date_expr):
+    return f"CAST(strftime('%Y', {date_expr}) AS INTEGER)"
+
+
+def _bump_sql(row, delta):
+    """Statements adding ``delta`` to both rollups for trigger row NEW/OLD.
+
+    Rows with a missing key are skipped, the same as ``rebuild`` skips them.
+    """
+    term = _term_sql(f"{row}.date")
+    return f"""
+        INSERT INTO attendance_daily_rollup (date, class_id, status, count)
+        SELECT {row}.date, {row}.class_id, {row}.status, {delta}
+        WHERE {row}.date IS NOT NULL AND {row}.class_id IS NOT NULL AND {row}.status IS NOT NULL
+        ON CONFLICT (date, class_id, status) DO UPDATE SET count = count + {delta};
+        INSERT INTO attendance_term_rollup (student_id, year, term, status, count)
+        SELECT {row}.student_id, {_year_sql(f'{row}.date')}, {term}, {row}.status, {delta}
+        WHERE {row}.student_id IS NOT NULL AND {term} IS NOT NULL AND {row}.status IS NOT NULL
+        ON CONFLICT (student_id, year, term, status) DO UPDATE SET count = count + {delta};
+    """
+
+
+def install(conn):
+    """Create the rollup tables and (re)create their triggers.
+
+    Triggers are recreated so a change to ``config.TERMS`` takes effect;
+    run ``rebuild`` afterwards to recount existing rows.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_daily_rollup (
+            date DATE NOT NULL,
+            class_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (date, class_id, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_term_rollup (
+            student_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (student_id, year, term, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_daily_rollup_class "
+        "ON attendance_daily_rollup(class_id, date)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_term_rollup_term "
+        "ON attendance_term_rollup(year, term)"
+    )
+    for name in ("trg_attendance_rollup_insert", "trg_attendance_rollup_delete",
+                 "trg_attendance_rollup_update", "trg_attendance_student_delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+        CREATE TRIGGER trg_attendance_rollup_insert AFTER INSERT ON attendance
+        BEGIN {_bump_sql('NEW', 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_attendance_rollup_delete AFTER DELETE ON attendance
+        BEGIN {_bump_sql('OLD', -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_attendance_rollup_update
+        AFTER UPDATE OF student_id, class_id, date, status ON attendance
+        BEGIN {_bump_sql('OLD', -1)} {_bump_sql('NEW', 1)} END
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_attendance_student_delete AFTER DELETE ON students
+        BEGIN
+            DELETE FROM attendance WHERE student_id = OLD.id;
+        END
+    """)
+
+
+def rebuild(conn):
+    """Recount both rollups from the attendance table (caller commits)."""
+    conn.execute("DELETE FROM attendance_daily_rollup")
+    conn.execute("DELETE FROM attendance_term_rollup")
+    conn.execute("""
+        INSERT INTO attendance_daily_rollup (date, class_id, status, count)
+        SELECT date, class_id, status, COUNT(*)
+        FROM attendance
+        WHERE date IS NOT NULL AND class_id IS NOT NULL AND status IS NOT NULL
+        GROUP BY date, class_id, status
+    """)
+    conn.execute(f"""
+        INSERT INTO attendance_term_rollup (student_id, year, term, status, count)
+        SELECT student_id, {_year_sql('date')}, {_term_sql('date')}, status, COUNT(*)
+        FROM attendance
+        WHERE student_id IS NOT NULL AND {_term_sql('date')} IS NOT NULL AND status IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def get_daily_counts(class_id=None, start_date=None, end_date=None):
+    """(date, class_id, class, status, count) rows from the daily rollup."""
+    clauses, params = ["r.count > 0"], []
+    if class_id is not None:
+        clauses.append("r.class_id = ?")
+        params.append(class_id)
+    if start_date is not None:
+        clauses.append("r.date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("r.date <= ?")
+        params.append(str(end_date))
+    conn = get_connection()
+    df = pd.read_sql_query(f"""
+        SELECT r.date, r.class_id, c.name AS class, r.status, r.count
+        FROM attendance_daily_rollup r
+        JOIN classes c ON r.class_id = c.id
+        WHERE {" AND ".join(clauses)}
+        ORDER BY r.date
+    """, conn, params=params)
+    conn.close()
+    return df
+
+
+def get_student_attendance_rates(year, term, class_id=None):
+    """Per-student status counts and attendance % for one term."""
+    query = f"""
+        SELECT r.student_id,
+               {full_name_sql()} AS student_name,
+               c.name AS class, r.status, r.count
+        FROM attendance_term_rollup r
+        JOIN students s ON r.student_id = s.id
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE r.year = ? AND r.term = ? AND r.count > 0
+    """
+    params = [int(year), term]
+    if class_id is not None:
+        query += " AND s.class_id = ?"
+        params.append(class_id)
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    if df.empty:
+        return pd.DataFrame(columns=["student_id", "student_name", "class", "total", "attendance_pct"])
+
+    rates = df.pivot_table(index=["student_id", "student_name", "class"], columns="status",
+                           values="count", aggfunc="sum", fill_value=0)
+    rates["total"] = rates.sum(axis=1)
+    attended = rates[[s for s in ATTENDED_STATUSES if s in rates.columns]].sum(axis=1)
+    rates["attendance_pct"] = (attended / rates["total"] * 100).round(1)
+    return rates.reset_index().rename_axis(columns=None).sort_values("attendance_pct")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain attendance rollup tables.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recreate triggers and recount rollups from attendance")
+    parser.add_argument("--db", help="database file (defaults to config.DB_NAME)")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+    conn = get_connection(args.db)
+    with conn:
+        install(conn)
+        rebuild(conn)
+    days = conn.execute("SELECT COUNT(*) FROM attendance_daily_rollup").fetchone()[0]
+    terms = conn.execute("SELECT COUNT(*) FROM attendance_term_rollup").fetchone()[0]
+    print(f"Rebuilt attendance rollups: {days} daily rows, {terms} student-term rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
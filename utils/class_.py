@@ -1,11 +1,9 @@
-import sqlite3
 import pandas as pd
-
-DB_PATH = "school.db"
+from utils.db import get_connection
 
 def get_all_classes():
     """Return a DataFrame of all classes."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     df = pd.read_sql_query("SELECT id, name FROM classes", conn)
     conn.close()
     return df
@@ -13,7 +11,7 @@ def get_all_classes():
 
 def get_class_name_by_id(class_id):
     """Return class name for a given class ID."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute("SELECT name FROM classes WHERE id = ?", (class_id,))
     result = cur.fetchone()
@@ -23,7 +21,7 @@ def get_class_name_by_id(class_id):
 
 def add_class(name):
     """Add a new class."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute("INSERT INTO classes (name) VALUES (?)", (name,))
     conn.commit()
@@ -32,5 +30,5 @@ def add_class(name):
 
 def update_class(class_id, name):
     """Update an existing class."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cur
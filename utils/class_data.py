@@ -1,9 +1,7 @@
-import sqlite3
-
-DB_NAME = "school.db"
+from utils.db import get_connection
 
 def get_all_classes():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, name FROM classes ORDER BY name")
     rows = cursor.fetchall()
@@ -15,7 +13,7 @@ def get_all_classes():
     return class_list
 
 def get_class_by_id(class_id):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id, name FROM classes WHERE id = ?", (class_id,))
     row = cursor.fetchone()
@@ -25,27 +23,27 @@ def get_class_by_id(class_id):
     return None
 
 def add_class(name):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO classes (name) VALUES (?)", (name,))
     conn.commit()
     conn.close()
 
 def update_class(class_id, name):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE classes SET name = ? WHERE id = ?", (name, class_id))
     conn.commit()
     conn.close()
 
 def delete_class(class_id):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM classes WHERE id = ?", (class_id,))
     conn.commit()
     conn.close()
 def class_name_to_id(class_name):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id FROM classes WHERE name = ?", (class_name,))
     row = cursor.fetchone()
@@ -1,9 +1,8 @@
-import sqlite3
 import pandas as pd
-from utils.db import DB_PATH
+from utils.db import get_connection
 
 def get_classes():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     query = '''
         SELECT
             c.id,
@@ -23,21 +22,21 @@ def get_classes():
     return df
 
 def assign_class_teacher(class_id, teacher_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE classes SET class_teacher_id = ? WHERE id = ?", (teacher_id, class_id))
     conn.commit()
     conn.close()
 
 def get_all_classes():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     query = "SELECT id, name AS class_name FROM classes ORDER BY name;"
     df = pd.read_sql_query(query, conn)
     conn.close()
     return df
 
 def add_class(class_name):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("INSERT INTO classes (name) VALUES (?)", (class_name,))
     conn.commit()
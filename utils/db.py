@@ -1,7 +1,217 @@
+import os
 import sqlite3
+import threading
+import time
 from config import DB_NAME
-import os
+from utils import query_log
+
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'school.db')
 
-def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+# Pragmas applied once when a pooled connection is opened.
+CACHE_SIZE_KB = 64 * 1024          # page cache per connection (negative = KiB)
+MMAP_SIZE = 256 * 1024 * 1024      # memory-mapped I/O window
+BUSY_TIMEOUT_MS = 5000
+MAX_IDLE_CONNECTIONS = 8
+
+_lock = threading.Lock()
+_local = threading.local()
+_idle = {}       # db path -> [PooledConnection] released by finished threads
+_bound = {}      # (thread ident, db path) -> (thread, PooledConnection)
+_stats = {"created": 0, "reused": 0, "recycled": 0, "discarded": 0}
+_generation = 0  # bumped by close_all() so threads drop their cached handles
+_migrated = set()  # db paths whose schema has been brought up to date
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement, including fetching its rows."""
+
+    _record = None
+
+    def _start(self, sql):
+        if self._record is not None:
+            self._record.finish()
+        self._record = query_log.QueryRecord(sql, query_log.calling_page())
+        return time.perf_counter()
+
+    def _stop(self, started, rows=0):
+        self._record.elapsed_ms += (time.perf_counter() - started) * 1000
+        self._record.rows += rows
+
+    def execute(self, sql, parameters=()):
+        started = self._start(sql)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._stop(started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = self._start(sql)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._stop(started, max(self.rowcount, 0))
+
+    def executescript(self, sql_script):
+        started = self._start(sql_script)
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._stop(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._record is not None:
+            self._stop(started, row is not None)
+            if row is None:
+                self._record.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._record is not None:
+            self._stop(started, len(rows))
+            if not rows:
+                self._record.finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._record is not None:
+            self._stop(started, len(rows))
+            self._record.finish()
+        return rows
+
+    def close(self):
+        if self._record is not None:
+            self._record.finish()
+        super().close()
+
+    def __del__(self):
+        if self._record is not None:
+            self._record.finish()
+
+
+class PooledConnection(sqlite3.Connection):
+    """A sqlite3 connection that stays open for reuse by its thread.
+
+    Helpers written against plain ``sqlite3.connect`` call ``close()`` when
+    they are done; for a pooled connection that only rolls back whatever was
+    left uncommitted, which is what closing a real connection would do.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The Connection shortcuts bypass cursor(), so route them through it.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def _close(self):
+        super().close()
+
+
+def _apply_pragmas(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+    )
+    _apply_pragmas(conn)
+    if path not in _migrated:
+        from utils.migrations import migrate
+        migrate(conn)
+        _migrated.add(path)
+    return conn
+
+
+def _reap_dead_threads():
+    """Move connections owned by finished threads back to the idle pool."""
+    for key, (thread, conn) in list(_bound.items()):
+        if thread.is_alive():
+            continue
+        del _bound[key]
+        idle = _idle.setdefault(key[1], [])
+        conn.close()
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            _stats["recycled"] += 1
+        else:
+            conn._close()
+            _stats["discarded"] += 1
+
+
+def get_connection(db_path=None):
+    """Return this thread's pooled connection to the school database."""
+    path = os.path.abspath(db_path or DB_NAME)
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.generation != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+
+    conn = conns.get(path)
+    if conn is not None:
+        with _lock:
+            _stats["reused"] += 1
+        return conn
+
+    with _lock:
+        _reap_dead_threads()
+        idle = _idle.get(path)
+        if idle:
+            conn = idle.pop()
+            _stats["reused"] += 1
+        else:
+            conn = _open(path)
+            _stats["created"] += 1
+        thread = threading.current_thread()
+        _bound[(thread.ident, path)] = (thread, conn)
+
+    conns[path] = conn
+    return conn
+
+
+def pool_stats():
+    """Return counters describing how connections are being reused."""
+    with _lock:
+        _reap_dead_threads()
+        return {
+            **_stats,
+            "in_use": len(_bound),
+            "idle": sum(len(conns) for conns in _idle.values()),
+        }
+
+
+def close_all():
+    """Close every pooled connection, e.g. before replacing the database file."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for _, conn in _bound.values():
+            conn._close()
+        for conns in _idle.values():
+            for conn in conns:
+                conn._close()
+        _bound.clear()
+        _idle.clear()
@@ -0,0 +1,121 @@
+"""On-disk cache for generated downloads (Excel workbooks, PDF statements).
+
+An export is keyed by a SHA-256 of its kind, its template version and the
+data it is built from, so an unchanged report is served from disk instead
+of being rebuilt on every rerun. Bump the version passed by the caller when
+an export's layout changes. The directory is kept under
+``EXPORT_CACHE_MAX_MB``; reading an entry refreshes its mtime, and the
+least recently used files are removed first.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+import pandas as pd
+
+from config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_MB
+
+_stats = {"hits": 0, "misses": 0, "evicted": 0}
+_lock = threading.Lock()
+
+
+def _update(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([str(c) for c in value.columns]).encode())
+        digest.update(json.dumps([str(t) for t in value.dtypes]).encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(value, index=False).values.tobytes())
+        except TypeError:
+            # Unhashable cells (lists, dicts); fall back to their text form.
+            digest.update(value.to_csv(index=False).encode())
+    elif isinstance(value, (bytes, bytearray)):
+        digest.update(value)
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+def cache_key(kind, version, *inputs):
+    """Hex digest identifying an export of ``kind`` built from ``inputs``."""
+    digest = hashlib.sha256(f"{kind}:{version}".encode())
+    for value in inputs:
+        digest.update(b"\x00")
+        _update(digest, value)
+    return digest.hexdigest()
+
+
+def _path(key):
+    return os.path.join(EXPORT_CACHE_DIR, key[:2], key)
+
+
+def get_or_build(kind, version, inputs, build):
+    """Bytes of the export, built with ``build()`` only on a cache miss.
+
+    ``inputs`` is a list of the DataFrames/values the export depends on.
+    ``build`` may return bytes or a BytesIO.
+    """
+    path = _path(cache_key(kind, version, *inputs))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        _stats["hits"] += 1
+        return data
+    except FileNotFoundError:
+        pass
+
+    _stats["misses"] += 1
+    data = build()
+    if isinstance(data, io.BytesIO):
+        data = data.getvalue()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        evict()
+    except OSError:
+        pass  # a read-only or full disk only costs us the cache
+    return data
+
+
+def _entries():
+    for root, _, files in os.walk(EXPORT_CACHE_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+
+def evict(max_bytes=None):
+    """Remove least recently used entries until the cache fits ``max_bytes``."""
+    limit = EXPORT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    with _lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                _stats["evicted"] += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def cache_stats():
+    entries = list(_entries())
+    return dict(_stats, entries=len(entries),
+                size_mb=round(sum(size for _, size, _ in entries) / 1024 / 1024, 2))
+
+
+def clear():
+    evict(max_bytes=0)
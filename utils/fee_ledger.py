@@ -0,0 +1,282 @@
+"""Per-student fee ledger with a running balance.
+
+Every fee charge (one per student for each fee structure of their class)
+and every payment is an entry in ``fee_ledger``. ``amount`` is positive for
+charges and negative for payments, and ``balance`` is the running amount
+owed after the entry, ordered by ``(entry_date, id)``. Charges are dated on
+the first day of their term (``config.TERMS``).
+
+The fee helpers in utils.fees post and remove entries in the same
+transaction as the row they write. Triggers on ``students`` do the same for
+student rows: a new student is charged every fee structure of their class,
+a class change swaps the charges for those of the new class, and deleting a
+student drops their entries. The whole ledger can be recreated with::
+
+    python -m utils.fee_ledger --rebuild
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from config import TERMS
+from utils.db import get_connection
+from utils.student import full_name_sql
+
+
+def term_start(year, term):
+    """ISO date a term's charges are posted on."""
+    first_month = TERMS.get(term, (1, 1))[0]
+    return f"{int(year)}-{first_month:02d}-01"
+
+
+def _charge_date_sql(fs):
+    """Term start of fee structure row ``fs`` as an SQL expression."""
+    charge_dates = " ".join(
+        f"WHEN '{term}' THEN printf('%04d-%02d-01', {fs}.year, {first})"
+        for term, (first, _) in TERMS.items()
+    )
+    return f"CASE {fs}.term {charge_dates} ELSE printf('%04d-01-01', {fs}.year) END"
+
+
+def _charge_student_sql(student):
+    """Post a charge for every fee structure of trigger row ``student``'s class."""
+    return f"""
+        INSERT INTO fee_ledger (student_id, entry_date, kind, source_id, term, year, amount, balance)
+        SELECT {student}.id, {_charge_date_sql('fs')}, 'charge', fs.id, fs.term, fs.year, fs.amount, 0
+        FROM fee_structures fs
+        JOIN classes c ON c.name = fs.level
+        WHERE c.id = {student}.class_id;
+    """
+
+
+def _rebalance_sql(student):
+    """Recompute the running balances of trigger row ``student``."""
+    return f"""
+        UPDATE fee_ledger SET balance = (
+            SELECT SUM(l.amount) FROM fee_ledger l
+            WHERE l.student_id = fee_ledger.student_id
+              AND (l.entry_date < fee_ledger.entry_date
+                   OR (l.entry_date = fee_ledger.entry_date AND l.id <= fee_ledger.id))
+        )
+        WHERE student_id = {student}.id;
+    """
+
+
+def install(conn):
+    """Create the ledger table and (re)create its triggers on ``students``."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fee_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL REFERENCES students(id),
+            entry_date TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN ('charge', 'payment')),
+            source_id INTEGER NOT NULL,
+            term TEXT,
+            year INTEGER,
+            amount REAL NOT NULL,
+            balance REAL NOT NULL
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_fee_ledger_student_date "
+        "ON fee_ledger(student_id, entry_date, id, balance)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_fee_ledger_source "
+        "ON fee_ledger(kind, source_id)"
+    )
+    for event in ("insert", "class", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_fee_ledger_student_{event}")
+    conn.execute(f"""
+        CREATE TRIGGER trg_fee_ledger_student_insert AFTER INSERT ON students
+        WHEN NEW.class_id IS NOT NULL
+        BEGIN {_charge_student_sql('NEW')} {_rebalance_sql('NEW')} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_fee_ledger_student_class AFTER UPDATE OF class_id ON students
+        WHEN OLD.class_id IS NOT NEW.class_id
+        BEGIN
+            DELETE FROM fee_ledger WHERE student_id = OLD.id AND kind = 'charge';
+            {_charge_student_sql('NEW')} {_rebalance_sql('NEW')}
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER trg_fee_ledger_student_delete AFTER DELETE ON students
+        BEGIN
+            DELETE FROM fee_ledger WHERE student_id = OLD.id;
+        END
+    """)
+
+
+def _post(conn, student_id, entry_date, kind, source_id, term, year, amount):
+    previous = conn.execute("""
+        SELECT balance FROM fee_ledger
+        WHERE student_id = ? AND entry_date <= ?
+        ORDER BY entry_date DESC, id DESC LIMIT 1
+    """, (student_id, entry_date)).fetchone()
+    conn.execute("""
+        INSERT INTO fee_ledger (student_id, entry_date, kind, source_id, term, year, amount, balance)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (student_id, entry_date, kind, source_id, term, year, amount,
+          (previous[0] if previous else 0) + amount))
+    # A back-dated entry shifts every later balance of that student.
+    conn.execute(
+        "UPDATE fee_ledger SET balance = balance + ? WHERE student_id = ? AND entry_date > ?",
+        (amount, student_id, entry_date),
+    )
+
+
+def _remove(conn, kind, source_id):
+    entries = conn.execute(
+        "SELECT id, student_id, entry_date, amount FROM fee_ledger WHERE kind = ? AND source_id = ?",
+        (kind, source_id),
+    ).fetchall()
+    for entry_id, student_id, entry_date, amount in entries:
+        conn.execute("DELETE FROM fee_ledger WHERE id = ?", (entry_id,))
+        conn.execute("""
+            UPDATE fee_ledger SET balance = balance - ?
+            WHERE student_id = ? AND (entry_date > ? OR (entry_date = ? AND id > ?))
+        """, (amount, student_id, entry_date, entry_date, entry_id))
+
+
+def post_payment(conn, payment_id, student_id, amount_paid, payment_date, term, year):
+    entry_date = str(payment_date) if payment_date else term_start(year, term)
+    _post(conn, student_id, entry_date, "payment", payment_id, term, year, -float(amount_paid))
+
+
+def remove_payment(conn, payment_id):
+    _remove(conn, "payment", payment_id)
+
+
+def post_fee_structure(conn, structure_id, level, amount, year, term):
+    """Charge every student currently in class ``level``."""
+    students = conn.execute("""
+        SELECT s.id FROM students s JOIN classes c ON s.class_id = c.id WHERE c.name = ?
+    """, (level,)).fetchall()
+    entry_date = term_start(year, term)
+    for (student_id,) in students:
+        _post(conn, student_id, entry_date, "charge", structure_id, term, year, float(amount))
+
+
+def remove_fee_structure(conn, structure_id):
+    _remove(conn, "charge", structure_id)
+
+
+def rebuild(conn, student_ids=None):
+    """Recreate every ledger entry and running balance (caller commits).
+
+    With ``student_ids``, only the entries of those students are recreated,
+    e.g. after their payments were bulk-inserted.
+    """
+    student_filter = ""
+    if student_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ledger_rebuild_students (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.ledger_rebuild_students")
+        conn.executemany("INSERT OR IGNORE INTO temp.ledger_rebuild_students (id) VALUES (?)",
+                         [(int(student_id),) for student_id in student_ids])
+        student_filter = "WHERE s.id IN (SELECT id FROM temp.ledger_rebuild_students)"
+        conn.execute(
+            "DELETE FROM fee_ledger WHERE student_id IN (SELECT id FROM temp.ledger_rebuild_students)"
+        )
+    else:
+        conn.execute("DELETE FROM fee_ledger")
+    conn.execute(f"""
+        INSERT INTO fee_ledger (student_id, entry_date, kind, source_id, term, year, amount, balance)
+        SELECT student_id, entry_date, kind, source_id, term, year, amount,
+               SUM(amount) OVER (PARTITION BY student_id ORDER BY entry_date, seq, source_id
+                                 ROWS UNBOUNDED PRECEDING)
+        FROM (
+            SELECT s.id AS student_id,
+                   {_charge_date_sql('fs')} AS entry_date,
+                   'charge' AS kind, 0 AS seq, fs.id AS source_id, fs.term, fs.year, fs.amount
+            FROM fee_structures fs
+            JOIN classes c ON c.name = fs.level
+            JOIN students s ON s.class_id = c.id
+            {student_filter}
+            UNION ALL
+            SELECT fp.student_id, COALESCE(fp.payment_date, printf('%04d-01-01', fp.year)),
+                   'payment', 1, fp.id, fp.term, fp.year, -fp.amount_paid
+            FROM fee_payments fp
+            JOIN students s ON s.id = fp.student_id
+            {student_filter}
+        )
+        ORDER BY student_id, entry_date, seq, source_id
+    """)
+
+
+def balance_as_of(student_id, as_of=None):
+    """Amount a student owes after every entry dated on or before ``as_of``."""
+    query = "SELECT balance FROM fee_ledger WHERE student_id = ?"
+    params = [int(student_id)]
+    if as_of is not None:
+        query += " AND entry_date <= ?"
+        params.append(str(as_of))
+    query += " ORDER BY entry_date DESC, id DESC LIMIT 1"
+    conn = get_connection()
+    row = conn.execute(query, params).fetchone()
+    conn.close()
+    return row[0] if row else 0.0
+
+
+def get_statement(student_id, as_of=None):
+    """Ledger entries of one student with their running balance."""
+    query = """
+        SELECT entry_date, kind, term, year, amount, balance
+        FROM fee_ledger WHERE student_id = ?
+    """
+    params = [int(student_id)]
+    if as_of is not None:
+        query += " AND entry_date <= ?"
+        params.append(str(as_of))
+    query += " ORDER BY entry_date, id"
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+
+def get_balances_as_of(as_of=None, class_level=None):
+    """Latest running balance of every student as of a date."""
+    date_filter = "AND l.entry_date <= ?" if as_of is not None else ""
+    params = [str(as_of)] if as_of is not None else []
+    query = f"""
+        SELECT s.id AS student_id,
+               {full_name_sql()} AS student_name,
+               c.name AS class_level,
+               (SELECT l.balance FROM fee_ledger l
+                WHERE l.student_id = s.id {date_filter}
+                ORDER BY l.entry_date DESC, l.id DESC LIMIT 1) AS balance
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+    """
+    if class_level:
+        query += " WHERE c.name = ?"
+        params.append(class_level)
+    conn = get_connection()
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    df["balance"] = df["balance"].fillna(0)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the fee ledger.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recreate all ledger entries from fee_structures and fee_payments")
+    parser.add_argument("--db", help="database file (defaults to config.DB_NAME)")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+    conn = get_connection(args.db)
+    with conn:
+        install(conn)
+        rebuild(conn)
+    count = conn.execute("SELECT COUNT(*) FROM fee_ledger").fetchone()[0]
+    print(f"Rebuilt fee ledger: {count} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Fee statement PDFs, one at a time or for a whole class/school.
+
+Batch runs load balances and payments with two queries, then render the
+statements across CPU cores with a process pool. Each worker parses the
+school logo once and reuses it for every statement it renders. Results
+stream into a ZIP (one PDF per student) or are laid out as one merged PDF.
+
+    python -m utils.fee_statements --class "Grade 4" --year 2025 -o statements.zip
+"""
+import argparse
+import io
+import os
+import sys
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+
+from utils import export_cache
+from utils.fees import get_fee_payments, get_student_balances
+
+SCHOOL_NAME = "My School Name"
+LOGO_PATH = "assets/logo.png"
+TEMPLATE_VERSION = 1  # bump when the statement layout changes
+CHUNK_SIZE = 50  # statements per task sent to a worker
+
+_logo_info = None  # parsed logo, reused by every statement in this process
+
+
+def _load_logo():
+    global _logo_info
+    if _logo_info is None:
+        _logo_info = {}
+        try:
+            probe = FPDF()
+            probe.add_page()
+            probe.image(LOGO_PATH, x=10, y=8, w=30)
+            _logo_info = dict(probe.images[LOGO_PATH])
+        except Exception:
+            pass
+    return _logo_info
+
+
+def _draw_statement(pdf, student_data, payments):
+    pdf.add_page()
+    logo = _load_logo()
+    if logo:
+        if LOGO_PATH not in pdf.images:
+            pdf.images[LOGO_PATH] = dict(logo, i=len(pdf.images) + 1)
+        pdf.image(LOGO_PATH, x=10, y=8, w=30)
+
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, SCHOOL_NAME, ln=True, align="C")
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, f"Fee Statement for {student_data['student_name']}", ln=True, align="C")
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 10, f"Class: {student_data['class_level']}", ln=True)
+
+    pdf.ln(10)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(40, 10, "Date")
+    pdf.cell(40, 10, "Method")
+    pdf.cell(40, 10, "Term")
+    pdf.cell(40, 10, "Amount", ln=True)
+    pdf.set_font("Arial", "", 12)
+
+    term_totals = defaultdict(float)
+    for row in payments:
+        pdf.cell(40, 10, str(row["payment_date"]))
+        pdf.cell(40, 10, str(row["method"]))
+        pdf.cell(40, 10, str(row["term"]))
+        pdf.cell(40, 10, f"KES {row['amount_paid']:,.0f}", ln=True)
+        term_totals[(row["year"], row["term"])] += row["amount_paid"]
+
+    pdf.ln(10)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, f"Total Expected: KES {student_data['expected_fee']:,.0f}", ln=True)
+    pdf.cell(0, 10, f"Total Paid: KES {student_data['amount_paid']:,.0f}", ln=True)
+    pdf.cell(0, 10, f"Balance: KES {student_data['balance']:,.0f}", ln=True)
+
+    pdf.ln(10)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Term Breakdown", ln=True)
+    pdf.set_font("Arial", "", 12)
+    for (year, term), amount in sorted(term_totals.items()):
+        pdf.cell(0, 10, f"{term} {year}: KES {amount:,.0f}", ln=True)
+
+    pdf.ln(20)
+    pdf.cell(0, 10, "_________________________", ln=True)
+    pdf.cell(0, 10, "Headteacher Signature", ln=True)
+
+
+def render_statement(student_data, payments):
+    """PDF bytes for one student. ``payments`` is a list of payment dicts."""
+    pdf = FPDF()
+    _draw_statement(pdf, student_data, payments)
+    return pdf.output(dest="S").encode("latin1")
+
+
+def cached_statement(student_data, payments):
+    """``render_statement`` through the export cache; ``payments`` is a DataFrame."""
+    try:
+        logo = os.stat(LOGO_PATH)
+        logo_version = (logo.st_size, logo.st_mtime)
+    except OSError:
+        logo_version = None
+    return export_cache.get_or_build(
+        "fee_statement", TEMPLATE_VERSION, [student_data, logo_version, payments],
+        lambda: render_statement(student_data, payments.to_dict("records")),
+    )
+
+
+def _render_chunk(chunk):
+    return [(filename, render_statement(data, payments)) for filename, data, payments in chunk]
+
+
+def _statement_jobs(class_level=None, year=None, term=None):
+    """(filename, student totals, payments) for every student with fees or payments."""
+    balances = get_student_balances(class_level=class_level, term=term, year=year)
+    payments = get_fee_payments(class_level=class_level)
+    if term is not None:
+        payments = payments[payments["term"] == term]
+    if year is not None:
+        payments = payments[payments["year"].astype(str) == str(year)]
+
+    payments_by_student = defaultdict(list)
+    for row in payments.to_dict("records"):
+        payments_by_student[row["student_id"]].append(row)
+
+    totals = balances.groupby(["student_id", "student_name"], as_index=False).agg(
+        class_level=("class_level", "first"),
+        expected_fee=("expected_fee", "sum"),
+        amount_paid=("amount_paid", "sum"),
+        balance=("balance", "sum"),
+    )
+    jobs = []
+    for data in totals.to_dict("records"):
+        safe_name = "".join(ch if ch.isalnum() or ch in " -_" else "_" for ch in data["student_name"])
+        filename = f"{data['student_id']}_{safe_name.strip()}_Fee_Statement.pdf"
+        jobs.append((filename, data, payments_by_student.get(data["student_id"], [])))
+    return jobs
+
+
+def generate_statements(class_level=None, year=None, term=None, merged=False,
+                        workers=None, progress=None):
+    """Statements for every student matching the filters.
+
+    Returns ZIP bytes (one PDF per student), or a single PDF with one
+    statement per page when ``merged`` is true. ``progress(done, total)`` is
+    called as statements complete.
+    """
+    jobs = _statement_jobs(class_level, year, term)
+    total = len(jobs)
+
+    if merged:
+        # One document can't be split across processes, so lay it out here;
+        # the logo is still parsed only once.
+        pdf = FPDF()
+        for done, (_, data, payments) in enumerate(jobs, start=1):
+            _draw_statement(pdf, data, payments)
+            if progress and (done % CHUNK_SIZE == 0 or done == total):
+                progress(done, total)
+        return pdf.output(dest="S").encode("latin1")
+
+    output = io.BytesIO()
+    chunks = [jobs[i:i + CHUNK_SIZE] for i in range(0, total, CHUNK_SIZE)]
+    done = 0
+    # fpdf already deflates page streams and the logo is a PNG; compressing
+    # again costs more than half the run for almost no size gain.
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for rendered in pool.map(_render_chunk, chunks):
+                for filename, content in rendered:
+                    archive.writestr(filename, content)
+                done += len(rendered)
+                if progress:
+                    progress(done, total)
+    return output.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate fee statements in bulk.")
+    parser.add_argument("--class", dest="class_level", help="class level (default: whole school)")
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--term")
+    parser.add_argument("--merged", action="store_true", help="write one merged PDF instead of a ZIP")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        print(f"\r{done}/{total} statements", end="", flush=True)
+
+    data = generate_statements(args.class_level, args.year, args.term, merged=args.merged,
+                               workers=args.workers, progress=report)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"\nWrote {args.output} ({len(data) / 1024:,.0f} KiB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
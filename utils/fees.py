@@ -1,11 +1,11 @@
-import sqlite3
 import pandas as pd
 from datetime import datetime
-
-DB = "school.db"
+from utils.db import get_connection
+from utils import fee_ledger
+from utils.student import full_name_sql
 
 def create_connection():
-    return sqlite3.connect(DB, check_same_thread=False)
+    return get_connection()
 
 def get_fee_structures():
     conn = create_connection()
@@ -20,33 +20,35 @@ def get_fee_structures():
 
 def add_fee_structure(level, amount, year, term):
     conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO fee_structures (level, amount, year, term)
-        VALUES (?, ?, ?, ?)
-    ''', (level, amount, year, term))
-    conn.commit()
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO fee_structures (level, amount, year, term)
+            VALUES (?, ?, ?, ?)
+        ''', (level, amount, year, term))
+        fee_ledger.post_fee_structure(conn, cursor.lastrowid, level, amount, year, term)
     conn.close()
 
 def delete_fee_structure(structure_id):
     conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM fee_structures WHERE id = ?", (structure_id,))
-    conn.commit()
+    with conn:
+        conn.execute("DELETE FROM fee_structures WHERE id = ?", (structure_id,))
+        fee_ledger.remove_fee_structure(conn, structure_id)
     conn.close()
 
 def get_fee_payments(class_level=None):
     conn = create_connection()
-    query = '''
+    query = f'''
         SELECT 
             p.id, 
-            s.first_name || ' ' || s.middle_name || ' ' || s.last_name AS student_name,
+            p.student_id,
+            {full_name_sql()} AS student_name,
             c.name AS class_level,
             p.amount_paid, 
             p.payment_date, 
             p.method, 
             p.term, 
-            p.year
+            p.year,
+            p.reference
         FROM fee_payments p
         JOIN students s ON p.student_id = s.id
         LEFT JOIN classes c ON s.class_id = c.id
@@ -59,84 +61,200 @@ def get_fee_payments(class_level=None):
     conn.close()
     return df
 
-def add_fee_payment(student_id, amount_paid, payment_date, method, term, year):
+_INSERT_PAYMENT_SQL = '''
+    INSERT INTO fee_payments (student_id, amount_paid, payment_date, method, term, year, reference)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+def insert_fee_payment(conn, student_id, amount_paid, payment_date, method, term, year,
+                       reference=None):
+    """Insert a payment and its ledger entry on ``conn``; the caller commits."""
+    # numpy integers from DataFrame lookups would otherwise be stored as BLOBs.
+    student_id = int(student_id)
+    cursor = conn.execute(_INSERT_PAYMENT_SQL,
+                          (student_id, amount_paid, payment_date, method, term, year, reference or None))
+    fee_ledger.post_payment(conn, cursor.lastrowid, student_id, amount_paid, payment_date, term, year)
+    return cursor.lastrowid
+
+def insert_fee_payments(conn, payments):
+    """Bulk-insert payments on ``conn``; the caller commits.
+
+    ``payments`` are ``(student_id, amount_paid, payment_date, method, term,
+    year, reference)`` tuples. The ledger of the students paid for is rebuilt
+    once at the end instead of shifting balances payment by payment.
+    """
+    rows = [(int(student_id), float(amount), date, method, term, int(year), reference or None)
+            for student_id, amount, date, method, term, year, reference in payments]
+    conn.executemany(_INSERT_PAYMENT_SQL, rows)
+    fee_ledger.rebuild(conn, {row[0] for row in rows})
+    return len(rows)
+
+def add_fee_payment(student_id, amount_paid, payment_date, method, term, year, reference=None):
     conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO fee_payments (student_id, amount_paid, payment_date, method, term, year)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (student_id, amount_paid, payment_date, method, term, year))
-    conn.commit()
+    with conn:
+        payment_id = insert_fee_payment(conn, student_id, amount_paid, payment_date, method,
+                                        term, year, reference)
     conn.close()
+    return payment_id
 
-def delete_fee_payment(payment_id):
+def find_payment_by_reference(reference):
+    """``(id, student_id, amount_paid, payment_date)`` of the payment with this receipt, or None."""
     conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM fee_payments WHERE id = ?", (payment_id,))
-    conn.commit()
+    row = conn.execute(
+        "SELECT id, student_id, amount_paid, payment_date FROM fee_payments WHERE reference = ?",
+        (reference,),
+    ).fetchone()
     conn.close()
+    return row
 
-def get_student_fee_summary():
+def delete_fee_payment(payment_id):
     conn = create_connection()
-    query = '''
-        SELECT 
+    with conn:
+        conn.execute("DELETE FROM fee_payments WHERE id = ?", (payment_id,))
+        fee_ledger.remove_payment(conn, payment_id)
+    conn.close()
+
+def get_student_balances(class_level=None, term=None, year=None, outstanding_only=False,
+                         student_id=None):
+    """Expected fee, amount paid and balance per student/term/year.
+
+    A student gets a row for every term that has a fee structure for their
+    class or a payment from them, so unpaid students are listed too. All
+    aggregation and filtering happens in one SQL statement.
+    """
+    period_filters, period_params = [], []
+    if year is not None:
+        period_filters.append("year = ?")
+        period_params.append(int(year))
+    if term is not None:
+        period_filters.append("term = ?")
+        period_params.append(term)
+
+    # For one student, narrow each CTE to that student's class and payments,
+    # so the lookup is index searches instead of an aggregate over everyone.
+    structure_filters, structure_params = list(period_filters), list(period_params)
+    payment_filters, payment_params = list(period_filters), list(period_params)
+    roster_where, roster_params = "", []
+    if student_id is not None:
+        structure_filters.append(
+            "level = (SELECT c.name FROM students s JOIN classes c ON s.class_id = c.id WHERE s.id = ?)"
+        )
+        structure_params.append(int(student_id))
+        payment_filters.append("student_id = ?")
+        payment_params.append(int(student_id))
+        roster_where, roster_params = " WHERE s.id = ?", [int(student_id)]
+    structure_where = " WHERE " + " AND ".join(structure_filters) if structure_filters else ""
+    payment_where = " WHERE " + " AND ".join(payment_filters) if payment_filters else ""
+
+    student_filters, student_params = [], []
+    if class_level:
+        student_filters.append("c.name = ?")
+        student_params.append(class_level)
+    if student_id is not None:
+        student_filters.append("s.id = ?")
+        student_params.append(int(student_id))
+    student_where = " AND " + " AND ".join(student_filters) if student_filters else ""
+
+    query = f'''
+        WITH expected AS (
+            SELECT level, year, term, SUM(amount) AS amount
+            FROM fee_structures{structure_where}
+            GROUP BY level, year, term
+        ),
+        paid AS (
+            SELECT student_id, year, term, SUM(amount_paid) AS amount_paid
+            FROM fee_payments{payment_where}
+            GROUP BY student_id, year, term
+        ),
+        periods AS (
+            SELECT s.id AS student_id, e.year, e.term
+            FROM students s
+            JOIN classes c ON s.class_id = c.id
+            JOIN expected e ON e.level = c.name{roster_where}
+            UNION
+            SELECT student_id, year, term FROM paid
+        )
+        SELECT
             s.id AS student_id,
-            s.first_name || ' ' || s.middle_name || ' ' || s.last_name AS student_name,
+            {full_name_sql()} AS student_name,
             c.name AS class_level,
-            fs.amount AS expected_fee,
-            fp.amount_paid,
-            fp.term,
-            fp.year
-        FROM students s
+            p.term,
+            p.year,
+            COALESCE(e.amount, 0) AS expected_fee,
+            COALESCE(pd.amount_paid, 0) AS amount_paid,
+            COALESCE(e.amount, 0) - COALESCE(pd.amount_paid, 0) AS balance
+        FROM periods p
+        JOIN students s ON s.id = p.student_id
         LEFT JOIN classes c ON s.class_id = c.id
-        LEFT JOIN fee_payments fp ON s.id = fp.student_id
-        LEFT JOIN fee_structures fs 
-            ON fs.level = c.name AND fs.term = fp.term AND fs.year = fp.year
+        LEFT JOIN expected e ON e.level = c.name AND e.year = p.year AND e.term = p.term
+        LEFT JOIN paid pd ON pd.student_id = p.student_id AND pd.year = p.year AND pd.term = p.term
+        WHERE 1 = 1{student_where}
     '''
-    df = pd.read_sql_query(query, conn)
+    params = structure_params + payment_params + roster_params + student_params
+    if outstanding_only:
+        query += " AND COALESCE(e.amount, 0) - COALESCE(pd.amount_paid, 0) > 0"
+    query += " ORDER BY student_name, p.year, p.term"
+
+    conn = create_connection()
+    df = pd.read_sql_query(query, conn, params=params)
     conn.close()
+    return df
 
-    if df.empty:
-        return df
 
-    # Fill NA values
-    df['expected_fee'] = df['expected_fee'].fillna(0)
-    df['amount_paid'] = df['amount_paid'].fillna(0)
+def get_student_fee_summary():
+    return get_student_balances()
 
-    # Group by student, class, term, and year
-    grouped = df.groupby(
-        ["student_id", "student_name", "class_level", "term", "year"],
-        as_index=False
-    ).agg({
-        "expected_fee": "max",   # fee per term should be consistent
-        "amount_paid": "sum"
-    })
 
-    grouped["balance"] = grouped["expected_fee"] - grouped["amount_paid"]
-    return grouped
+def get_fee_summary(class_level=None, year=None, term=None):
+    """Expected fees, payments and balance per class.
 
+    Fee structures are summed per level/year/term and payments per student
+    before anything is joined to students, so neither side is multiplied
+    by the other's rows.
+    """
+    fs_filters, fp_filters, params_fs, params_fp = [], [], [], []
+    if year is not None:
+        fs_filters.append("year = ?")
+        fp_filters.append("year = ?")
+        params_fs.append(int(year))
+        params_fp.append(int(year))
+    if term is not None:
+        fs_filters.append("term = ?")
+        fp_filters.append("term = ?")
+        params_fs.append(term)
+        params_fp.append(term)
+    fs_where = " WHERE " + " AND ".join(fs_filters) if fs_filters else ""
+    fp_where = " WHERE " + " AND ".join(fp_filters) if fp_filters else ""
 
-def get_fee_summary(class_level=None):
-    conn = create_connection()
-    query = '''
-        SELECT 
+    query = f'''
+        WITH expected AS (
+            SELECT level, SUM(amount) AS per_student
+            FROM fee_structures{fs_where}
+            GROUP BY level
+        ),
+        paid AS (
+            SELECT student_id, SUM(amount_paid) AS amount_paid
+            FROM fee_payments{fp_where}
+            GROUP BY student_id
+        )
+        SELECT
             c.name AS class_level,
-            COUNT(DISTINCT s.id) AS num_students,
-            COALESCE(SUM(fs.amount), 0) AS total_expected,
-            COALESCE(SUM(fp.amount_paid), 0) AS total_paid,
-            COALESCE(SUM(fs.amount), 0) - COALESCE(SUM(fp.amount_paid), 0) AS total_balance
+            COUNT(s.id) AS num_students,
+            COUNT(s.id) * COALESCE(e.per_student, 0) AS total_expected,
+            COALESCE(SUM(p.amount_paid), 0) AS total_paid,
+            COUNT(s.id) * COALESCE(e.per_student, 0) - COALESCE(SUM(p.amount_paid), 0) AS total_balance
         FROM students s
         LEFT JOIN classes c ON s.class_id = c.id
-        LEFT JOIN fee_structures fs ON fs.level = c.name
-        LEFT JOIN fee_payments fp 
-            ON s.id = fp.student_id AND fs.term = fp.term AND fs.year = fp.year
+        LEFT JOIN expected e ON e.level = c.name
+        LEFT JOIN paid p ON p.student_id = s.id
     '''
-    params = ()
+    params = params_fs + params_fp
     if class_level:
         query += " WHERE c.name = ?"
-        params = (class_level,)
+        params.append(class_level)
 
     query += " GROUP BY c.name ORDER BY c.name"
+    conn = create_connection()
     df = pd.read_sql_query(query, conn, params=params)
     conn.close()
     return df
@@ -0,0 +1,257 @@
+"""Pre-aggregated finance cube over fee_payments and other_payments.
+
+``finance_cube`` holds one row per
+source x class x year x term x method x category x month
+with the amount paid and the number of payments. Fee payments use the
+category "School Fees". A payment is counted under its student's current
+class.
+
+Triggers keep the cube current: inserts, updates and deletes on either
+payment table adjust a single cell, and moving a student to another class
+moves their totals with them. Reports group a few thousand cube rows
+instead of every payment. Rebuild from scratch with::
+
+    python -m utils.finance_cube --rebuild
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from utils.db import get_connection
+
+SOURCES = {"fees": "fee_payments", "other": "other_payments"}
+# Columns whose change moves a payment to another cell.
+_CELL_COLUMNS = {
+    "fees": "student_id, amount_paid, payment_date, method, term, year",
+    "other": "student_id, amount_paid, payment_date, method, term, year, category",
+}
+FEE_CATEGORY = "School Fees"
+
+# Report dimension -> SQL expression over finance_cube f / classes c.
+DIMENSIONS = {
+    "source": "f.source",
+    "class": "COALESCE(c.name, 'No class')",
+    "year": "f.year",
+    "term": "f.term",
+    "method": "f.method",
+    "category": "f.category",
+    "month": "f.month",
+}
+
+_KEY = "source, class_id, year, term, method, category, month"
+_UPSERT = (
+    f"ON CONFLICT ({_KEY}) DO UPDATE SET "
+    "amount = amount + excluded.amount, payments = payments + excluded.payments"
+)
+
+
+def _cell_sql(source, row, class_expr):
+    """Cube key expressions for payment row ``row`` of ``source``."""
+    if source == "fees":
+        category = f"'{FEE_CATEGORY}'"
+    else:
+        category = f"COALESCE(NULLIF({row}.category, ''), 'Uncategorised')"
+    return ", ".join([
+        f"'{source}'",
+        class_expr,
+        f"COALESCE({row}.year, 0)",
+        f"COALESCE({row}.term, '')",
+        f"COALESCE({row}.method, '')",
+        category,
+        f"COALESCE(strftime('%Y-%m', {row}.payment_date), '')",
+    ])
+
+
+def _bump_sql(source, row, sign):
+    """Add (sign=1) or remove (sign=-1) trigger row NEW/OLD from its cell."""
+    class_expr = f"COALESCE((SELECT class_id FROM students WHERE id = {row}.student_id), 0)"
+    return f"""
+        INSERT INTO finance_cube ({_KEY}, amount, payments)
+        SELECT {_cell_sql(source, row, class_expr)},
+               {sign} * COALESCE({row}.amount_paid, 0), {sign}
+        WHERE 1
+        {_UPSERT};
+    """
+
+
+def _move_sql(source, student_row, class_expr, sign):
+    """Add or remove every payment of one student, counted under ``class_expr``."""
+    return f"""
+        INSERT INTO finance_cube ({_KEY}, amount, payments)
+        SELECT {_cell_sql(source, 'p', class_expr)},
+               {sign} * SUM(COALESCE(p.amount_paid, 0)), {sign} * COUNT(*)
+        FROM {SOURCES[source]} p
+        WHERE p.student_id = {student_row}.id
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+        {_UPSERT};
+    """
+
+
+def install(conn):
+    """Create the cube table and (re)create its triggers."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS finance_cube (
+            source TEXT NOT NULL,
+            class_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            method TEXT NOT NULL,
+            category TEXT NOT NULL,
+            month TEXT NOT NULL,
+            amount REAL NOT NULL,
+            payments INTEGER NOT NULL,
+            PRIMARY KEY (source, class_id, year, term, method, category, month)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_finance_cube_year_term "
+        "ON finance_cube(year, term)"
+    )
+    for source, table in SOURCES.items():
+        for event in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_finance_cube_{source}_{event}")
+        conn.execute(f"""
+            CREATE TRIGGER trg_finance_cube_{source}_insert AFTER INSERT ON {table}
+            BEGIN {_bump_sql(source, 'NEW', 1)} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER trg_finance_cube_{source}_delete AFTER DELETE ON {table}
+            BEGIN {_bump_sql(source, 'OLD', -1)} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER trg_finance_cube_{source}_update
+            AFTER UPDATE OF {_CELL_COLUMNS[source]} ON {table}
+            BEGIN {_bump_sql(source, 'OLD', -1)} {_bump_sql(source, 'NEW', 1)} END
+        """)
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_finance_cube_student_class")
+    conn.execute("DROP TRIGGER IF EXISTS trg_finance_cube_student_delete")
+    old_class, new_class = "COALESCE(OLD.class_id, 0)", "COALESCE(NEW.class_id, 0)"
+    conn.execute(f"""
+        CREATE TRIGGER trg_finance_cube_student_class AFTER UPDATE OF class_id ON students
+        WHEN {old_class} <> {new_class}
+        BEGIN
+            {_move_sql('fees', 'OLD', old_class, -1)} {_move_sql('fees', 'NEW', new_class, 1)}
+            {_move_sql('other', 'OLD', old_class, -1)} {_move_sql('other', 'NEW', new_class, 1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_finance_cube_student_delete AFTER DELETE ON students
+        WHEN {old_class} <> 0
+        BEGIN
+            {_move_sql('fees', 'OLD', old_class, -1)} {_move_sql('fees', 'OLD', '0', 1)}
+            {_move_sql('other', 'OLD', old_class, -1)} {_move_sql('other', 'OLD', '0', 1)}
+        END
+    """)
+
+
+def rebuild(conn):
+    """Recompute the whole cube from both payment tables (caller commits)."""
+    conn.execute("DELETE FROM finance_cube")
+    for source, table in SOURCES.items():
+        conn.execute(f"""
+            INSERT INTO finance_cube ({_KEY}, amount, payments)
+            SELECT {_cell_sql(source, 'p', 'COALESCE(s.class_id, 0)')},
+                   SUM(COALESCE(p.amount_paid, 0)), COUNT(*)
+            FROM {table} p
+            LEFT JOIN students s ON s.id = p.student_id
+            GROUP BY 1, 2, 3, 4, 5, 6, 7
+        """)
+
+
+def _filter_sql(filters):
+    clauses, params = ["f.payments <> 0"], []
+    for dim, value in (filters or {}).items():
+        if dim not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dim}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = list(value)
+            if not values:
+                continue
+            clauses.append(f"{DIMENSIONS[dim]} IN ({', '.join('?' * len(values))})")
+            params += values
+        else:
+            clauses.append(f"{DIMENSIONS[dim]} = ?")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+def aggregate(by, filters=None):
+    """Amount and payment count grouped by the dimensions in ``by``.
+
+    ``filters`` maps a dimension to a value or a list of values.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    for dim in by:
+        if dim not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dim}")
+    where, params = _filter_sql(filters)
+    select = "".join(f"{DIMENSIONS[dim]} AS {dim}, " for dim in by)
+    group = f" GROUP BY {', '.join(str(i + 1) for i in range(len(by)))}" if by else ""
+    order = f" ORDER BY {', '.join(str(i + 1) for i in range(len(by)))}" if by else ""
+    conn = get_connection()
+    df = pd.read_sql_query(f"""
+        SELECT {select}SUM(f.amount) AS amount, SUM(f.payments) AS payments
+        FROM finance_cube f
+        LEFT JOIN classes c ON c.id = f.class_id
+        WHERE {where}{group}{order}
+    """, conn, params=params)
+    conn.close()
+    return df
+
+
+def pivot(rows, columns, filters=None, value="amount"):
+    """Pivot table of ``value`` with ``rows`` down and ``columns`` across."""
+    rows = [rows] if isinstance(rows, str) else list(rows)
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    df = aggregate(rows + columns, filters)
+    if df.empty:
+        return pd.DataFrame()
+    table = df.pivot_table(index=rows, columns=columns, values=value, aggfunc="sum", fill_value=0)
+    table["Total"] = table.sum(axis=1)
+    return table
+
+
+def compare_periods(period_a, period_b, by, filters=None):
+    """``by`` totals for two periods side by side with the change between them.
+
+    A period is a dict of filters, e.g. ``{"year": 2025, "term": "Term 1"}``.
+    """
+    def totals(period):
+        df = aggregate(by, {**(filters or {}), **period})
+        return df.set_index(by)["amount"]
+
+    df = pd.DataFrame({"period_a": totals(period_a), "period_b": totals(period_b)}).fillna(0)
+    df["change"] = df["period_b"] - df["period_a"]
+    df["change_pct"] = (df["change"] / df["period_a"].where(df["period_a"] != 0) * 100).round(1)
+    return df.reset_index().sort_values("period_b", ascending=False)
+
+
+def dimension_values(dim, filters=None):
+    """Distinct values of one dimension (for select boxes)."""
+    return aggregate(dim, filters)[dim].tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the finance reporting cube.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recreate triggers and recompute the cube from payments")
+    parser.add_argument("--db", help="database file (defaults to config.DB_NAME)")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+    conn = get_connection(args.db)
+    with conn:
+        install(conn)
+        rebuild(conn)
+    cells = conn.execute("SELECT COUNT(*) FROM finance_cube").fetchone()[0]
+    print(f"Rebuilt finance cube: {cells} cells")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Normalise uploaded images off the request thread.
+
+Teacher photos and payment receipts arrive as multi-megabyte phone
+pictures. ``submit_teacher_photo`` and ``submit_receipt`` hand an upload to
+a small thread pool and return a ticket at once. The original is already
+saved, so the form can return right away. A worker then:
+
+* applies the EXIF orientation and drops the metadata (location, camera),
+* downsizes to at most ``MAX_SIDE`` pixels on the longest side,
+* re-encodes as a progressive JPEG,
+* for teacher photos, builds the thumbnail for the thumbnail cache,
+
+and swaps the result in, unless it is no smaller or the stored asset has
+changed since the upload. ``status`` reports the bytes saved per ticket.
+Images already stored can be processed in bulk with::
+
+    python -m utils.image_ingest --existing
+"""
+import argparse
+import io
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from config import THUMBNAIL_SIZE
+
+MAX_SIDE = 1600
+JPEG_QUALITY = 82
+WORKERS = 2
+MAX_RESULTS = 1000  # ticket outcomes kept for status()
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="image-ingest")
+_lock = threading.Lock()
+_tickets = itertools.count(1)
+_results = OrderedDict()  # ticket -> {"status", "original_bytes", "stored_bytes", "bytes_saved", "error"}
+
+
+def _open(data):
+    image = Image.open(io.BytesIO(data))
+    return ImageOps.exif_transpose(image)
+
+
+def _flatten(image):
+    """RGB copy of ``image``; transparent areas become white."""
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _jpeg(image, quality=JPEG_QUALITY):
+    out = io.BytesIO()
+    # No exif= argument, so none of the original metadata is written.
+    image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def normalize(data, max_side=MAX_SIDE):
+    """Downsized, metadata-free JPEG of ``data``.
+
+    Returns None when ``data`` is not an image Pillow can read (e.g. a PDF).
+    """
+    try:
+        image = _open(data)
+        image.thumbnail((max_side, max_side))
+        return _jpeg(_flatten(image))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def thumbnail(data, size=THUMBNAIL_SIZE):
+    """Small JPEG of ``data``, at most ``size`` pixels on its longest side."""
+    image = _open(data)
+    image.thumbnail((size, size))
+    return _jpeg(_flatten(image), quality=85)
+
+
+def _set_result(ticket, **result):
+    with _lock:
+        _results[ticket] = result
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+
+
+def _run(ticket, job, original):
+    result = dict(original_bytes=len(original), stored_bytes=len(original), bytes_saved=0, error=None)
+    try:
+        processed = normalize(original)
+        if processed is None or len(processed) >= len(original):
+            result["status"] = "skipped"
+        elif job(processed):
+            result.update(status="done", stored_bytes=len(processed),
+                          bytes_saved=len(original) - len(processed))
+        else:
+            result["status"] = "superseded"
+    except Exception as e:  # keep the pool serving later uploads
+        result.update(status="failed", error=str(e))
+    _set_result(ticket, **result)
+    return result
+
+
+def _submit(job, original):
+    ticket = next(_tickets)
+    _set_result(ticket, status="processing", original_bytes=len(original),
+                stored_bytes=len(original), bytes_saved=0, error=None)
+    _pool.submit(_run, ticket, job, original)
+    return ticket
+
+
+def _swap_teacher_photo(teacher_id, photo):
+    # Imported here: utils.teacher uses thumbnail() from this module.
+    from utils import teacher
+
+    def job(processed):
+        return teacher.replace_photo(teacher_id, photo, processed, thumbnail(processed))
+    return job
+
+
+def _swap_receipt(receipt):
+    from utils import other_payments, receipt_store
+
+    old_hash = receipt_store.content_hash(receipt)
+
+    def job(processed):
+        return other_payments.replace_receipt(old_hash, processed, "image/jpeg") > 0
+    return job
+
+
+def submit_teacher_photo(teacher_id, photo):
+    """Process a teacher's just-saved photo in the background; returns a ticket."""
+    return _submit(_swap_teacher_photo(int(teacher_id), photo), photo)
+
+
+def submit_receipt(receipt):
+    """Process a just-saved receipt in the background; returns a ticket.
+
+    Every payment that refers to the same receipt file gets the processed
+    copy. Receipts that are not images (PDFs) are left as they are.
+    """
+    return _submit(_swap_receipt(receipt), receipt)
+
+
+def status(tickets):
+    """Outcome of each ticket.
+
+    ``{ticket: {"status", "original_bytes", "stored_bytes", "bytes_saved", "error"}}``
+    where status is processing, done, skipped (not an image, or already
+    compact), superseded (the asset changed meanwhile) or failed.
+    """
+    with _lock:
+        return {t: dict(_results[t]) for t in tickets if t in _results}
+
+
+def process_existing():
+    """Normalise every stored teacher photo and receipt now; returns per-kind stats."""
+    from utils import receipt_store
+    from utils.db import get_connection
+
+    conn = get_connection()
+    teacher_ids = [row[0] for row in conn.execute("SELECT id FROM teachers WHERE photo IS NOT NULL")]
+    receipt_hashes = [row[0] for row in conn.execute(
+        "SELECT DISTINCT receipt_hash FROM other_payments "
+        "WHERE receipt_hash IS NOT NULL AND receipt_type LIKE 'image/%'"
+    )]
+    conn.close()
+
+    def photo_job(teacher_id):
+        from utils.teacher import get_teacher_photo
+        photo = get_teacher_photo(teacher_id)
+        return _swap_teacher_photo(teacher_id, photo), photo
+
+    def receipt_job(receipt_hash):
+        receipt = receipt_store.read(receipt_hash)
+        return (_swap_receipt(receipt), receipt) if receipt is not None else (None, None)
+
+    stats = {}
+    for kind, keys, make in (("teacher photos", teacher_ids, photo_job),
+                             ("receipts", receipt_hashes, receipt_job)):
+        results = []
+        for key in keys:
+            job, original = make(key)
+            if job is not None:
+                results.append(_run(next(_tickets), job, original))
+        stats[kind] = {
+            "processed": sum(r["status"] == "done" for r in results),
+            "skipped": sum(r["status"] != "done" for r in results),
+            "bytes_saved": sum(r["bytes_saved"] for r in results),
+        }
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shrink stored teacher photos and receipt images.")
+    parser.add_argument("--existing", action="store_true",
+                        help="process every photo and image receipt already stored")
+    args = parser.parse_args(argv)
+    if not args.existing:
+        parser.print_help()
+        return 1
+    for kind, result in process_existing().items():
+        print(f"{kind}: {result['processed']} shrunk, {result['skipped']} left as they were, "
+              f"{result['bytes_saved'] / 1024 / 1024:.1f} MB saved")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
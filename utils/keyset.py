@@ -0,0 +1,40 @@
+"""Keyset pagination for the paged listings.
+
+A listing orders by ``(sort key, id)`` and returns the sort key as a
+``sort_key`` column. The next page starts after the ``(sort_key, id)`` of
+the last row, so SQLite seeks into the index instead of stepping over
+OFFSET rows, and a deep page costs the same as the first.
+"""
+
+
+def seek(key_sql, id_sql, after, descending=True):
+    """``(where clause, params)`` for the rows after cursor ``after``."""
+    return f"({key_sql}, {id_sql}) {'<' if descending else '>'} (?, ?)", list(after)
+
+
+def order_by(key_sql, id_sql, descending=True):
+    direction = "DESC" if descending else "ASC"
+    return f" ORDER BY {key_sql} {direction}, {id_sql} {direction}"
+
+
+def page_cursors(state, name, listing_key):
+    """Cursor stack of a paged listing, kept in ``state`` (st.session_state).
+
+    It holds the cursor that opened each page so far; its last cursor opens
+    the page to show. It starts over at the first page whenever
+    ``listing_key`` (the filters and sort order) changes.
+    """
+    if state.get(f"{name}_listing_key") != listing_key:
+        state[f"{name}_listing_key"] = listing_key
+        state[f"{name}_page_cursors"] = [None]
+    return state[f"{name}_page_cursors"]
+
+
+def page_cursor(df):
+    """Keyset cursor for the page after ``df`` (pass as ``after=``)."""
+    if df.empty:
+        return None
+    last = df.iloc[-1]
+    key = last["sort_key"]
+    # A numpy scalar would not bind to sqlite as a number; use the Python value.
+    return (key.item() if hasattr(key, "item") else key, int(last["id"]))
@@ -0,0 +1,523 @@
+"""Versioned schema migrations for school.db.
+
+Each migration runs once, inside its own transaction, and is recorded in the
+``schema_migrations`` table. ``utils.db`` applies pending migrations the first
+time a process opens the database, so pages never see a half-upgraded schema.
+
+    python -m utils.migrations               # apply pending migrations
+    python -m utils.migrations --check-plans # fail if a hot query scans a table
+"""
+import argparse
+import io
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+
+def _baseline_tables(conn):
+    # The tables utils/ reads and writes. Existing databases already have
+    # them, so this only matters for a fresh install.
+    statements = [
+        """CREATE TABLE IF NOT EXISTS classes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            class_teacher_id INTEGER,
+            max_capacity INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admission_number TEXT,
+            first_name TEXT,
+            middle_name TEXT,
+            last_name TEXT,
+            dob DATE,
+            gender TEXT,
+            class_id INTEGER REFERENCES classes(id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT,
+            middle_name TEXT,
+            last_name TEXT,
+            hire_date TEXT,
+            phone TEXT,
+            photo BLOB,
+            gender TEXT,
+            subject TEXT,
+            class TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER REFERENCES students(id),
+            class_id INTEGER REFERENCES classes(id),
+            date DATE,
+            status TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS fee_structures (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            level TEXT,
+            amount REAL,
+            year INTEGER,
+            term TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS fee_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER REFERENCES students(id),
+            amount_paid REAL,
+            payment_date TEXT,
+            method TEXT,
+            term TEXT,
+            year INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS other_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER REFERENCES students(id),
+            category TEXT,
+            amount_paid REAL,
+            payment_date TEXT,
+            term TEXT,
+            year INTEGER,
+            method TEXT,
+            description TEXT,
+            receipt BLOB,
+            receipt_type TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS timetable (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER REFERENCES classes(id),
+            subject_id INTEGER REFERENCES subjects(id),
+            teacher_id INTEGER REFERENCES teachers(id),
+            day TEXT,
+            start_time TEXT,
+            end_time TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS teacher_subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher_id INTEGER REFERENCES teachers(id),
+            subject_id INTEGER REFERENCES subjects(id),
+            class_id INTEGER REFERENCES classes(id)
+        )""",
+    ]
+    for sql in statements:
+        conn.execute(sql)
+
+
+def _hot_query_indexes(conn):
+    # mark_attendance never meant to keep two rows for the same student,
+    # class and day; keep the latest one so the unique index can be built.
+    conn.execute("""
+        DELETE FROM attendance
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM attendance GROUP BY student_id, class_id, date
+        )
+    """)
+    statements = [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_class_date_student "
+        "ON attendance(class_id, date, student_id)",
+        "CREATE INDEX IF NOT EXISTS ix_attendance_date_class_status "
+        "ON attendance(date, class_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_attendance_student_date "
+        "ON attendance(student_id, date)",
+        "CREATE INDEX IF NOT EXISTS ix_students_class "
+        "ON students(class_id)",
+        "CREATE INDEX IF NOT EXISTS ix_students_admission_number "
+        "ON students(admission_number)",
+        "CREATE INDEX IF NOT EXISTS ix_fee_payments_student_year_term "
+        "ON fee_payments(student_id, year, term, amount_paid)",
+        "CREATE INDEX IF NOT EXISTS ix_fee_payments_payment_date "
+        "ON fee_payments(payment_date)",
+        "CREATE INDEX IF NOT EXISTS ix_fee_structures_level_year_term "
+        "ON fee_structures(level, year, term, amount)",
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_student "
+        "ON other_payments(student_id)",
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_payment_date "
+        "ON other_payments(payment_date)",
+        "CREATE INDEX IF NOT EXISTS ix_timetable_class_day_start "
+        "ON timetable(class_id, day, start_time)",
+        "CREATE INDEX IF NOT EXISTS ix_timetable_teacher_day_start "
+        "ON timetable(teacher_id, day, start_time)",
+        "CREATE INDEX IF NOT EXISTS ix_teacher_subjects_class_subject "
+        "ON teacher_subjects(class_id, subject_id, teacher_id)",
+        "CREATE INDEX IF NOT EXISTS ix_teacher_subjects_teacher "
+        "ON teacher_subjects(teacher_id)",
+    ]
+    for sql in statements:
+        conn.execute(sql)
+
+
+def _sequences(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    # Start after the highest ADM number ever handed out (or the row count, if
+    # that is higher) so numbers already issued are never given out again.
+    conn.execute("""
+        INSERT OR IGNORE INTO sequences (name, value)
+        SELECT 'admission_number', MAX(
+            COALESCE((SELECT MAX(CAST(SUBSTR(admission_number, 4) AS INTEGER))
+                      FROM students WHERE admission_number LIKE 'ADM%'), 0),
+            (SELECT COUNT(*) FROM students)
+        )
+    """)
+
+
+def _attendance_rollups(conn):
+    from utils import attendance_rollups
+    attendance_rollups.install(conn)
+    attendance_rollups.rebuild(conn)
+
+
+def _fee_ledger(conn):
+    from utils import fee_ledger
+    fee_ledger.install(conn)
+    fee_ledger.rebuild(conn)
+
+
+def _payment_references(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(fee_payments)")}
+    if "reference" not in columns:
+        conn.execute("ALTER TABLE fee_payments ADD COLUMN reference TEXT")
+    statements = [
+        # Receipt / transaction numbers are unique once given; most old rows have none.
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_fee_payments_reference "
+        "ON fee_payments(reference) WHERE reference IS NOT NULL",
+        # Prefix lookups from the cashier page (see student.find_students).
+        "CREATE INDEX IF NOT EXISTS ix_students_first_name "
+        "ON students(first_name COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS ix_students_last_name "
+        "ON students(last_name COLLATE NOCASE)",
+    ]
+    for sql in statements:
+        conn.execute(sql)
+
+
+def _finance_cube(conn):
+    from utils import finance_cube
+    finance_cube.install(conn)
+    finance_cube.rebuild(conn)
+
+
+def _payments_by_date_index(conn):
+    # Covers "paid up to a date, per student" (arrears aging) without
+    # touching the table.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_fee_payments_student_date_amount "
+        "ON fee_payments(student_id, payment_date, amount_paid)"
+    )
+
+
+def _guardian_phone(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(students)")}
+    if "guardian_phone" not in columns:
+        conn.execute("ALTER TABLE students ADD COLUMN guardian_phone TEXT")
+    # Statement reconciliation matches payers to students by phone.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_students_guardian_phone "
+        "ON students(guardian_phone)"
+    )
+
+
+def _receipt_store(conn):
+    from utils import receipt_store
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(other_payments)")}
+    if "receipt_hash" not in columns:
+        conn.execute("ALTER TABLE other_payments ADD COLUMN receipt_hash TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_receipt_hash "
+        "ON other_payments(receipt_hash)"
+    )
+    # Move receipts out one at a time; a listing query never loads them again.
+    ids = [row[0] for row in conn.execute("SELECT id FROM other_payments WHERE receipt IS NOT NULL")]
+    for payment_id in ids:
+        (receipt,) = conn.execute("SELECT receipt FROM other_payments WHERE id = ?", (payment_id,)).fetchone()
+        conn.execute(
+            "UPDATE other_payments SET receipt_hash = ?, receipt = NULL WHERE id = ?",
+            (receipt_store.put(bytes(receipt)), payment_id),
+        )
+
+
+# Same text as student._FULL_NAME_SQL, for trigger rows NEW/OLD.
+_SEARCH_NAME_SQL = (
+    "TRIM(COALESCE({row}.first_name, '') || ' ' || COALESCE(NULLIF({row}.middle_name, '') || ' ', '')"
+    " || COALESCE({row}.last_name, ''))"
+)
+
+
+def _other_payment_search(conn):
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_date_key "
+        "ON other_payments(IFNULL(payment_date, ''))",
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_year_term "
+        "ON other_payments(year, term, payment_date)",
+        "CREATE INDEX IF NOT EXISTS ix_other_payments_category "
+        "ON other_payments(category, payment_date)",
+    ]
+    for sql in statements:
+        conn.execute(sql)
+    # Substring name search through a trigram index. SQLite builds without
+    # FTS5 trigram support skip it and student.name_match_sql falls back to LIKE.
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS student_name_search "
+            "USING fts5(full_name, tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        return
+    conn.execute("DELETE FROM student_name_search")
+    conn.execute(
+        "INSERT INTO student_name_search (rowid, full_name) "
+        f"SELECT id, {_SEARCH_NAME_SQL.format(row='students')} FROM students"
+    )
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_student_name_search_insert AFTER INSERT ON students
+        BEGIN
+            INSERT INTO student_name_search (rowid, full_name)
+            VALUES (NEW.id, {_SEARCH_NAME_SQL.format(row='NEW')});
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_student_name_search_delete AFTER DELETE ON students
+        BEGIN
+            DELETE FROM student_name_search WHERE rowid = OLD.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_student_name_search_update
+        AFTER UPDATE OF id, first_name, middle_name, last_name ON students
+        BEGIN
+            DELETE FROM student_name_search WHERE rowid = OLD.id;
+            INSERT INTO student_name_search (rowid, full_name)
+            VALUES (NEW.id, {_SEARCH_NAME_SQL.format(row='NEW')});
+        END
+    """)
+
+
+def _timetable_minutes(conn):
+    # Lesson times become minutes since midnight, so windows and overlaps are
+    # integer comparisons and "8:00" vs "08:00:00" text no longer matters.
+    # SQLite cannot change a column's type in place, so the table is rebuilt
+    # (which also drops the text-time indexes from migration 2).
+    minutes = ("CAST({col} AS INTEGER) * 60 "
+               "+ CAST(substr({col}, instr({col}, ':') + 1, 2) AS INTEGER)")
+    conn.execute("""
+        CREATE TABLE timetable_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER REFERENCES classes(id),
+            subject_id INTEGER REFERENCES subjects(id),
+            teacher_id INTEGER REFERENCES teachers(id),
+            day TEXT,
+            start_minute INTEGER,
+            end_minute INTEGER
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO timetable_new (id, class_id, subject_id, teacher_id, day, start_minute, end_minute)
+        SELECT id, class_id, subject_id, teacher_id, day,
+               {minutes.format(col='start_time')}, {minutes.format(col='end_time')}
+        FROM timetable
+    """)
+    conn.execute("DROP TABLE timetable")
+    conn.execute("ALTER TABLE timetable_new RENAME TO timetable")
+    conn.execute(
+        "CREATE INDEX ix_timetable_class_day_start "
+        "ON timetable(class_id, day, start_minute, end_minute)"
+    )
+    conn.execute(
+        "CREATE INDEX ix_timetable_teacher_day_start "
+        "ON timetable(teacher_id, day, start_minute, end_minute)"
+    )
+
+
+def _fee_ledger_student_triggers(conn):
+    # Charges now follow student inserts, class changes and deletes. The
+    # rebuild drops the charges that went stale before the triggers existed.
+    from utils import fee_ledger
+    fee_ledger.install(conn)
+    fee_ledger.rebuild(conn)
+
+
+def _attendance_student_delete(conn):
+    # Attendance of deleted students no longer counts in the rollups. Rows
+    # already orphaned are dropped before the recount.
+    from utils import attendance_rollups
+    attendance_rollups.install(conn)
+    conn.execute("DELETE FROM attendance WHERE student_id NOT IN (SELECT id FROM students)")
+    attendance_rollups.rebuild(conn)
+
+
+# (version, name, step) -- append only, never renumber.
+MIGRATIONS = [
+    (1, "baseline tables", _baseline_tables),
+    (2, "indexes for hot queries", _hot_query_indexes),
+    (3, "sequence table for admission numbers", _sequences),
+    (4, "attendance rollup tables", _attendance_rollups),
+    (5, "fee ledger with running balances", _fee_ledger),
+    (6, "payment references and student name lookup", _payment_references),
+    (7, "finance reporting cube", _finance_cube),
+    (8, "fee payments by student and date", _payments_by_date_index),
+    (9, "guardian phone numbers for students", _guardian_phone),
+    (10, "receipts in the content-addressed store", _receipt_store),
+    (11, "other payments filters and student name search", _other_payment_search),
+    (12, "timetable times as minutes since midnight", _timetable_minutes),
+    (13, "fee ledger charges follow student changes", _fee_ledger_student_triggers),
+    (14, "attendance of deleted students", _attendance_student_delete),
+]
+
+
+def current_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Apply every pending migration and return the resulting version."""
+    version = current_version(conn)
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        # IMMEDIATE takes the write lock up front so two processes starting
+        # together cannot both apply the same step.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= number:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (number, name, datetime.now().isoformat(timespec="seconds")),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = number
+    return version
+
+
+# Keyed lookups the pages run on every rerun, as calls to the helpers that
+# issue them. The check records the statements each call actually runs and
+# explains those, so a helper whose SQL changes is checked as it now is. A
+# table "SCAN" in their plan means a migration is missing an index. These
+# calls only read; tests/test_query_plans.py adds the write paths.
+_STATEMENT = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+_NOT_ALIAS = ("WHERE|JOIN|LEFT|INNER|CROSS|NATURAL|ON|USING|GROUP|ORDER|UNION|LIMIT|SET|VALUES")
+_SOURCE = re.compile(rf"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:{_NOT_ALIAS})\b)(\w+))?",
+                     re.IGNORECASE)
+_STATEMENT_CSV = (
+    "Receipt No.,Completion Time,Paid In,A/C No.,Phone\n"
+    "PLN0000001,2025-01-05 10:00:00,1000,ADM001,0712345678\n"
+)
+
+
+def plan_checks():
+    from utils import attendance, fees, other_payments, statement_import, student, timetable
+
+    return [
+        ("attendance.get_attendance_by_date_and_class",
+         lambda: attendance.get_attendance_by_date_and_class(1, "2025-01-01")),
+        ("student.get_students_by_class", lambda: student.get_students_by_class(1)),
+        ("student.find_students", lambda: student.find_students("ot")),
+        ("fees.find_payment_by_reference", lambda: fees.find_payment_by_reference("RCT-1")),
+        ("fees.get_student_balances (one student)",
+         lambda: fees.get_student_balances(student_id=1, year=2025, term="Term 1")),
+        ("statement_import.reconcile_statement",
+         lambda: statement_import.reconcile_statement(io.StringIO(_STATEMENT_CSV), dry_run=True)),
+        ("other_payments.year_term", lambda: other_payments.list_other_payments(year=2025, term="Term 1")),
+        ("other_payments.category", lambda: other_payments.list_other_payments(category="Uniform")),
+        ("timetable.class_day",
+         lambda: timetable.query_timetable(class_id=1, day="Monday", start_from="08:00")),
+        ("timetable.teacher_day",
+         lambda: timetable.query_timetable(teacher_id=1, day="Monday", start_from="08:00")),
+    ]
+
+
+def traced_statements(conn, call):
+    """Run ``call`` and return the statements it issued on ``conn``, values bound."""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    # Trigger steps are reported with their outer statement's text; keep one.
+    return list(dict.fromkeys(sql for sql in statements if _STATEMENT.match(sql)))
+
+
+def table_scans(conn, sql):
+    """Plan lines of ``sql`` that scan a table (scans of CTEs and subqueries are fine)."""
+    tables = {name.lower() for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    sources = {}
+    for table, alias in _SOURCE.findall(sql):
+        sources[(alias or table).lower()] = table.lower()
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[-1]
+        if not detail.startswith("SCAN "):
+            continue
+        name = detail.split()[1].lower()
+        if sources.get(name, name) in tables:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(checks=None):
+    """Return ``[(name, plan detail)]`` for every check that scans a table.
+
+    ``checks`` are ``(name, call)`` pairs; each call runs against the
+    database ``utils.db.get_connection()`` opens.
+    """
+    from utils.db import get_connection
+
+    conn = get_connection()
+    failures = []
+    for name, call in checks or plan_checks():
+        statements = traced_statements(conn, call)
+        if not statements:
+            failures.append((name, "no query ran"))
+        for sql in statements:
+            failures += [(name, detail) for detail in table_scans(conn, sql)]
+    return failures
+
+
+def main(argv=None):
+    from utils import db
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database file (defaults to config.DB_NAME)")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="exit non-zero if a hot query falls back to a table scan")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.DB_NAME = args.db
+    conn = db.get_connection()
+    print(f"schema version {migrate(conn)}")
+    if args.check_plans:
+        checks = plan_checks()
+        failures = check_query_plans(checks)
+        for name, detail in failures:
+            print(f"{name}: {detail}")
+        if failures:
+            return 1
+        print(f"{len(checks)} query plans use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
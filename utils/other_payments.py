@@ -1,19 +1,20 @@
-import sqlite3
 import pandas as pd
 from datetime import datetime
-
-DB_PATH = "school.db"
+from utils.db import get_connection
+from utils import receipt_store
+from utils.keyset import order_by, seek
+from utils.student import full_name_sql, name_match_sql
 
 def get_all_students():
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query("SELECT id, first_name || ' ' || middle_name || ' ' || last_name AS full_name FROM students", conn)
+    with get_connection() as conn:
+        return pd.read_sql_query(f"SELECT s.id, {full_name_sql()} AS full_name FROM students s", conn)
 
 def get_other_payments():
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query("""
+    with get_connection() as conn:
+        return pd.read_sql_query(f"""
             SELECT 
                 op.id, 
-                s.first_name || ' ' || s.middle_name || ' ' || s.last_name AS student_name,
+                {full_name_sql()} AS student_name,
                 op.student_id,
                 op.category,
                 op.amount_paid,
@@ -22,34 +23,125 @@ def get_other_payments():
                 op.year,
                 op.method,
                 op.description,
-                op.receipt,
+                op.receipt_hash IS NOT NULL AS has_receipt,
                 op.receipt_type
             FROM other_payments op
             JOIN students s ON s.id = op.student_id
             ORDER BY op.payment_date DESC
         """, conn)
 
+# Keyset sort key for the newest-first listing; never NULL (see migration 11).
+_DATE_KEY_SQL = "IFNULL(op.payment_date, '')"
+
+def _other_payment_filters(conn, year=None, term=None, method=None, category=None, name=None):
+    clauses, params = [], []
+    for column, value in (("year", year), ("term", term), ("method", method), ("category", category)):
+        if value is not None:
+            clauses.append(f"op.{column} = ?")
+            params.append(value)
+    if name and name.strip():
+        match_sql, match_params = name_match_sql(conn, name)
+        clauses.append(f"op.student_id IN ({match_sql})")
+        params += match_params
+    return clauses, params
+
+def list_other_payments(year=None, term=None, method=None, category=None, name=None,
+                        after=None, limit=50):
+    """One page of other payments, newest first, filtered in SQL.
+
+    ``after`` is the ``(sort_key, id)`` of the last row of the previous page
+    (see ``keyset.page_cursor``); ``limit=None`` returns every matching row.
+    """
+    with get_connection() as conn:
+        clauses, params = _other_payment_filters(conn, year, term, method, category, name)
+        if after is not None:
+            clause, after_params = seek(_DATE_KEY_SQL, "op.id", after)
+            clauses.append(clause)
+            params += after_params
+        query = f"""
+            SELECT
+                op.id,
+                {full_name_sql()} AS student_name,
+                op.student_id,
+                op.category,
+                op.amount_paid,
+                op.payment_date,
+                op.term,
+                op.year,
+                op.method,
+                op.description,
+                op.receipt_hash IS NOT NULL AS has_receipt,
+                op.receipt_type,
+                {_DATE_KEY_SQL} AS sort_key
+            FROM other_payments op
+            JOIN students s ON op.student_id = s.id
+        """
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += order_by(_DATE_KEY_SQL, "op.id")
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return pd.read_sql_query(query, conn, params=params)
+
+def summarize_other_payments(year=None, term=None, method=None, category=None, name=None):
+    """``(count, total amount)`` of every payment matching the filters."""
+    with get_connection() as conn:
+        clauses, params = _other_payment_filters(conn, year, term, method, category, name)
+        query = """
+            SELECT COUNT(*), IFNULL(SUM(op.amount_paid), 0)
+            FROM other_payments op
+            JOIN students s ON op.student_id = s.id
+        """
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        count, total = conn.execute(query, params).fetchone()
+    return count, total
+
+def _release_receipt(conn, receipt_hash):
+    """Delete a stored receipt once no payment refers to it.
+
+    Called inside the write transaction, so no other writer can add a new
+    reference to the same file in between.
+    """
+    if receipt_hash is None:
+        return
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM other_payments WHERE receipt_hash = ? LIMIT 1", (receipt_hash,))
+    if c.fetchone() is None:
+        receipt_store.delete(receipt_hash)
+
 def add_other_payment(student_id, category, amount_paid, payment_date, term, year, method, description, receipt=None, receipt_type=None):
-    with sqlite3.connect(DB_PATH) as conn:
+    """Insert a payment and return the new id."""
+    with get_connection() as conn:
         c = conn.cursor()
+        receipt_hash = receipt_store.content_hash(receipt) if receipt is not None else None
         c.execute("""
             INSERT INTO other_payments 
-                (student_id, category, amount_paid, payment_date, term, year, method, description, receipt, receipt_type)
+                (student_id, category, amount_paid, payment_date, term, year, method, description, receipt_hash, receipt_type)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (student_id, category, amount_paid, payment_date, term, year, method, description, receipt, receipt_type))
+        """, (student_id, category, amount_paid, payment_date, term, year, method, description, receipt_hash, receipt_type))
+        payment_id = c.lastrowid
+        if receipt is not None:
+            receipt_store.put(receipt)
         conn.commit()
+    return payment_id
 
 def update_other_payment(record_id, student_id, category, amount_paid, payment_date, term, year, method, description, receipt=None, receipt_type=None):
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
         if receipt is not None:
+            c.execute("SELECT receipt_hash FROM other_payments WHERE id=?", (record_id,))
+            old_hash = (c.fetchone() or (None,))[0]
             c.execute("""
                 UPDATE other_payments SET 
                     student_id=?, category=?, amount_paid=?, payment_date=?,
                     term=?, year=?, method=?, description=?,
-                    receipt=?, receipt_type=?
+                    receipt_hash=?, receipt_type=?
                 WHERE id=?
-            """, (student_id, category, amount_paid, payment_date, term, year, method, description, receipt, receipt_type, record_id))
+            """, (student_id, category, amount_paid, payment_date, term, year, method, description, receipt_store.content_hash(receipt), receipt_type, record_id))
+            receipt_store.put(receipt)
+            _release_receipt(conn, old_hash)
         else:
             c.execute("""
                 UPDATE other_payments SET 
@@ -60,10 +152,32 @@ def update_other_payment(record_id, student_id, category, amount_paid, payment_d
         conn.commit()
 
 def delete_other_payment(record_id):
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_connection() as conn:
         c = conn.cursor()
+        c.execute("SELECT receipt_hash FROM other_payments WHERE id=?", (record_id,))
+        old_hash = (c.fetchone() or (None,))[0]
         c.execute("DELETE FROM other_payments WHERE id=?", (record_id,))
+        _release_receipt(conn, old_hash)
+        conn.commit()
+
+def replace_receipt(old_hash, receipt, receipt_type):
+    """Point every payment using receipt ``old_hash`` at ``receipt`` instead.
+
+    Used to swap in a processed copy of an upload. Returns the number of
+    payments updated (0 if they have all moved on to another receipt).
+    """
+    with get_connection() as conn:
+        c = conn.cursor()
+        new_hash = receipt_store.put(receipt)
+        if new_hash == old_hash:
+            return 0
+        c.execute("UPDATE other_payments SET receipt_hash=?, receipt_type=? WHERE receipt_hash=?",
+                  (new_hash, receipt_type, old_hash))
+        updated = c.rowcount
+        _release_receipt(conn, old_hash)
+        _release_receipt(conn, new_hash)
         conn.commit()
+    return updated
 
 def get_payment_summary():
     df = get_other_payments()
@@ -75,28 +189,43 @@ def export_payments_to_csv(file_path="other_payments_export.csv"):
     df.to_csv(file_path, index=False)
     return file_path
 
-def get_receipt_blob_by_id(record_id):
-    with sqlite3.connect(DB_PATH) as conn:
+def iter_receipt_by_id(record_id):
+    """``(chunks, receipt_type)`` for one payment's receipt, or None if it has none.
+
+    ``chunks`` yields the file from the receipt store as it is read.
+    """
+    with get_connection() as conn:
         c = conn.cursor()
-        c.execute("SELECT receipt, receipt_type FROM other_payments WHERE id=?", (record_id,))
-        return c.fetchone()
+        c.execute("SELECT receipt_hash, receipt_type FROM other_payments WHERE id=?", (record_id,))
+        row = c.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return receipt_store.iter_chunks(row[0]), row[1]
+
+def get_receipt_blob_by_id(record_id):
+    """``(bytes, receipt_type)`` for one payment's receipt, or None."""
+    receipt = iter_receipt_by_id(record_id)
+    if receipt is None:
+        return None
+    chunks, receipt_type = receipt
+    return b"".join(chunks), receipt_type
     
 def get_student_names_map():
     """Returns a dictionary of student_id → full name (for display in filters/search)."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT id, first_name || ' ' || last_name FROM students")
+    c.execute(f"SELECT s.id, {full_name_sql()} FROM students s")
     result = dict(c.fetchall())
     conn.close()
     return result
 
 def get_all_other_payments():
     """Fetch all other payments and join with student name."""
-    conn = sqlite3.connect(DB_PATH)
-    query = """
+    conn = get_connection()
+    query = f"""
         SELECT
             op.id,
-            s.first_name || ' ' || IFNULL(s.middle_name || ' ', '') || s.last_name AS student_name,
+            {full_name_sql()} AS student_name,
             op.student_id,
             op.category,
             op.amount_paid,
@@ -105,7 +234,7 @@ def get_all_other_payments():
             op.year,
             op.method,
             op.description,
-            op.receipt,
+            op.receipt_hash IS NOT NULL AS has_receipt,
             op.receipt_type
         FROM other_payments op
         JOIN students s ON op.student_id = s.id
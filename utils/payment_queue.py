@@ -0,0 +1,141 @@
+"""Write-behind queue for payments recorded on the cashier page.
+
+``submit`` validates a payment, hands it to a background worker and returns
+a ticket straight away, so the page never waits on the database. The worker
+commits queued payments in groups of up to ``BATCH_SIZE``, one transaction
+per group. If a group fails, its payments are retried one by one, so a bad
+row cannot block the rest. ``status`` reports what became of each ticket.
+"""
+import atexit
+import itertools
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from utils.db import get_connection
+from utils.fees import find_payment_by_reference, insert_fee_payment
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 0.25  # seconds to wait for more payments before committing
+MAX_RESULTS = 5000     # ticket outcomes kept for status()
+
+
+class DuplicateReceiptError(ValueError):
+    """The receipt / transaction reference was already recorded."""
+
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_tickets = itertools.count(1)
+_results = OrderedDict()  # ticket -> {"status", "payment_id", "error"}
+_pending_references = set()
+_stats = {"committed": 0, "failed": 0, "batches": 0}
+_worker = None
+
+
+def _set_result(ticket, **result):
+    with _lock:
+        _results[ticket] = result
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="payment-writer", daemon=True)
+            _worker.start()
+
+
+def submit(student_id, amount_paid, payment_date, method, term, year, reference=None):
+    """Queue a payment and return its ticket number.
+
+    Raises DuplicateReceiptError if ``reference`` is already stored or is
+    waiting in the queue.
+    """
+    reference = (reference or "").strip() or None
+    if reference is not None:
+        existing = find_payment_by_reference(reference)
+        with _lock:
+            if existing is not None or reference in _pending_references:
+                raise DuplicateReceiptError(f"Receipt {reference} has already been recorded")
+            _pending_references.add(reference)
+    ticket = next(_tickets)
+    _set_result(ticket, status="queued", payment_id=None, error=None)
+    _queue.put((ticket, (int(student_id), float(amount_paid), payment_date, method, term,
+                         int(year), reference)))
+    _ensure_worker()
+    return ticket
+
+
+def _commit(batch):
+    conn = get_connection()
+    try:
+        try:
+            with conn:
+                ids = [insert_fee_payment(conn, *payment) for _, payment in batch]
+            outcomes = [(ticket, payment_id, None) for (ticket, _), payment_id in zip(batch, ids)]
+        except sqlite3.Error:
+            outcomes = []
+            for ticket, payment in batch:
+                try:
+                    with conn:
+                        outcomes.append((ticket, insert_fee_payment(conn, *payment), None))
+                except sqlite3.Error as e:
+                    outcomes.append((ticket, None, str(e)))
+    finally:
+        conn.close()
+
+    for ticket, payment_id, error in outcomes:
+        if error is None:
+            _set_result(ticket, status="committed", payment_id=payment_id, error=None)
+        else:
+            _set_result(ticket, status="failed", payment_id=None, error=error)
+    with _lock:
+        for _, payment in batch:
+            _pending_references.discard(payment[-1])
+        _stats["batches"] += 1
+        _stats["committed"] += sum(error is None for _, _, error in outcomes)
+        _stats["failed"] += sum(error is not None for _, _, error in outcomes)
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get(timeout=FLUSH_INTERVAL))
+            except queue.Empty:
+                break
+        try:
+            _commit(batch)
+        except Exception as e:  # keep the worker alive for later payments
+            for ticket, payment in batch:
+                _set_result(ticket, status="failed", payment_id=None, error=str(e))
+                with _lock:
+                    _pending_references.discard(payment[-1])
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def flush():
+    """Block until every queued payment has been committed or has failed."""
+    if _worker is not None and _worker.is_alive():
+        _queue.join()
+
+
+def status(tickets):
+    """Outcome of each ticket: ``{ticket: {"status", "payment_id", "error"}}``."""
+    with _lock:
+        return {t: dict(_results[t]) for t in tickets if t in _results}
+
+
+def queue_stats():
+    with _lock:
+        return dict(_stats, pending=_queue.unfinished_tasks)
+
+
+atexit.register(flush)
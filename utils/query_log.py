@@ -0,0 +1,122 @@
+"""Per-statement timing for every query that goes through utils.db.
+
+Each statement is recorded with its fingerprint (literals stripped), wall
+time including fetches, row count and the page that issued it. Statements
+slower than ``SLOW_QUERY_MS`` are also written to a rotating slow-query log.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+
+from config import LOG_DIR, SLOW_QUERY_MS
+
+MAX_RECORDS = 20000  # most recent statements kept for the timing panel
+
+_records = deque(maxlen=MAX_RECORDS)
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+_PAGES_DIR = os.sep + "Pages" + os.sep
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalise a statement so calls differing only in literals group together."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip()
+    return _IN_LIST.sub("(...)", sql)
+
+
+def calling_page():
+    """Name of the Streamlit page (or Home) whose script issued the query."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _PAGES_DIR in filename or filename.endswith("Home.py"):
+            return os.path.splitext(os.path.basename(filename))[0]
+        frame = frame.f_back
+    return "-"
+
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        with _slow_logger_lock:
+            if _slow_logger is None:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                handler = RotatingFileHandler(
+                    os.path.join(LOG_DIR, "slow_queries.log"),
+                    maxBytes=2 * 1024 * 1024,
+                    backupCount=5,
+                    encoding="utf-8",
+                )
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger = logging.getLogger("school.slow_queries")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _slow_logger = logger
+    return _slow_logger
+
+
+class QueryRecord:
+    __slots__ = ("sql", "page", "started", "elapsed_ms", "rows", "finished")
+
+    def __init__(self, sql, page):
+        self.sql = sql
+        self.page = page
+        self.started = time.time()
+        self.elapsed_ms = 0.0
+        self.rows = 0
+        self.finished = False
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        _records.append((fingerprint(self.sql), self.page, self.elapsed_ms, self.rows, self.started))
+        if self.elapsed_ms >= SLOW_QUERY_MS:
+            _get_slow_logger().info(
+                "%.1f ms rows=%d page=%s sql=%s",
+                self.elapsed_ms, self.rows, self.page, fingerprint(self.sql),
+            )
+
+
+def records():
+    """Recorded statements as a DataFrame, oldest first."""
+    return pd.DataFrame(
+        list(_records),
+        columns=["fingerprint", "page", "elapsed_ms", "rows", "started"],
+    )
+
+
+def timing_summary(by="fingerprint"):
+    """p50/p95 wall time per query fingerprint or per page, slowest first."""
+    df = records()
+    if df.empty:
+        return pd.DataFrame(columns=[by, "calls", "p50_ms", "p95_ms", "max_ms", "total_ms", "rows"])
+    grouped = df.groupby(by)["elapsed_ms"]
+    summary = pd.DataFrame({
+        "calls": grouped.size(),
+        "p50_ms": grouped.quantile(0.5),
+        "p95_ms": grouped.quantile(0.95),
+        "max_ms": grouped.max(),
+        "total_ms": grouped.sum(),
+        "rows": df.groupby(by)["rows"].sum(),
+    }).reset_index()
+    return summary.sort_values("p95_ms", ascending=False).round(2)
+
+
+def clear():
+    _records.clear()
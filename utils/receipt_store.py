@@ -0,0 +1,90 @@
+"""Content-addressed file store for payment receipts.
+
+A receipt is saved once under the SHA-256 of its bytes
+(``receipts/ab/cd/abcd...``), so uploading the same file for many payments
+keeps a single copy. Files that shrink by at least ``MIN_SAVING`` when
+zlib-compressed are stored compressed with a ``.z`` suffix. Scanned PDFs
+often do; JPEG and PNG usually don't. The database keeps only the hash,
+and receipts are read back in chunks when someone opens one.
+"""
+import hashlib
+import os
+import zlib
+
+from config import RECEIPT_STORE_DIR
+
+CHUNK_SIZE = 64 * 1024
+MIN_SAVING = 0.10  # store compressed only if it saves at least 10%
+
+
+def _path(digest):
+    return os.path.join(RECEIPT_STORE_DIR, digest[:2], digest[2:4], digest)
+
+
+def _find(digest):
+    path = _path(digest)
+    if os.path.exists(path):
+        return path, False
+    if os.path.exists(path + ".z"):
+        return path + ".z", True
+    return None, False
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def put(data, compress=True):
+    """Store ``data`` (if new) and return its hash."""
+    digest = content_hash(data)
+    if _find(digest)[0] is not None:
+        return digest
+    path = _path(digest)
+    if compress:
+        packed = zlib.compress(data, 6)
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            data, path = packed, path + ".z"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return digest
+
+
+def iter_chunks(digest, chunk_size=CHUNK_SIZE):
+    """Yield the receipt's original bytes in chunks; nothing if it is missing."""
+    path, compressed = _find(digest)
+    if path is None:
+        return
+    inflater = zlib.decompressobj() if compressed else None
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield inflater.decompress(chunk) if inflater else chunk
+    if inflater:
+        yield inflater.flush()
+
+
+def read(digest):
+    """Whole receipt as bytes, or None if it is not in the store."""
+    if _find(digest)[0] is None:
+        return None
+    return b"".join(iter_chunks(digest))
+
+
+def delete(digest):
+    path, _ = _find(digest)
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def stored_size(digest):
+    """Bytes on disk for one receipt (after compression)."""
+    path, _ = _find(digest)
+    return os.path.getsize(path) if path else 0
@@ -1,6 +1,5 @@
 # utils/school_class.py
 
-import sqlite3
 import pandas as pd
 from .db import get_connection
 
@@ -0,0 +1,23 @@
+"""Monotonic counters kept in the ``sequences`` table.
+
+Values are taken inside the caller's transaction: the UPDATE holds SQLite's
+write lock until the caller commits, so two sessions can never receive the
+same value, and a value is never handed out again once committed.
+"""
+
+
+def reserve(conn, name, count=1):
+    """Reserve ``count`` consecutive values of sequence ``name``.
+
+    Returns the values as a range. The caller must commit (or roll back)
+    ``conn``; rolling back releases the reservation.
+    """
+    if count < 1:
+        return range(0)
+    cursor = conn.execute(
+        "UPDATE sequences SET value = value + ? WHERE name = ?", (count, name)
+    )
+    if cursor.rowcount == 0:
+        conn.execute("INSERT INTO sequences (name, value) VALUES (?, ?)", (name, count))
+    last = conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()[0]
+    return range(last - count + 1, last + 1)
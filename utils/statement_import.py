@@ -0,0 +1,221 @@
+"""Reconcile MPesa / bank statement exports into fee_payments.
+
+The statement is read in chunks. Each money-in line is matched to a student
+by the admission number in its account or description field, or else by
+the payer's phone number (``students.guardian_phone``). Matching uses one
+indexed ``IN`` lookup per chunk.
+
+Every line is identified by its transaction reference. A line without a
+reference gets a hash of its date, amount, payer and details instead. That
+value goes into ``fee_payments.reference``, whose unique index catches
+lines imported before and lines repeated within the file. Matched lines
+are bulk-inserted in a single transaction at the end, and the ledger of the
+students they pay for is rebuilt once in the same transaction.
+
+    python -m utils.statement_import statement.csv --method MPesa [--dry-run]
+"""
+import argparse
+import hashlib
+import re
+import sys
+
+import pandas as pd
+
+from config import TERMS
+from utils.db import get_connection
+from utils.fees import insert_fee_payments
+from utils.student import normalize_phone
+
+CHUNK_SIZE = 5000
+LOOKUP_BATCH = 500  # values per IN (...) lookup, well under SQLite's variable limit
+
+# Normalised header -> field, covering MPesa paybill and common bank exports.
+COLUMN_ALIASES = {
+    "reference": ["receipt_no.", "receipt_no", "receipt", "transaction_id", "transaction_ref",
+                  "reference", "ref", "ref_no", "bank_reference"],
+    "date": ["completion_time", "transaction_date", "date", "value_date", "posting_date"],
+    "amount": ["paid_in", "credit", "credit_amount", "amount", "deposit"],
+    "account": ["a/c_no.", "account_no", "account", "bill_ref_number", "account_number"],
+    "phone": ["phone", "msisdn", "phone_number", "other_party_info", "sender"],
+    "details": ["details", "description", "narrative", "particulars", "transaction_details"],
+}
+_ADMISSION = re.compile(r"ADM[\s\-/]*(\d+)", re.IGNORECASE)
+_PHONE = re.compile(r"(?:\+?254|0)[17]\d{8}")
+
+STATUSES = ("matched", "unmatched", "duplicate", "invalid")
+
+
+def _normalise_columns(df):
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_"))
+    fields = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in df.columns:
+                fields[field] = df[alias].fillna("").astype(str).str.strip()
+                break
+        else:
+            fields[field] = pd.Series("", index=df.index)
+    if (fields["amount"] == "").all() and (fields["date"] == "").all():
+        raise ValueError("No amount/date columns found; is this a statement export?")
+    return pd.DataFrame(fields)
+
+
+def _admission_numbers(lines):
+    """ADM number from the account field, else from the details text.
+
+    Returns the digits as written ("ADM0042") and in the ``ADM{n:03d}`` form
+    the school issues ("ADM042"); payers often add or drop leading zeros.
+    """
+    found = lines["account"].str.extract(_ADMISSION, expand=False)
+    found = found.fillna(lines["details"].str.extract(_ADMISSION, expand=False))
+    as_written = ("ADM" + found).where(found.notna())
+    canonical = ("ADM" + found.str.lstrip("0").str.zfill(3)).where(found.notna())
+    return as_written, canonical
+
+
+def _phones(lines):
+    found = lines["phone"].str.extract(f"({_PHONE.pattern})", expand=False)
+    found = found.fillna(lines["details"].str.extract(f"({_PHONE.pattern})", expand=False))
+    return found.map(normalize_phone, na_action="ignore")
+
+
+def _line_hash(lines):
+    raw = lines["date"] + "|" + lines["amount"] + "|" + lines["account"] + "|" + \
+        lines["phone"] + "|" + lines["details"]
+    return "H-" + raw.map(lambda s: hashlib.sha1(s.encode("utf-8")).hexdigest()[:20])
+
+
+def _lookup(conn, column, values):
+    """{value: student_id} for students whose ``column`` is in ``values``."""
+    values = sorted(set(v for v in values if isinstance(v, str)))
+    found = {}
+    for start in range(0, len(values), LOOKUP_BATCH):
+        batch = values[start:start + LOOKUP_BATCH]
+        found.update(conn.execute(
+            f"SELECT {column}, id FROM students WHERE {column} IN ({', '.join('?' * len(batch))})",
+            batch,
+        ).fetchall())
+    return found
+
+
+def _existing_references(conn, references):
+    references = sorted(set(references))
+    existing = set()
+    for start in range(0, len(references), LOOKUP_BATCH):
+        batch = references[start:start + LOOKUP_BATCH]
+        existing.update(r for (r,) in conn.execute(
+            f"SELECT reference FROM fee_payments WHERE reference IN ({', '.join('?' * len(batch))})",
+            batch,
+        ))
+    return existing
+
+
+def _term_of(dates):
+    month = dates.dt.month
+    term = pd.Series(None, index=dates.index, dtype=object)
+    for name, (first, last) in TERMS.items():
+        term = term.mask(month.between(first, last), name)
+    return term
+
+
+def _parse_dates(values):
+    """Timestamps of statement date strings (NaT where unreadable).
+
+    ISO dates ("2025-01-05 10:00:00") are parsed as ISO first; with
+    ``dayfirst`` they would come out as 1 May. Only what is left, the
+    slash-style dates of Kenyan exports (31/01/2025), is read day first.
+    """
+    dates = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    rest = dates.isna() & (values != "")
+    if rest.any():
+        dates[rest] = pd.to_datetime(values[rest], errors="coerce", dayfirst=True, format="mixed")
+    return dates
+
+
+def _reconcile_chunk(conn, chunk, first_row, seen):
+    lines = _normalise_columns(chunk)
+    lines["row"] = range(first_row, first_row + len(lines))
+    lines["amount_paid"] = pd.to_numeric(lines["amount"].str.replace(",", ""), errors="coerce")
+    lines["payment_date"] = _parse_dates(lines["date"])
+    lines["reference"] = lines["reference"].str.upper().where(lines["reference"] != "", _line_hash(lines))
+    as_written, canonical = _admission_numbers(lines)
+    lines["admission_number"] = canonical
+    lines["payer_phone"] = _phones(lines)
+
+    by_admission = _lookup(conn, "admission_number", pd.concat([as_written, canonical]))
+    by_phone = _lookup(conn, "guardian_phone", lines["payer_phone"])
+    admission_match = as_written.map(by_admission).fillna(canonical.map(by_admission))
+    phone_match = lines["payer_phone"].map(by_phone)
+    lines["student_id"] = admission_match.fillna(phone_match)
+    lines["matched_by"] = ""
+    lines.loc[phone_match.notna(), "matched_by"] = "phone"
+    lines.loc[admission_match.notna(), "matched_by"] = "admission_number"
+
+    existing = _existing_references(conn, lines["reference"])
+    repeated = lines["reference"].isin(seen) | lines["reference"].duplicated()
+    seen.update(lines["reference"])
+
+    lines["status"] = "matched"
+    lines["reason"] = ""
+    unmatched = lines["student_id"].isna()
+    lines.loc[unmatched, ["status", "reason"]] = ["unmatched", "No student with this admission number or phone"]
+    duplicate = lines["reference"].isin(existing) | repeated
+    lines.loc[duplicate, ["status", "reason"]] = ["duplicate", "Reference already recorded"]
+    invalid = lines["payment_date"].isna() | ~(lines["amount_paid"] > 0)
+    lines.loc[invalid, ["status", "reason"]] = ["invalid", "Not a dated money-in line"]
+
+    lines["year"] = lines["payment_date"].dt.year
+    lines["term"] = _term_of(lines["payment_date"])
+    lines["payment_date"] = lines["payment_date"].dt.strftime("%Y-%m-%d")
+    return lines[["row", "reference", "payment_date", "amount_paid", "admission_number", "payer_phone",
+                  "student_id", "matched_by", "term", "year", "status", "reason", "details"]]
+
+
+def reconcile_statement(source, method="MPesa", chunk_size=CHUNK_SIZE, dry_run=False, progress=None):
+    """Match a statement CSV to students and record the matched lines.
+
+    Returns ``(imported, report)``. ``report`` has one row per statement line
+    with its ``status`` (matched / unmatched / duplicate / invalid) and the
+    reason. With ``dry_run`` nothing is written. ``progress`` is called with
+    the number of lines processed so far.
+    """
+    conn = get_connection()
+    seen, reports, processed = set(), [], 0
+    for chunk in pd.read_csv(source, dtype=str, chunksize=chunk_size, keep_default_na=False):
+        reports.append(_reconcile_chunk(conn, chunk, processed + 1, seen))
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+    report = pd.concat(reports, ignore_index=True) if reports else \
+        pd.DataFrame(columns=["row", "reference", "status", "reason"])
+
+    matched = report[report["status"] == "matched"]
+    if not dry_run and not matched.empty:
+        with conn:
+            insert_fee_payments(conn, zip(
+                matched["student_id"], matched["amount_paid"], matched["payment_date"],
+                [method] * len(matched), matched["term"], matched["year"], matched["reference"],
+            ))
+    conn.close()
+    return (0 if dry_run else len(matched)), report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import fee payments from an MPesa or bank statement CSV.")
+    parser.add_argument("statement")
+    parser.add_argument("--method", default="MPesa", help="payment method to record (default: MPesa)")
+    parser.add_argument("--dry-run", action="store_true", help="match and report without writing")
+    parser.add_argument("--report", help="write the per-line report to this CSV")
+    args = parser.parse_args(argv)
+
+    imported, report = reconcile_statement(args.statement, args.method, dry_run=args.dry_run)
+    counts = report["status"].value_counts()
+    print(f"Imported {imported} payments; " +
+          ", ".join(f"{counts.get(status, 0)} {status}" for status in STATUSES))
+    if args.report:
+        report.to_csv(args.report, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
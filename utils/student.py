@@ -1,78 +1,257 @@
-import sqlite3
-from datetime import datetime
+import re
 import pandas as pd
+from utils.db import get_connection
+from utils import sequences
+from utils.keyset import order_by, seek
 
-DB_NAME = "school.db"
 
+def reserve_admission_numbers(conn, count):
+    """Reserve ``count`` admission numbers inside the caller's transaction."""
+    return [f"ADM{n:03d}" for n in sequences.reserve(conn, "admission_number", count)]
 
-def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
 
+def generate_admission_number(conn=None):
+    """Allocate one admission number.
 
-def generate_admission_number():
+    Pass the connection of an open insert transaction to tie the number to
+    that insert; without one the number is committed (and consumed) at once.
+    """
+    if conn is not None:
+        return reserve_admission_numbers(conn, 1)[0]
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM students")
-    count = cursor.fetchone()[0]
-    new_adm_number = f"ADM{count + 1:03d}"
+    new_adm_number = reserve_admission_numbers(conn, 1)[0]
+    conn.commit()
     conn.close()
     return new_adm_number
 
 
-def get_all_students():
+# Name and age are computed by SQLite so listing 20k students stays a single
+# pass in C instead of a Python loop per row.
+def full_name_sql(alias="s"):
+    """"First Middle Last" of table ``alias``; no double space without a middle name."""
+    return (
+        f"TRIM(COALESCE({alias}.first_name, '') || ' ' || COALESCE(NULLIF({alias}.middle_name, '') || ' ', '')"
+        f" || COALESCE({alias}.last_name, ''))"
+    )
+
+
+_FULL_NAME_SQL = full_name_sql()
+_AGE_SQL = (
+    "CAST(strftime('%Y', 'now', 'localtime') - strftime('%Y', s.dob)"
+    " - (strftime('%m-%d', 'now', 'localtime') < strftime('%m-%d', s.dob)) AS INTEGER)"
+)
+
+# Sort keys accepted by list_students -> SQL expression (never NULL, so the
+# keyset comparison below is well defined).
+SORT_COLUMNS = {
+    "id": "s.id",
+    "admission_number": "COALESCE(s.admission_number, '')",
+    "name": f"LOWER({_FULL_NAME_SQL})",
+    "dob": "COALESCE(s.dob, '')",
+    "class": "COALESCE(c.name, '')",
+}
+
+
+def _student_filters(class_id=None, gender=None, name=None):
+    clauses, params = [], []
+    if class_id is not None:
+        clauses.append("s.class_id = ?")
+        params.append(class_id)
+    if gender:
+        clauses.append("s.gender = ?")
+        params.append(gender)
+    if name:
+        clauses.append(f"({_FULL_NAME_SQL} LIKE ? OR s.admission_number LIKE ?)")
+        params += [f"%{name.strip()}%", f"{name.strip()}%"]
+    return clauses, params
+
+
+def list_students(class_id=None, gender=None, name=None, sort="id", descending=True,
+                  after=None, limit=50):
+    """Return one page of students as a DataFrame ready for display.
+
+    ``after`` is the ``(sort_key, id)`` of the last row of the previous page
+    (see ``keyset.page_cursor``); ``limit=None`` returns every matching row. The frame
+    has ``full_name``, ``Age`` and a ``label`` ("ADM001 - Jane Doe") for
+    select boxes.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort}")
+    sort_sql = SORT_COLUMNS[sort]
+
+    clauses, params = _student_filters(class_id, gender, name)
+    if after is not None:
+        clause, after_params = seek(sort_sql, "s.id", after, descending)
+        clauses.append(clause)
+        params += after_params
+
+    query = f"""
+        SELECT s.id, s.admission_number, s.first_name, s.middle_name, s.last_name,
+               s.dob, s.gender, s.class_id, c.name AS class, s.guardian_phone,
+               {_FULL_NAME_SQL} AS full_name,
+               {_AGE_SQL} AS Age,
+               {sort_sql} AS sort_key
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+    """
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += order_by(sort_sql, "s.id", descending)
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT students.id, students.admission_number, students.first_name, students.middle_name,
-               students.last_name, students.dob, students.gender, classes.name AS class
-        FROM students
-        LEFT JOIN classes ON students.class_id = classes.id
-        ORDER BY students.id DESC
-    """)
-    rows = cursor.fetchall()
-    columns = ["id", "admission_number", "first_name", "middle_name", "last_name", "dob", "gender", "class"]
-
-    students = []
-    for row in rows:
-        student = dict(zip(columns, row))
-        # Compute full_name
-        fn = student["first_name"] or ""
-        mn = student["middle_name"] or ""
-        ln = student["last_name"] or ""
-        student["full_name"] = f"{fn} {mn} {ln}".strip().replace("  ", " ")
-        # Compute age
-        if student["dob"]:
-            dob = datetime.strptime(student["dob"], "%Y-%m-%d")
-            today = datetime.today()
-            student["Age"] = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-        else:
-            student["Age"] = ""
-        students.append(student)
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    df["label"] = df["admission_number"].fillna("") + " - " + df["full_name"]
+    return df
 
+
+def get_student_by_id(student_id):
+    """One student's editable fields as a dict, or None."""
+    conn = get_connection()
+    df = pd.read_sql_query("""
+        SELECT s.id, s.admission_number, s.first_name, s.middle_name, s.last_name,
+               s.dob, s.gender, s.class_id, c.name AS class, s.guardian_phone
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+        WHERE s.id = ?
+    """, conn, params=[int(student_id)])
     conn.close()
-    return students
+    return df.iloc[0].to_dict() if not df.empty else None
+
 
+def find_students(text, limit=10):
+    """Students whose admission number, first or last name starts with ``text``.
 
-def add_student(first_name, middle_name, last_name, dob, gender, class_id):
-    admission_number = generate_admission_number()
+    An exact admission number wins outright. Every branch is an index range
+    (see migration 6), so the lookup stays fast however many students exist.
+    """
+    text = (text or "").strip()
+    if not text:
+        return pd.DataFrame(columns=["id", "admission_number", "full_name", "class", "label"])
+    select = f"""
+        SELECT s.id, s.admission_number, {_FULL_NAME_SQL} AS full_name, c.name AS class
+        FROM students s
+        LEFT JOIN classes c ON s.class_id = c.id
+    """
+    admission = text.upper()
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO students (admission_number, first_name, middle_name, last_name, dob, gender, class_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (admission_number, first_name.strip(), middle_name.strip(), last_name.strip(), str(dob), gender, class_id))
-    conn.commit()
+    df = pd.read_sql_query(select + " WHERE s.admission_number = ?", conn, params=[admission])
+    if df.empty:
+        end = "\U0010ffff"  # sorts after every character: [text, text + end) is a prefix range
+        df = pd.read_sql_query(select + """
+            WHERE s.id IN (
+                SELECT id FROM students
+                WHERE admission_number >= ? AND admission_number < ?
+                UNION
+                SELECT id FROM students
+                WHERE first_name >= ? COLLATE NOCASE AND first_name < ? COLLATE NOCASE
+                UNION
+                SELECT id FROM students
+                WHERE last_name >= ? COLLATE NOCASE AND last_name < ? COLLATE NOCASE
+            )
+            ORDER BY full_name LIMIT ?
+        """, conn, params=[admission, admission + end, text, text + end, text, text + end, limit])
+    conn.close()
+    df["label"] = df["admission_number"].fillna("") + " - " + df["full_name"] + \
+        " (" + df["class"].fillna("No class") + ")"
+    return df
+
+
+def name_match_sql(conn, name):
+    """``(sql, params)`` selecting ids of students whose full name contains ``name``.
+
+    Uses the trigram index from migration 11 when it exists and ``name`` is
+    long enough for it (three characters); otherwise a LIKE scan.
+    """
+    name = name.strip()
+    has_index = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_name_search'"
+    ).fetchone()
+    if has_index and len(name) >= 3:
+        return ("SELECT rowid FROM student_name_search WHERE full_name MATCH ?",
+                ['"' + name.replace('"', '""') + '"'])
+    return f"SELECT s.id FROM students s WHERE {_FULL_NAME_SQL} LIKE ?", [f"%{name}%"]
+
+
+def count_students(class_id=None, gender=None, name=None):
+    clauses, params = _student_filters(class_id, gender, name)
+    query = "SELECT COUNT(*) FROM students s"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    conn = get_connection()
+    total = conn.execute(query, params).fetchone()[0]
+    conn.close()
+    return total
+
+
+def get_student_stats():
+    """Counts behind the Student Management charts, grouped in SQL."""
+    conn = get_connection()
+    gender = pd.read_sql_query("""
+        SELECT COALESCE(gender, 'Unknown') AS Gender, COUNT(*) AS Count
+        FROM students GROUP BY 1 ORDER BY Count DESC
+    """, conn)
+    classes = pd.read_sql_query("""
+        SELECT COALESCE(c.name, 'Unassigned') AS Class, COUNT(*) AS Count
+        FROM students s LEFT JOIN classes c ON s.class_id = c.id
+        GROUP BY 1 ORDER BY Count DESC
+    """, conn)
+    years = pd.read_sql_query("""
+        SELECT CAST(strftime('%Y', dob) AS INTEGER) AS Year, COUNT(*) AS Count
+        FROM students WHERE strftime('%Y', dob) IS NOT NULL
+        GROUP BY 1 ORDER BY 1
+    """, conn)
+    conn.close()
+    return {"gender": gender, "class": classes, "year": years}
+
+
+def get_all_students():
+    df = list_students(limit=None).drop(columns=["class_id", "sort_key", "label"])
+    df["Age"] = df["Age"].astype(object).where(df["Age"].notna(), "")
+    return df.to_dict("records")
+
+
+def normalize_phone(phone):
+    """Kenyan phone number as 254XXXXXXXXX, or None if it isn't one.
+
+    Accepts 07.., 01.., +254.., 254.. and 7../1.. with any spacing or dashes.
+    """
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if digits.startswith("0"):
+        digits = "254" + digits[1:]
+    elif len(digits) == 9:
+        digits = "254" + digits
+    return digits if len(digits) == 12 and digits.startswith("254") else None
+
+
+def add_student(first_name, middle_name, last_name, dob, gender, class_id, guardian_phone=None):
+    conn = get_connection()
+    with conn:
+        admission_number = generate_admission_number(conn)
+        conn.execute("""
+            INSERT INTO students (admission_number, first_name, middle_name, last_name, dob, gender, class_id,
+                                  guardian_phone)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (admission_number, first_name.strip(), middle_name.strip(), last_name.strip(), str(dob), gender,
+              class_id, normalize_phone(guardian_phone)))
     conn.close()
+    return admission_number
 
 
-def update_student(student_id, first_name, middle_name, last_name, dob, gender, class_id):
+def update_student(student_id, first_name, middle_name, last_name, dob, gender, class_id,
+                   guardian_phone=None):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE students
-        SET first_name = ?, middle_name = ?, last_name = ?, dob = ?, gender = ?, class_id = ?
+        SET first_name = ?, middle_name = ?, last_name = ?, dob = ?, gender = ?, class_id = ?,
+            guardian_phone = ?
         WHERE id = ?
-    """, (first_name.strip(), middle_name.strip(), last_name.strip(), str(dob), gender, class_id, student_id))
+    """, (first_name.strip(), middle_name.strip(), last_name.strip(), str(dob), gender, class_id,
+          normalize_phone(guardian_phone), student_id))
     conn.commit()
     conn.close()
 
@@ -84,12 +263,11 @@ def delete_student(student_id):
     conn.commit()
     conn.close()
 def get_students_by_class(class_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        query = """
-            SELECT id,
-                   (first_name || ' ' || COALESCE(middle_name || ' ', '') || last_name) AS full_name
-            FROM students
-            WHERE class_id = ?
+    with get_connection() as conn:
+        query = f"""
+            SELECT s.id, {_FULL_NAME_SQL} AS full_name
+            FROM students s
+            WHERE s.class_id = ?
             ORDER BY full_name
         """
         df = pd.read_sql_query(query, conn, params=(class_id,))
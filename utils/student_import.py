@@ -0,0 +1,129 @@
+"""Bulk student import from CSV or Excel.
+
+Rows are validated a chunk at a time with vectorised pandas operations,
+class names are resolved against a single lookup of the classes table, and
+each chunk is written with one ``executemany`` inside one transaction that
+also reserves its admission numbers.
+"""
+import os
+
+import pandas as pd
+
+from utils.db import get_connection
+from utils.student import normalize_phone, reserve_admission_numbers
+
+CHUNK_SIZE = 5000
+REQUIRED_COLUMNS = ["first_name", "last_name", "dob", "gender", "class"]
+TEMPLATE_COLUMNS = ["first_name", "middle_name", "last_name", "dob", "gender", "class", "guardian_phone"]
+GENDERS = {"male": "Male", "m": "Male", "female": "Female", "f": "Female"}
+
+
+def import_template():
+    """Empty frame with the columns ``import_students`` expects."""
+    return pd.DataFrame(columns=TEMPLATE_COLUMNS)
+
+
+def _read_chunks(source, filename, chunk_size):
+    name = (filename or getattr(source, "name", "") or str(source)).lower()
+    if name.endswith((".xlsx", ".xls")):
+        # Excel has no streaming reader in pandas; read once, then chunk.
+        df = pd.read_excel(source, dtype=str)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(source, dtype=str, chunksize=chunk_size,
+                               keep_default_na=False)
+
+
+def _normalise_columns(df):
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_"))
+    return df.rename(columns={"class_name": "class", "date_of_birth": "dob"})
+
+
+def _validate(chunk, class_ids, first_row):
+    """Split a chunk into insertable rows and ``(row, error)`` pairs."""
+    chunk = _normalise_columns(chunk).fillna("")
+    missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for optional in ("middle_name", "guardian_phone"):
+        if optional not in chunk.columns:
+            chunk[optional] = ""
+
+    rows = pd.DataFrame({
+        "row": range(first_row, first_row + len(chunk)),
+        "first_name": chunk["first_name"].astype(str).str.strip(),
+        "middle_name": chunk["middle_name"].astype(str).str.strip(),
+        "last_name": chunk["last_name"].astype(str).str.strip(),
+        # YYYY-MM-DD; Excel cells arrive as "YYYY-MM-DD 00:00:00".
+        "dob": pd.to_datetime(chunk["dob"].astype(str).str.strip().str[:10],
+                              format="%Y-%m-%d", errors="coerce").dt.strftime("%Y-%m-%d"),
+        "gender": chunk["gender"].astype(str).str.strip().str.lower().map(GENDERS),
+        "class_id": chunk["class"].astype(str).str.strip().str.lower().map(class_ids),
+        "guardian_phone": chunk["guardian_phone"].map(normalize_phone),
+    })
+
+    error = pd.Series("", index=rows.index)
+    bad_phone = rows["guardian_phone"].isna() & (chunk["guardian_phone"].astype(str).str.strip() != "")
+    error = error.mask(bad_phone, "Invalid guardian phone")
+    error = error.mask(rows["class_id"].isna(), "Unknown class")
+    error = error.mask(rows["gender"].isna(), "Gender must be Male or Female")
+    error = error.mask(rows["dob"].isna(), "Invalid date of birth")
+    error = error.mask((rows["first_name"] == "") | (rows["last_name"] == ""),
+                       "First and last name are required")
+
+    bad = error != ""
+    errors = pd.DataFrame({"row": rows.loc[bad, "row"], "error": error[bad]})
+    return rows[~bad], errors
+
+
+def import_students(source, filename=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Import students from a CSV/Excel path or uploaded file.
+
+    Returns ``(imported, errors)`` where ``errors`` is a DataFrame of
+    ``row`` (1-based data row) and ``error`` for every rejected line.
+    ``progress`` is called with the number of rows processed so far.
+    """
+    conn = get_connection()
+    class_ids = {
+        str(name).strip().lower(): class_id
+        for class_id, name in conn.execute("SELECT id, name FROM classes")
+        if name is not None
+    }
+
+    imported, processed, error_frames = 0, 0, []
+    for chunk in _read_chunks(source, filename, chunk_size):
+        rows, errors = _validate(chunk, class_ids, processed + 1)
+        processed += len(chunk)
+        error_frames.append(errors)
+        if not rows.empty:
+            with conn:
+                numbers = reserve_admission_numbers(conn, len(rows))
+                conn.executemany("""
+                    INSERT INTO students (admission_number, first_name, middle_name, last_name, dob, gender, class_id,
+                                          guardian_phone)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, zip(
+                    numbers,
+                    rows["first_name"], rows["middle_name"], rows["last_name"],
+                    rows["dob"], rows["gender"], rows["class_id"].astype(int).tolist(),
+                    rows["guardian_phone"].astype(object).where(rows["guardian_phone"].notna(), None),
+                ))
+            imported += len(rows)
+        if progress:
+            progress(processed)
+    conn.close()
+
+    errors = pd.concat(error_frames, ignore_index=True) if error_frames else \
+        pd.DataFrame(columns=["row", "error"])
+    return imported, errors
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1]
+    count, errors = import_students(path, os.path.basename(path))
+    print(f"Imported {count} students, {len(errors)} rejected")
+    if not errors.empty:
+        print(errors.to_string(index=False))
@@ -1,13 +1,17 @@
-import sqlite3
-import pandas as pd
-
-DB_PATH = "school.db"
+import glob
+import os
+import threading
 
-import sqlite3
 import pandas as pd
+from config import TEACHER_PHOTO_DIR, THUMBNAIL_SIZE
+from utils.db import get_connection
+from utils.image_ingest import thumbnail
+
+THUMBNAIL_DIR = os.path.join(TEACHER_PHOTO_DIR, "thumbs")
 
 def get_all_teachers():
-    conn = sqlite3.connect("school.db")
+    """Every teacher with text columns only; photos are loaded by id when shown."""
+    conn = get_connection()
     query = """
     SELECT 
         id,
@@ -16,10 +20,10 @@ def get_all_teachers():
         last_name,
         subject,
         hire_date,
-        photo,
         phone,
         gender,
-        class
+        class,
+        photo IS NOT NULL AS has_photo
     FROM teachers
     """
     df = pd.read_sql(query, conn)
@@ -31,40 +35,122 @@ def get_all_teachers():
 
 
 def get_teacher_by_id(teacher_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM teachers WHERE id = ?", (teacher_id,))
+    cursor.execute("""
+        SELECT id, first_name, middle_name, last_name, hire_date, phone,
+               photo IS NOT NULL, gender, subject, class
+        FROM teachers WHERE id = ?
+    """, (teacher_id,))
     row = cursor.fetchone()
     conn.close()
     if row:
-        columns = ["id", "first_name", "middle_name", "last_name", "hire_date", "phone", "photo", "gender", "subject", "class"]
+        columns = ["id", "first_name", "middle_name", "last_name", "hire_date", "phone", "has_photo", "gender", "subject", "class"]
         return dict(zip(columns, row))
     return {}
 
+def get_teacher_photo(teacher_id):
+    """The stored photo bytes for one teacher, or None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT photo FROM teachers WHERE id = ?", (teacher_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def _thumbnail_path(teacher_id, size):
+    return os.path.join(THUMBNAIL_DIR, f"{int(teacher_id)}_{size}.jpg")
+
+def _write_thumbnail(path, data):
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def get_teacher_thumbnail(teacher_id, size=THUMBNAIL_SIZE):
+    """JPEG thumbnail of a teacher's photo, or None if they have none.
+
+    Built from the stored photo the first time it is asked for and cached
+    under ``teacher_photos/thumbs/`` until ``update_teacher`` changes the
+    teacher.
+    """
+    path = _thumbnail_path(teacher_id, size)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    photo = get_teacher_photo(teacher_id)
+    if not photo:
+        return None
+    data = thumbnail(photo, size)
+    _write_thumbnail(path, data)
+    return data
+
+def _invalidate_thumbnails(teacher_id):
+    for path in glob.glob(os.path.join(THUMBNAIL_DIR, f"{int(teacher_id)}_*.jpg")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 def add_teacher(first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class_):
-    conn = sqlite3.connect(DB_PATH)
+    """Insert a teacher and return the new id."""
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO teachers (first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class_))
+    teacher_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    return teacher_id
 
 def update_teacher(teacher_id, first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class_):
-    conn = sqlite3.connect(DB_PATH)
+    """Update a teacher. ``photo=None`` keeps the stored photo."""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE teachers
-        SET first_name = ?, middle_name = ?, last_name = ?, hire_date = ?, phone = ?, photo = ?, gender = ?, subject = ?, class = ?
-        WHERE id = ?
-    """, (first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class_, teacher_id))
+    if photo is not None:
+        cursor.execute("""
+            UPDATE teachers
+            SET first_name = ?, middle_name = ?, last_name = ?, hire_date = ?, phone = ?, photo = ?, gender = ?, subject = ?, class = ?
+            WHERE id = ?
+        """, (first_name, middle_name, last_name, hire_date, phone, photo, gender, subject, class_, teacher_id))
+    else:
+        cursor.execute("""
+            UPDATE teachers
+            SET first_name = ?, middle_name = ?, last_name = ?, hire_date = ?, phone = ?, gender = ?, subject = ?, class = ?
+            WHERE id = ?
+        """, (first_name, middle_name, last_name, hire_date, phone, gender, subject, class_, teacher_id))
+    conn.commit()
+    conn.close()
+    _invalidate_thumbnails(teacher_id)
+
+def replace_photo(teacher_id, old_photo, new_photo, new_thumbnail=None):
+    """Swap in a processed copy of a teacher's photo.
+
+    Nothing changes if the stored photo is no longer ``old_photo`` (a newer
+    upload won). Returns True if the photo was replaced.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE teachers SET photo = ? WHERE id = ? AND photo = ?",
+                   (new_photo, teacher_id, old_photo))
+    replaced = cursor.rowcount > 0
     conn.commit()
     conn.close()
+    if replaced:
+        _invalidate_thumbnails(teacher_id)
+        if new_thumbnail is not None:
+            _write_thumbnail(_thumbnail_path(teacher_id, THUMBNAIL_SIZE), new_thumbnail)
+    return replaced
 
 def delete_teacher(teacher_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM teachers WHERE id = ?", (teacher_id,))
     conn.commit()
     conn.close()
+    _invalidate_thumbnails(teacher_id)
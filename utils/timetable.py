@@ -1,25 +1,68 @@
 from utils.db import get_connection
+from utils.student import full_name_sql
+from utils.timetable_clash import TimetableClashError, check_entry, find_clashes, to_minutes
 import pandas as pd
 
-def get_timetable():
-    conn = get_connection()
-    query = """
+# Lesson times are stored as minutes since midnight (migration 12) and shown as "HH:MM".
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+_DAY_ORDER_SQL = "CASE t.day " + " ".join(f"WHEN '{d}' THEN {i}" for i, d in enumerate(DAYS)) + f" ELSE {len(DAYS)} END"
+
+def _clock_sql(column):
+    return f"printf('%02d:%02d', {column} / 60, {column} % 60)"
+
+def _validated(conn, class_id, teacher_id, day, start_time, end_time, entry_id=None):
+    start_minute, end_minute = to_minutes(start_time), to_minutes(end_time)
+    if start_minute >= end_minute:
+        raise ValueError("A lesson must end after it starts")
+    clashes = check_entry(conn, class_id, teacher_id, day, start_minute, end_minute, exclude_id=entry_id)
+    if clashes:
+        raise TimetableClashError(clashes)
+    return start_minute, end_minute
+
+def query_timetable(class_id=None, day=None, teacher_id=None, start_from=None, end_by=None):
+    """Lessons matching the filters, by day and start time, filtered in SQL.
+
+    ``start_from`` / ``end_by`` ("HH:MM", a time or minutes) keep lessons
+    that start at or after / end at or before them. A class or teacher
+    filter is answered from its (…, day, start_minute) index.
+    """
+    clauses, params = [], []
+    for column, value in (("t.class_id", class_id), ("t.day", day), ("t.teacher_id", teacher_id)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if start_from is not None:
+        clauses.append("t.start_minute >= ?")
+        params.append(to_minutes(start_from))
+    if end_by is not None:
+        clauses.append("t.end_minute <= ?")
+        params.append(to_minutes(end_by))
+    query = f"""
     SELECT t.id, c.name AS class, s.name AS subject,
-           tr.first_name || ' ' || tr.middle_name || ' ' || tr.last_name AS teacher,
-           t.day, t.start_time, t.end_time
+           {full_name_sql('tr')} AS teacher,
+           t.day, {_clock_sql('t.start_minute')} AS start_time, {_clock_sql('t.end_minute')} AS end_time
     FROM timetable t
     JOIN classes c ON t.class_id = c.id
     JOIN subjects s ON t.subject_id = s.id
     JOIN teachers tr ON t.teacher_id = tr.id
     """
-    return pd.read_sql_query(query, conn)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY {_DAY_ORDER_SQL}, t.start_minute, c.name"
+    conn = get_connection()
+    return pd.read_sql_query(query, conn, params=params)
+
+def get_timetable():
+    return query_timetable()
 
 def add_timetable_entry(class_id, subject_id, teacher_id, day, start_time, end_time):
+    """Add a lesson; raises TimetableClashError if the teacher or class is busy."""
     conn = get_connection()
+    start_minute, end_minute = _validated(conn, class_id, teacher_id, day, start_time, end_time)
     conn.execute("""
-        INSERT INTO timetable (class_id, subject_id, teacher_id, day, start_time, end_time)
+        INSERT INTO timetable (class_id, subject_id, teacher_id, day, start_minute, end_minute)
         VALUES (?, ?, ?, ?, ?, ?)
-    """, (class_id, subject_id, teacher_id, day, start_time, end_time))
+    """, (class_id, subject_id, teacher_id, day, start_minute, end_minute))
     conn.commit()
 
 def delete_timetable_entry(entry_id):
@@ -28,16 +71,80 @@ def delete_timetable_entry(entry_id):
     conn.commit()
 def get_timetable_entry_by_id(entry_id):
     conn = get_connection()
-    query = "SELECT * FROM timetable WHERE id = ?"
+    query = f"""
+        SELECT t.*, {_clock_sql('t.start_minute')} AS start_time, {_clock_sql('t.end_minute')} AS end_time
+        FROM timetable t WHERE t.id = ?
+    """
     df = pd.read_sql_query(query, conn, params=(entry_id,))
     return df.iloc[0] if not df.empty else None
 
 
 def update_timetable_entry(entry_id, class_id, subject_id, teacher_id, day, start_time, end_time):
+    """Update a lesson; raises TimetableClashError if the teacher or class is busy."""
     conn = get_connection()
+    start_minute, end_minute = _validated(conn, class_id, teacher_id, day, start_time, end_time, entry_id)
     conn.execute("""
         UPDATE timetable
-        SET class_id = ?, subject_id = ?, teacher_id = ?, day = ?, start_time = ?, end_time = ?
+        SET class_id = ?, subject_id = ?, teacher_id = ?, day = ?, start_minute = ?, end_minute = ?
         WHERE id = ?
-    """, (class_id, subject_id, teacher_id, day, start_time, end_time, entry_id))
+    """, (class_id, subject_id, teacher_id, day, start_minute, end_minute, entry_id))
     conn.commit()
+
+def add_timetable_entries(entries, replace_classes=None):
+    """Insert many lessons in one transaction; returns how many were added.
+
+    ``entries`` is a DataFrame with ``class_id``, ``subject_id``,
+    ``teacher_id``, ``day``, ``start_time`` and ``end_time`` ("HH:MM" or
+    minutes). The current
+    lessons of ``replace_classes`` (class ids) are deleted first. The new
+    lessons are checked against each other and every lesson that stays in
+    one ``find_clashes`` pass; on a clash TimetableClashError is raised and
+    nothing is written.
+    """
+    entries = entries.assign(
+        start_minute=entries["start_time"].map(to_minutes),
+        end_minute=entries["end_time"].map(to_minutes),
+    )
+    if (entries["start_minute"] >= entries["end_minute"]).any():
+        raise ValueError("A lesson must end after it starts")
+    replace_classes = [int(c) for c in (replace_classes or [])]
+    conn = get_connection()
+    query = "SELECT id, class_id, teacher_id, day, start_minute, end_minute FROM timetable"
+    if replace_classes:
+        query += f" WHERE class_id NOT IN ({', '.join('?' * len(replace_classes))})"
+    kept = pd.read_sql_query(query, conn, params=replace_classes)
+    # New lessons get negative ids so their clashes can be told apart.
+    new = entries.assign(id=-pd.RangeIndex(1, len(entries) + 1))
+    clashes = find_clashes(pd.concat([kept, new[kept.columns]], ignore_index=True))
+    clashes = clashes[(clashes["entry_id"] < 0) | (clashes["other_entry_id"] < 0)]
+    if not clashes.empty:
+        raise TimetableClashError(clashes.to_dict("records"))
+
+    rows = entries[["class_id", "subject_id", "teacher_id", "day", "start_minute", "end_minute"]]
+    with conn:
+        if replace_classes:
+            conn.execute(
+                f"DELETE FROM timetable WHERE class_id IN ({', '.join('?' * len(replace_classes))})",
+                replace_classes,
+            )
+        conn.executemany("""
+            INSERT INTO timetable (class_id, subject_id, teacher_id, day, start_minute, end_minute)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(int(c), int(s), int(t), d, int(sm), int(em)) for c, s, t, d, sm, em in rows.itertuples(index=False)])
+    return len(rows)
+
+def get_timetable_clashes():
+    """Every pair of clashing lessons currently in the timetable, with names."""
+    conn = get_connection()
+    timetable = pd.read_sql_query(
+        "SELECT id, class_id, teacher_id, day, start_minute, end_minute FROM timetable", conn
+    )
+    clashes = find_clashes(timetable)
+    if clashes.empty:
+        return clashes
+    names = pd.read_sql_query("""
+        SELECT 'class' AS resource, id AS resource_id, name FROM classes
+        UNION ALL
+        SELECT 'teacher', id, first_name || ' ' || last_name FROM teachers
+    """, conn)
+    return clashes.merge(names, on=["resource", "resource_id"], how="left")
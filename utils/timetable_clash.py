@@ -0,0 +1,103 @@
+"""Clash detection for the timetable.
+
+Two lessons clash when they share a teacher or a class on the same day and
+their times overlap (a lesson ending at 09:00 and one starting at 09:00
+do not clash).
+
+* ``find_clashes`` checks a whole timetable (e.g. a bulk add) in one sorted
+  sweep and reports every clashing pair.
+* ``check_entry`` is the write-time check in utils.timetable. It asks
+  SQLite for overlapping lessons through the (teacher_id, day, start_minute)
+  and (class_id, day, start_minute) indexes.
+
+Times are minutes since midnight, as stored (migration 12).
+"""
+import datetime
+import numbers
+
+import pandas as pd
+
+_RESOURCES = ("teacher", "class")
+CLASH_COLUMNS = ["resource", "resource_id", "day", "entry_id", "start_time", "end_time",
+                 "other_entry_id", "other_start_time", "other_end_time"]
+
+
+class TimetableClashError(ValueError):
+    """The lesson overlaps another lesson of the same teacher or class."""
+
+    def __init__(self, clashes):
+        self.clashes = clashes
+        described = "; ".join(
+            f"{c['resource']} busy {c['other_start_time']}-{c['other_end_time']} (entry {c['other_entry_id']})"
+            for c in clashes
+        )
+        super().__init__(f"Timetable clash: {described}")
+
+
+def to_minutes(value):
+    """Minutes since midnight for "HH:MM", "HH:MM:SS", a time or an int."""
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return value.hour * 60 + value.minute
+    parts = str(value).strip().split(":")
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def find_clashes(timetable):
+    """Every clashing pair in ``timetable``.
+
+    ``timetable`` is a DataFrame with ``id``, ``class_id``, ``teacher_id``,
+    ``day``, ``start_minute`` and ``end_minute``. Each resource and day is
+    swept once in start order, so the cost is a sort plus one pass. Returns
+    a frame with one row per clash (``CLASH_COLUMNS``, times as "HH:MM").
+    """
+    if timetable.empty:
+        return pd.DataFrame(columns=CLASH_COLUMNS)
+    lessons = timetable.dropna(subset=["start_minute", "end_minute"])
+    lessons = lessons.assign(
+        start=lessons["start_minute"].astype(int),
+        end=lessons["end_minute"].astype(int),
+        start_time=lessons["start_minute"].astype(int).map(format_minutes),
+        end_time=lessons["end_minute"].astype(int).map(format_minutes),
+    )
+    rows = []
+    for resource in _RESOURCES:
+        column = f"{resource}_id"
+        ordered = lessons.sort_values([column, "day", "start"])
+        active, current_key = [], None
+        for lesson in ordered[["id", column, "day", "start", "end", "start_time", "end_time"]].itertuples(index=False):
+            key = (getattr(lesson, column), lesson.day)
+            if key != current_key:
+                active, current_key = [], key
+            active = [other for other in active if other.end > lesson.start]
+            for other in active:
+                rows.append((resource, key[0], lesson.day, other.id, other.start_time, other.end_time,
+                             lesson.id, lesson.start_time, lesson.end_time))
+            active.append(lesson)
+    return pd.DataFrame(rows, columns=CLASH_COLUMNS)
+
+
+def check_entry(conn, class_id, teacher_id, day, start_minute, end_minute, exclude_id=None):
+    """Lessons in the database that a new/updated lesson would clash with.
+
+    Returns a list of dicts (``resource``, ``other_entry_id``,
+    ``other_start_time``, ``other_end_time``); empty means it fits.
+    """
+    clashes = []
+    for resource, resource_id in (("teacher", teacher_id), ("class", class_id)):
+        rows = conn.execute(f"""
+            SELECT id, start_minute, end_minute FROM timetable
+            WHERE {resource}_id = ? AND day = ? AND start_minute < ? AND end_minute > ?
+              AND id IS NOT ?
+            ORDER BY start_minute
+        """, (resource_id, day, end_minute, start_minute, exclude_id)).fetchall()
+        clashes += [{"resource": resource, "other_entry_id": other_id,
+                     "other_start_time": format_minutes(other_start),
+                     "other_end_time": format_minutes(other_end)}
+                    for other_id, other_start, other_end in rows]
+    return clashes
@@ -0,0 +1,261 @@
+"""Generate the weekly timetable from teacher_subjects.
+
+Every teacher_subjects row (teacher, subject, class) asks for a number of
+lessons a week of that subject (``periods_per_week``). The week is a grid of
+``days`` x ``periods``. A lesson needs a slot where its class and teacher
+are both free and the teacher is available, and a subject is spread over
+the week (at most ``ceil(lessons / days)`` a day per class).
+
+Lessons are placed hardest first: teachers with the most lessons go first.
+Each lesson takes the free slot where its subject and its teacher have the
+fewest lessons that day. Busy slots are bit masks per class and teacher, so
+finding free slots is a few integer operations. When no slot is free, the
+lesson takes the slot with the fewest lessons in its way. It evicts them,
+and they go back on the queue (an ejection chain). This repairs the few
+dead ends greedy placement runs into.
+
+    python -m utils.timetable_generator [--periods 5] [--save]
+"""
+import argparse
+import math
+import random
+import sys
+from collections import defaultdict, deque
+
+import pandas as pd
+
+from utils.db import get_connection
+from utils.timetable import add_timetable_entries
+from utils.timetable_clash import to_minutes
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+PERIODS = [
+    ("08:00", "08:40"), ("08:40", "09:20"), ("09:20", "10:00"),
+    ("10:20", "11:00"), ("11:00", "11:40"), ("11:40", "12:20"),
+    ("14:00", "14:40"), ("14:40", "15:20"),
+]
+DEFAULT_PERIODS_PER_WEEK = 5
+MAX_STEPS_PER_LESSON = 50  # evictions allowed (x lessons) before giving up
+
+_LESSON_COLUMNS = ["class_id", "subject_id", "teacher_id", "day", "start_time", "end_time"]
+_UNPLACED_COLUMNS = ["class_id", "class", "subject_id", "subject", "teacher_id", "missing"]
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _count(mask):
+    return bin(mask).count("1")
+
+
+def load_assignments():
+    """teacher_subjects joined to subject and class names."""
+    conn = get_connection()
+    df = pd.read_sql_query("""
+        SELECT ts.teacher_id, ts.subject_id, ts.class_id, s.name AS subject, c.name AS class
+        FROM teacher_subjects ts
+        JOIN subjects s ON ts.subject_id = s.id
+        JOIN classes c ON ts.class_id = c.id
+        JOIN teachers t ON ts.teacher_id = t.id
+        ORDER BY ts.id
+    """, conn)
+    conn.close()
+    return df
+
+
+def _busy_masks(busy, days, periods):
+    """Grid slots taken by ``busy`` lessons, per teacher and per class."""
+    teacher, klass = defaultdict(int), defaultdict(int)
+    if busy is None or busy.empty:
+        return teacher, klass
+    bounds = [(to_minutes(start), to_minutes(end)) for start, end in periods]
+    for lesson in busy.itertuples(index=False):
+        if lesson.day not in days:
+            continue
+        start, end = lesson.start_minute, lesson.end_minute
+        if pd.isna(start) or pd.isna(end):
+            continue
+        base = days.index(lesson.day) * len(periods)
+        for p, (p_start, p_end) in enumerate(bounds):
+            if p_start < end and p_end > start:
+                teacher[lesson.teacher_id] |= 1 << (base + p)
+                klass[lesson.class_id] |= 1 << (base + p)
+    return teacher, klass
+
+
+def generate(assignments, periods_per_week=None, days=DAYS, periods=PERIODS, unavailable=None,
+             default_periods=DEFAULT_PERIODS_PER_WEEK, busy=None, seed=0):
+    """Place every assigned lesson on the grid.
+
+    ``periods_per_week`` maps a subject name to its weekly lessons (others
+    get ``default_periods``). ``unavailable`` maps a teacher id to the days
+    (or ``(day, period index)`` pairs) they cannot teach. ``busy`` is a
+    frame of existing lessons to keep clear of. Returns ``(lessons, unplaced)``.
+    ``lessons`` has the timetable columns. ``unplaced`` lists any
+    assignment short of lessons, with how many are ``missing``.
+    """
+    periods_per_week = periods_per_week or {}
+    days, periods = list(days), list(periods)
+    rng = random.Random(seed)
+    P = len(periods)
+    full = (1 << (len(days) * P)) - 1
+    day_masks = [((1 << P) - 1) << (d * P) for d in range(len(days))]
+
+    # One requirement per class and subject; the first assigned teacher takes it.
+    requirements = assignments.drop_duplicates(["class_id", "subject_id"]).reset_index(drop=True)
+    counts = [int(periods_per_week.get(subject, default_periods)) for subject in requirements["subject"]]
+    caps = [max(1, math.ceil(n / len(days))) for n in counts]
+    req_class = requirements["class_id"].tolist()
+    req_teacher = requirements["teacher_id"].tolist()
+
+    # blocked: slots a teacher / class can never use; *_busy: lessons placed here.
+    blocked, class_blocked = _busy_masks(busy, days, periods)
+    teacher_busy, class_busy = defaultdict(int), defaultdict(int)
+    for teacher_id, off in (unavailable or {}).items():
+        for item in off:
+            if isinstance(item, tuple):  # (day, period index)
+                day, period = item
+                if day in days:
+                    blocked[teacher_id] |= 1 << (days.index(day) * P + period)
+            elif item in days:
+                blocked[teacher_id] |= day_masks[days.index(item)]
+
+    teacher_load = defaultdict(int)
+    for r, n in enumerate(counts):
+        teacher_load[req_teacher[r]] += n
+    lessons = [r for r, n in enumerate(counts) for _ in range(n)]
+    order = sorted(range(len(lessons)), key=lambda l: (
+        -(teacher_load[req_teacher[lessons[l]]] + _count(blocked[req_teacher[lessons[l]]])),
+        -counts[lessons[l]], rng.random(),
+    ))
+
+    slot_of = [None] * len(lessons)
+    at_class, at_teacher = {}, {}     # (class/teacher, slot) -> lesson
+    per_day = defaultdict(int)       # (requirement, day) -> lessons placed
+
+    def place(l, slot):
+        r = lessons[l]
+        c, t = req_class[r], req_teacher[r]
+        slot_of[l] = slot
+        at_class[(c, slot)] = at_teacher[(t, slot)] = l
+        class_busy[c] |= 1 << slot
+        teacher_busy[t] |= 1 << slot
+        per_day[(r, slot // P)] += 1
+
+    def unplace(l):
+        r, slot = lessons[l], slot_of[l]
+        c, t = req_class[r], req_teacher[r]
+        slot_of[l] = None
+        del at_class[(c, slot)], at_teacher[(t, slot)]
+        class_busy[c] &= ~(1 << slot)
+        teacher_busy[t] &= ~(1 << slot)
+        per_day[(r, slot // P)] -= 1
+
+    def spread(r, mask):
+        for d, day_mask in enumerate(day_masks):
+            if per_day[(r, d)] >= caps[r]:
+                mask &= ~day_mask
+        return mask
+
+    queue = deque(order)
+    evictions = defaultdict(int)
+    steps, max_steps = 0, MAX_STEPS_PER_LESSON * max(len(lessons), 1)
+    unplaceable = []
+    while queue and steps < max_steps:
+        l = queue.popleft()
+        r = lessons[l]
+        c, t = req_class[r], req_teacher[r]
+        allowed = full & ~blocked[t] & ~class_blocked[c]
+        free = spread(r, allowed & ~(class_busy[c] | teacher_busy[t]))
+        if free:
+            place(l, min(_bits(free), key=lambda s: (
+                per_day[(r, s // P)], _count(teacher_busy[t] & day_masks[s // P]), rng.random(),
+            )))
+            continue
+
+        # Nothing free: evict whatever is in the way of the cheapest slot.
+        steps += 1
+        candidates = spread(r, allowed) or allowed
+        if not candidates:
+            unplaceable.append(l)
+            continue
+
+        def in_the_way(slot):
+            return {at_class.get((c, slot)), at_teacher.get((t, slot))} - {None}
+
+        def cost(slot):
+            blockers = in_the_way(slot)
+            return (len(blockers), sum(evictions[b] for b in blockers), rng.random())
+
+        slot = min(_bits(candidates), key=cost)
+        for blocker in in_the_way(slot):
+            unplace(blocker)
+            evictions[blocker] += 1
+            queue.append(blocker)
+        place(l, slot)
+
+    unplaceable += list(queue)
+    placed = sorted((l for l in range(len(lessons)) if slot_of[l] is not None),
+                    key=lambda l: (req_class[lessons[l]], slot_of[l]))
+    timetable = pd.DataFrame(
+        [(req_class[lessons[l]], requirements.at[lessons[l], "subject_id"], req_teacher[lessons[l]],
+          days[slot_of[l] // P], *periods[slot_of[l] % P]) for l in placed],
+        columns=_LESSON_COLUMNS,
+    )
+
+    missing = defaultdict(int)
+    for l in unplaceable:
+        missing[lessons[l]] += 1
+    unplaced = pd.DataFrame(
+        [(req_class[r], requirements.at[r, "class"], requirements.at[r, "subject_id"],
+          requirements.at[r, "subject"], req_teacher[r], n) for r, n in sorted(missing.items())],
+        columns=_UNPLACED_COLUMNS,
+    )
+    return timetable, unplaced
+
+
+def generate_timetable(periods_per_week=None, days=DAYS, periods=PERIODS, unavailable=None,
+                       default_periods=DEFAULT_PERIODS_PER_WEEK, seed=0):
+    """``generate`` for every class in teacher_subjects.
+
+    Lessons of other classes in the current timetable are kept, and the
+    generator works around them.
+    """
+    assignments = load_assignments()
+    conn = get_connection()
+    busy = pd.read_sql_query(
+        "SELECT class_id, teacher_id, day, start_minute, end_minute FROM timetable "
+        "WHERE class_id NOT IN (SELECT class_id FROM teacher_subjects)", conn
+    )
+    conn.close()
+    return generate(assignments, periods_per_week, days, periods, unavailable, default_periods, busy, seed)
+
+
+def save_generated(lessons):
+    """Replace the timetable of every class in ``lessons`` with ``lessons``."""
+    return add_timetable_entries(lessons, replace_classes=lessons["class_id"].unique().tolist())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the weekly timetable from teacher assignments.")
+    parser.add_argument("--periods", type=int, default=DEFAULT_PERIODS_PER_WEEK,
+                        help="lessons a week for every subject (default: %(default)s)")
+    parser.add_argument("--save", action="store_true",
+                        help="replace the timetable of the scheduled classes")
+    args = parser.parse_args(argv)
+
+    lessons, unplaced = generate_timetable(default_periods=args.periods)
+    print(f"Placed {len(lessons)} lessons; {int(unplaced['missing'].sum()) if not unplaced.empty else 0} could not be placed")
+    if not unplaced.empty:
+        print(unplaced.to_string(index=False))
+    if args.save:
+        print(f"Saved {save_generated(lessons)} lessons")
+    return 0 if unplaced.empty else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())